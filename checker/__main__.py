@@ -17,16 +17,23 @@ from .actions.check import pre_release_check_tasks
 from .actions.export import export_public_files
 from .actions.grade import grade_on_ci
 from .actions.grade_mr import grade_student_mrs, grade_students_mrs_to_master
-from .course import CourseConfig, CourseSchedule, Task
+from .course import CourseConfig, CourseSchedule, Task, TaskDurations
 from .course.driver import CourseDriver
+from .course.durations import get_default_durations_path
+from .exceptions import PushFailedError
 from .testers import Tester
 from .utils.glab import GitlabConnection
+from .utils.manytask import get_manytask_client
+from .utils.outbox import ReportOutbox, flush_outbox
 from .utils.print import print_info
+from .utils.report import CheckReport
+from .utils.watermark import MrsWatermark
 
 
 ClickTypeReadableFile = click.Path(exists=True, file_okay=True, readable=True, path_type=Path)
 ClickTypeReadableDirectory = click.Path(exists=True, file_okay=False, readable=True, path_type=Path)
 ClickTypeWritableDirectory = click.Path(file_okay=False, writable=True, path_type=Path)
+ClickTypeWritableFile = click.Path(dir_okay=False, writable=True, path_type=Path)
 
 
 @click.group()
@@ -66,7 +73,44 @@ def main(
 @click.option('--dry-run', is_flag=True, help='Do not execute anything, only print')
 @click.option('--parallelize', is_flag=True, help='Execute parallel checking of tasks')
 @click.option('--num-processes', type=int, default=None, help='Num of processes parallel checking (default: unlimited)')
+@click.option('--max-jobs', type=int, default=None,
+              help='Max concurrent commands of all tasks, shared with make/ninja via jobserver '
+                   '(default: unlimited)')
 @click.option('--contributing', is_flag=True, help='Run task check for students` contribution (decrease verbosity)')
+@click.option('--cache-dir', envvar='CHECKER_CACHE_DIR', type=ClickTypeWritableDirectory, default=None,
+              help='Results cache dir to skip testing of already tested solutions')
+@click.option('--cache/--no-cache', 'use_cache', default=None,
+              help='Force results cache usage (default: only for non-verbose runs)')
+@click.option('--build-root', envvar='CHECKER_BUILD_ROOT', type=ClickTypeWritableDirectory, default=None,
+              help='Dir to create build dirs in, e.g. tmpfs mount (default: system temp dir)')
+@click.option('--build-jobs', type=int, default=1, show_default=True,
+              help='Max tasks building at the same time (over 1 build or test job: build next while testing current)')
+@click.option('--test-jobs', type=int, default=1, show_default=True,
+              help='Max tasks testing at the same time')
+@click.option('--durations-file', envvar='CHECKER_DURATIONS_FILE', type=ClickTypeWritableFile, default=None,
+              help='Tasks durations history to run longest tasks first when parallelized '
+                   '(default: ~/.cache/checker/durations.json)')
+@click.option('--log-dir', type=ClickTypeWritableDirectory, default=None,
+              help='Dir to save full log of each task to when parallelized')
+@click.option('--fail-fast', is_flag=True, help='Stop at the first failed task, killing in-flight checks')
+@click.option('--max-failures', type=int, default=None,
+              help='Stop after N failed tasks, killing in-flight checks '
+                   '(default: unlimited when parallelized, else 1)')
+@click.option('--changed-since', type=str, default=None,
+              help='Check only tasks with files changed since git ref (compared to working tree)')
+@click.option('--check-all-on-shared-changes', is_flag=True,
+              help='With --changed-since, check all tasks if shared (not task-specific) files changed')
+@click.option('--shard-index', type=int, default=None, help='Index of the shard to check, from 0')
+@click.option('--shard-count', type=int, default=None,
+              help='Split selected tasks into N shards, check only --shard-index one '
+                   '(balanced by --durations-file if set explicitly, else by tasks count)')
+@click.option('--report', 'report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save json report of the check to (status, score and stages timings of tasks)')
+@click.option('--junit-report', 'junit_report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save JUnit XML report of the check to')
+@click.option('--watch', is_flag=True, help='Keep running and re-check tasks on their files changes')
+@click.option('--watch-interval', type=float, default=1., show_default=True,
+              help='Seconds between files changes polls in --watch mode')
 @click.pass_context
 def check(
         ctx: click.Context,
@@ -77,7 +121,25 @@ def check(
         dry_run: bool = False,
         parallelize: bool = False,
         num_processes: int | None = None,
+        max_jobs: int | None = None,
         contributing: bool = False,
+        cache_dir: Path | None = None,
+        use_cache: bool | None = None,
+        build_root: Path | None = None,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        durations_file: Path | None = None,
+        log_dir: Path | None = None,
+        fail_fast: bool = False,
+        max_failures: int | None = None,
+        changed_since: str | None = None,
+        check_all_on_shared_changes: bool = False,
+        shard_index: int | None = None,
+        shard_count: int | None = None,
+        report_path: Path | None = None,
+        junit_report_path: Path | None = None,
+        watch: bool = False,
+        watch_interval: float = 1.,
 ) -> None:
     """Run task pre-release checking"""
     context: dict[str, Any] = ctx.obj
@@ -97,7 +159,17 @@ def check(
         system=course_config.system,
         cleanup=not no_clean,
         dry_run=dry_run,
+        cache_dir=cache_dir,
+        use_cache=use_cache,
+        build_root=build_root,
     )
+    durations = None
+    if not dry_run:
+        durations = TaskDurations(
+            durations_file or get_default_durations_path(),
+            course=course_config.name,
+            system=course_config.system,
+        )
 
     tasks: list[Task] | None = None
     if group:
@@ -117,6 +189,11 @@ def check(
                 print_info(f'Provided wrong task name: {task_name}', color='red')
                 sys.exit(1)
 
+    # runner-local default history differs between machines, so shards would overlap or miss tasks
+    shard_durations = durations if durations_file else None
+    if shard_count and not durations_file:
+        print_info('No --durations-file shared by shards, split tasks by count', color='orange')
+
     pre_release_check_tasks(
         course_schedule,
         private_course_driver,
@@ -124,18 +201,97 @@ def check(
         tasks=tasks,
         parallelize=parallelize,
         num_processes=num_processes,
+        build_jobs=build_jobs,
+        test_jobs=test_jobs,
+        max_jobs=max_jobs,
+        durations=durations,
+        log_dir=log_dir,
+        max_failures=1 if fail_fast else max_failures,
+        changed_since=changed_since,
+        check_all_on_shared_changes=check_all_on_shared_changes,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        shard_durations=shard_durations,
+        report_path=report_path,
+        junit_report_path=junit_report_path,
+        watch=watch,
+        watch_interval=watch_interval,
         contributing=contributing,
     )
 
 
+@main.command()
+@click.argument('reports', nargs=-1, required=True, type=ClickTypeReadableFile)
+@click.option('--report', 'report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save merged json report to')
+@click.option('--junit-report', 'junit_report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save merged JUnit XML report to')
+def check_merge(
+        reports: tuple[Path, ...],
+        report_path: Path | None = None,
+        junit_report_path: Path | None = None,
+) -> None:
+    """Combine reports of sharded checks into one exit status"""
+    report = CheckReport.merge([CheckReport.load(path) for path in reports])
+
+    for task in report.tasks:
+        color = {'passed': 'green', 'failed': 'red'}.get(task.status, 'orange')
+        duration = f'{task.duration:.1f}s' if task.duration is not None else '-'
+        print_info(f'{task.name:<40} {task.status:<8} {duration}', color=color)
+    for error in report.errors:
+        print_info(f'ERROR: {error}', color='red')
+
+    if report_path:
+        report.save(report_path)
+        print_info(f'Report is saved to {report_path}', color='blue')
+    if junit_report_path:
+        report.save_junit(junit_report_path)
+        print_info(f'JUnit report is saved to {junit_report_path}', color='blue')
+
+    if not report.success:
+        print_info('Check failed', color='red')
+        sys.exit(1)
+    print_info('Check passed', color='green')
+
+
 @main.command()
 @click.argument('reference_root', required=False, type=ClickTypeReadableDirectory)
 @click.option('--test-full-groups', is_flag=True, help='Test all tasks in changed groups')
+@click.option('--cache-dir', envvar='CHECKER_CACHE_DIR', type=ClickTypeWritableDirectory, default=None,
+              help='Results cache dir to skip testing of already tested solutions')
+@click.option('--no-cache', is_flag=True, help='Do not use results cache even if cache dir is set')
+@click.option('--build-root', envvar='CHECKER_BUILD_ROOT', type=ClickTypeWritableDirectory, default=None,
+              help='Dir to create build dirs in, e.g. tmpfs mount (default: system temp dir)')
+@click.option('--build-jobs', type=int, default=1, show_default=True,
+              help='Max tasks building at the same time (over 1 build or test job: build next while testing current)')
+@click.option('--test-jobs', type=int, default=1, show_default=True,
+              help='Max tasks testing at the same time')
+@click.option('--parallel', type=int, default=1, show_default=True,
+              help='Test up to N tasks at the same time, each in a separate process')
+@click.option('--report', 'report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save json report of the grading to (status, score and stages timings of tasks)')
+@click.option('--junit-report', 'junit_report_path', type=ClickTypeWritableFile, default=None,
+              help='Path to save JUnit XML report of the grading to')
+@click.option('--mirror-dir', 'mirrors_dir', envvar='CHECKER_MIRROR_DIR', type=ClickTypeWritableDirectory,
+              default=None,
+              help='Runner-local dir to keep git mirrors of the public repo in (fetched incrementally, not cloned)')
+@click.option('--outbox', 'outbox_path', envvar='CHECKER_OUTBOX', type=ClickTypeWritableFile, default=None,
+              help='Db file to save scores to if manytask is unavailable (pushed later with `checker flush-reports`)')
 @click.pass_context
 def grade(
         ctx: click.Context,
         reference_root: Path | None = None,
         test_full_groups: bool = False,
+        cache_dir: Path | None = None,
+        no_cache: bool = False,
+        build_root: Path | None = None,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        parallel: int = 1,
+        report_path: Path | None = None,
+        junit_report_path: Path | None = None,
+        mirrors_dir: Path | None = None,
+        outbox_path: Path | None = None,
 ) -> None:
     """Run student's tasks (current ci user)"""
     context: dict[str, Any] = ctx.obj
@@ -158,6 +314,9 @@ def grade(
     )
     tester = Tester.create(
         system=course_config.system,
+        cache_dir=cache_dir,
+        use_cache=False if no_cache else None,
+        build_root=build_root,
     )
 
     grade_on_ci(
@@ -167,10 +326,45 @@ def grade(
         private_course_driver,
         tester,
         test_full_groups=test_full_groups,
+        build_jobs=build_jobs,
+        test_jobs=test_jobs,
+        parallel=parallel,
+        outbox_path=outbox_path,
+        report_path=report_path,
+        junit_report_path=junit_report_path,
+        mirrors_dir=mirrors_dir,
     )
     # TODO: think inspect
 
 
+@main.command()
+@click.option('--outbox', 'outbox_path', envvar='CHECKER_OUTBOX', type=ClickTypeWritableFile, required=True,
+              help='Db file with scores saved by `checker grade` while manytask was unavailable')
+@click.pass_context
+def flush_reports(
+        ctx: click.Context,
+        outbox_path: Path,
+) -> None:
+    """Push scores saved in the outbox to manytask"""
+    context: dict[str, Any] = ctx.obj
+    course_config: CourseConfig = context['course_config']
+
+    if not course_config.manytask_token:
+        raise PushFailedError('Unable to find manytask token')
+    manytask = get_manytask_client(
+        course_config.manytask_url,
+        course_config.manytask_token,
+        connect_timeout=course_config.manytask_connect_timeout,
+        read_timeout=course_config.manytask_read_timeout,
+        retries=course_config.manytask_retries,
+    )
+    pushed, left = flush_outbox(ReportOutbox(outbox_path), manytask)
+    manytask.print_stats()
+    print_info(f'Pushed {pushed} reports, {left} left in the outbox', color='blue' if not left else 'orange')
+    if left:
+        sys.exit(1)
+
+
 @main.command()
 @click.argument('reference_root', required=False, type=ClickTypeReadableDirectory)
 @click.option('--dry-run', is_flag=True, help='Do not execute anything, only print')
@@ -205,6 +399,8 @@ def grade_mrs(
     gitlab_connection = GitlabConnection(
         gitlab_host_url=course_config.gitlab_url,
         job_token=os.environ.get('CI_JOB_TOKEN'),
+        rate_limit=course_config.gitlab_rate_limit,
+        rate_limit_burst=course_config.gitlab_rate_limit_burst,
     )
 
     grade_student_mrs(
@@ -220,11 +416,19 @@ def grade_mrs(
 
 @main.command()
 @click.argument('root', required=False, type=ClickTypeReadableDirectory)
+@click.option('--jobs', type=int, default=1, show_default=True,
+              help='Grade MRs of up to N students at the same time (sharing `gitlab_rate_limit`)')
+@click.option('--state-file', envvar='CHECKER_MRS_STATE', type=ClickTypeWritableFile, default=None,
+              help='File to keep the time of the last successful run in, to grade only MRs updated after it')
+@click.option('--full', is_flag=True, help='Grade all MRs, not only updated after the last run (with --state-file)')
 @click.option('--dry-run', is_flag=True, help='Do not execute anything, only print')
 @click.pass_context
 def grade_students_mrs(
         ctx: click.Context,
         root: Path | None = None,
+        jobs: int = 1,
+        state_file: Path | None = None,
+        full: bool = False,
         dry_run: bool = False,
 ) -> None:
     """Run students' MRs grading (all users)"""
@@ -245,13 +449,23 @@ def grade_students_mrs(
     gitlab_connection = GitlabConnection(
         gitlab_host_url=course_config.gitlab_url,
         private_token=course_config.gitlab_service_token,
+        rate_limit=course_config.gitlab_rate_limit,
+        rate_limit_burst=course_config.gitlab_rate_limit_burst,
+        pool_size=max(jobs, 10),
     )
 
+    watermark = None
+    if state_file and not dry_run:
+        watermark = MrsWatermark(state_file, group=course_config.students_group)
+
     grade_students_mrs_to_master(
         course_config,
         course_schedule,
         private_course_driver,
         gitlab_connection,
+        jobs=jobs,
+        watermark=watermark,
+        full=full,
         dry_run=dry_run,
     )
 
@@ -261,6 +475,9 @@ def grade_students_mrs(
 @click.option('--export-dir', type=ClickTypeWritableDirectory, help='TEMP dir to export into')
 @click.option('--dry-run', is_flag=True, help='Do not execute anything, only print')
 @click.option('--no-cleanup', is_flag=True, help='Do not cleanup export dir')
+@click.option('--mirror-dir', 'mirrors_dir', envvar='CHECKER_MIRROR_DIR', type=ClickTypeWritableDirectory,
+              default=None,
+              help='Runner-local dir to keep git mirrors of the public repo in (fetched incrementally, not cloned)')
 @click.pass_context
 def export_public(
         ctx: click.Context,
@@ -268,6 +485,7 @@ def export_public(
         export_dir: Path | None = None,
         dry_run: bool = False,
         no_cleanup: bool = False,
+        mirrors_dir: Path | None = None,
 ) -> None:
     """Export enabled tasks to public repo"""
     context: dict[str, Any] = ctx.obj
@@ -301,6 +519,7 @@ def export_public(
         private_course_driver,
         export_dir,
         dry_run=dry_run,
+        mirrors_dir=mirrors_dir,
     )
 
     if no_cleanup:
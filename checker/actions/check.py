@@ -1,15 +1,57 @@
 from __future__ import annotations
 
-import io
 import multiprocessing
+import multiprocessing.queues
+import os
+import signal
 import sys
+import threading
+import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
-from contextlib import redirect_stderr, redirect_stdout
+from contextlib import ExitStack, closing, redirect_stderr, redirect_stdout
+from functools import partial
+from pathlib import Path
+from typing import Any
 
-from ..course import CourseDriver, CourseSchedule, Task
+from ..course import CourseDriver, CourseSchedule, Task, TaskDurations
+from ..course.durations import split_into_shards
 from ..exceptions import RunFailedError
+from ..executors.jobserver import JobServer
+from ..executors.sandbox import Sandbox
 from ..testers import Tester
-from ..utils.print import print_info, print_task_info
+from ..testers.pipeline import TaskPipeline
+from ..utils.files import filename_match_patterns
+from ..utils.git import get_changed_files_list
+from ..utils.print import capture_output, print_info, print_task_info
+from ..utils.progress import CheckProgress, TaskOutputStream
+from ..utils.report import TASK_FAILED, TASK_SKIPPED, CheckReport, TaskReport, measure_task
+from ..utils.watch import FilesWatcher
+
+
+# Set up in parallel workers to stream tasks output to the parent process
+_output_queue: multiprocessing.queues.Queue[Any] | None = None
+
+OUTPUT_QUEUE_SIZE = 10_000  # lines; workers wait for the parent to print if it is full
+
+# Course files which do not affect tasks testing
+NOT_TESTED_FILES_PATTERNS = ['*.md', '.gitignore', '.gitlab-ci.yml', '.releaser-ci.yml', '.deadlines.yml']
+
+
+def _init_worker(
+        output_queue: multiprocessing.queues.Queue[Any],
+) -> None:
+    global _output_queue
+    _output_queue = output_queue
+    # the parent asks to kill in-flight commands on cancellation
+    signal.signal(signal.SIGUSR1, lambda *_: Sandbox.terminate_all())
+
+
+def _terminate_workers() -> None:
+    for process in multiprocessing.active_children():
+        try:
+            os.kill(process.pid, signal.SIGUSR1)  # type: ignore[arg-type]
+        except ProcessLookupError:
+            pass
 
 
 def _check_single_task(
@@ -17,8 +59,9 @@ def _check_single_task(
         tester: Tester,
         private_course_driver: CourseDriver,
         verbose: bool = False,
-        catch_output: bool = False,
-) -> str | None:
+        stream_output: bool = False,
+        log_dir: Path | None = None,
+) -> TaskReport:
     reference_source_dir = private_course_driver.get_task_solution_dir(task)
     reference_config_dir = private_course_driver.get_task_config_dir(task)
     reference_public_tests_dir = private_course_driver.get_task_public_test_dir(task)
@@ -29,12 +72,23 @@ def _check_single_task(
     assert reference_public_tests_dir or reference_private_tests_dir, \
         'reference_public_tests_dir or reference_private_tests_dir have to exists'
 
-    if catch_output:
-        f = io.StringIO()
-        with redirect_stderr(f), redirect_stdout(f):
-            print_task_info(task.full_name)
-            try:
-                tester.test_task(
+    with ExitStack() as stack:
+        if stream_output:
+            assert _output_queue is not None, 'Output queue have to be set up in the worker'
+            _output_queue.put(('start', task.full_name, None))
+            log_file = log_dir / f'{task.full_name}.log' if log_dir else None
+            stream = stack.enter_context(TaskOutputStream(_output_queue, task.full_name, log_file=log_file))
+            stack.enter_context(redirect_stderr(stream))
+            stack.enter_context(redirect_stdout(stream))
+            # redirects catch python writes only; with output captured external commands output is forwarded
+            # through print_info too (see Sandbox), so it gets the task prefix and into the log file
+            stack.enter_context(capture_output(tee=True))
+
+        print_task_info(task.full_name)
+        # failures are returned in the report, so stages timings are passed from the worker process too
+        try:
+            with measure_task(task.full_name) as report:
+                report.score = tester.test_task(
                     reference_source_dir,
                     reference_config_dir,
                     reference_public_tests_dir,
@@ -43,24 +97,9 @@ def _check_single_task(
                     verbose=verbose,
                     normalize_output=True,
                 )
-            except RunFailedError as e:
-                out = f.getvalue()
-                raise RunFailedError(e.msg, out + (e.output or '')) from e
-            else:
-                out = f.getvalue()
-                return out
-    else:
-        print_task_info(task.full_name)
-        tester.test_task(
-            reference_source_dir,
-            reference_config_dir,
-            reference_public_tests_dir,
-            reference_private_tests_dir,
-            reference_tests_root_dir,
-            verbose=verbose,
-            normalize_output=True,
-        )
-        return None
+        except RunFailedError:
+            pass
+        return report
 
 
 def _check_tasks(
@@ -69,44 +108,214 @@ def _check_tasks(
         private_course_driver: CourseDriver,
         parallelize: bool = False,
         num_processes: int | None = None,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        durations: TaskDurations | None = None,
+        log_dir: Path | None = None,
+        max_failures: int | None = None,
         verbose: bool = True,
-) -> bool:
+) -> list[TaskReport]:
+    reports = {task.full_name: TaskReport(task.full_name, TASK_SKIPPED) for task in tasks}
+
     # Check itself
     if parallelize:
         _num_processes = num_processes or multiprocessing.cpu_count()
         print_info(f'Parallelize task checks with <{_num_processes}> processes...', color='blue')
 
-        success = True
-        # with ThreadPoolExecutor(max_workers=num_cores) as e:
-        with ProcessPoolExecutor(max_workers=_num_processes) as e:
-            check_futures = {
-                e.submit(_check_single_task, task, tester, private_course_driver, verbose=verbose, catch_output=True)
-                for task in tasks
-            }
-
-            for future in as_completed(check_futures):
-                try:
-                    captured_out = future.result()
-                except RunFailedError as e:
-                    print_info(e.output)
-                    success &= False
-                except Exception as e:
-                    print_info('Unknown exception:', e, color='red')
-                    raise e
-                else:
-                    print_info(captured_out)
-        return success
+        predicted_makespan = None
+        if durations:
+            # Longest tasks first, so the tail is made of short ones (pool starts tasks in submission order)
+            tasks = durations.sort_longest_first(tasks)
+            predicted_makespan = durations.predict_makespan(tasks, _num_processes)
+
+        # Tasks output is streamed line by line to the parent and printed with task name prefix
+        output_queue: multiprocessing.queues.Queue[Any] = multiprocessing.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        progress = CheckProgress(
+            len(tasks),
+            workers=_num_processes,
+            estimates={task.full_name: durations.get(task.full_name) for task in tasks} if durations else None,
+        )
+        printer = threading.Thread(target=progress.consume, args=(output_queue,), daemon=True)
+        printer.start()
+
+        start_time = time.monotonic()
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=_num_processes,
+                    initializer=_init_worker,
+                    initargs=(output_queue,),
+            ) as e:
+                check_futures = {
+                    e.submit(
+                        _check_single_task,
+                        task,
+                        tester,
+                        private_course_driver,
+                        verbose=verbose,
+                        stream_output=True,
+                        log_dir=log_dir,
+                    ): task
+                    for task in tasks
+                }
+
+                for future in as_completed(check_futures):
+                    task = check_futures[future]
+                    try:
+                        report = future.result()
+                    except Exception as e:
+                        print_info('Unknown exception:', e, color='red')
+                        raise e
+                    reports[task.full_name] = report
+                    if report.status == TASK_FAILED:
+                        print_info(f'[{task.full_name}] {report.message}', color='red')
+                        progress.finish(task.full_name, failed=True)
+                        if max_failures and len(progress.failed) >= max_failures:
+                            print_info(f'Stop checking after <{len(progress.failed)}> failed tasks', color='red')
+                            for pending_future in check_futures:
+                                pending_future.cancel()
+                            _terminate_workers()
+                            break
+                    else:
+                        progress.finish(task.full_name)
+                        if durations and report.duration is not None:
+                            durations.record(task.full_name, report.duration)
+        finally:
+            output_queue.put(None)
+            printer.join()
+        makespan = time.monotonic() - start_time
+
+        if durations:
+            durations.save()
+            print_info(
+                f'Predicted makespan {predicted_makespan:.1f}s, actual {makespan:.1f}s',
+                color='blue',
+            )
+        if log_dir:
+            print_info(f'Tasks logs are saved to {log_dir}', color='blue')
     else:
-        for task in tasks:
-            try:
-                _check_single_task(task, tester, private_course_driver, verbose=verbose, catch_output=False)
-            except RunFailedError:
-                return False
-            except Exception as e:
-                print_info('Unknown exception:', e, color='red')
-                raise e
+        # Build next tasks while the current one is tested; output is printed in tasks order
+        pipeline = TaskPipeline(tester, build_jobs=build_jobs, test_jobs=test_jobs)
+        jobs = [
+            partial(_check_single_task, task, tester, private_course_driver, verbose=verbose)
+            for task in tasks
+        ]
+        failures = 0
+        try:
+            with closing(pipeline.run(jobs)) as results:
+                for task, result in zip(tasks, results):
+                    print_info(result.output, end='')
+                    if result.error is not None:
+                        print_info('Unknown exception:', result.error, color='red')
+                        raise result.error
+                    assert result.result is not None
+                    reports[task.full_name] = result.result
+                    if result.result.status == TASK_FAILED:
+                        failures += 1
+                        # stop at the first failure by default
+                        if failures >= (max_failures or 1):
+                            # kill commands of the next tasks already in progress
+                            Sandbox.terminate_all()
+                            break
+        finally:
+            Sandbox.reset_terminated()
+
+    return list(reports.values())
+
+
+def _get_changed_tasks(
+        changed_files: list[str],
+        course_schedule: CourseSchedule,
+        private_course_driver: CourseDriver,
+) -> tuple[set[str], list[str]]:
+    """
+    Map changed files to the tasks they belong to
+    @param changed_files: Changed files paths relative to the course root
+    @param course_schedule: Course schedule with all the tasks
+    @param private_course_driver: Driver to map tasks to dirs
+    @return: full names of changed tasks and changed shared files (course-wide test inputs, e.g. cmake files)
+    """
+    root_dir = private_course_driver.root_dir
+    tasks_dirs = [
+        (task.full_name, task_dir)
+        for task in course_schedule.tasks.values()
+        for task_dir in private_course_driver.get_task_owned_dirs(task)
+    ]
+    not_tested_dirs = [
+        group_dir
+        for group in course_schedule.groups.values()
+        for group_dir in [
+            private_course_driver.get_group_lecture_dir(group, check_exists=False),
+            private_course_driver.get_group_submissions_review_dir(group, check_exists=False),
+        ]
+        if group_dir
+    ]
+
+    changed_tasks: set[str] = set()
+    shared_files: list[str] = []
+    for file in changed_files:
+        path = root_dir / file
+        owners = {task_name for task_name, task_dir in tasks_dirs if path.is_relative_to(task_dir)}
+        if owners:
+            changed_tasks |= owners
+        elif filename_match_patterns(path, NOT_TESTED_FILES_PATTERNS):
+            continue
+        elif any(path.is_relative_to(not_tested_dir) for not_tested_dir in not_tested_dirs):
+            continue
+        else:
+            shared_files.append(file)
+
+    return changed_tasks, shared_files
+
+
+def _watch_tasks(
+        tasks: list[Task],
+        tester: Tester,
+        private_course_driver: CourseDriver,
+        poll_interval: float = 1.,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        verbose: bool = True,
+) -> None:
+    # Keep the process (course, tester, build dirs pool) warm and re-check only tasks with changed files
+    tasks_dirs = {task.full_name: private_course_driver.get_task_owned_dirs(task) for task in tasks}
+    watcher = FilesWatcher(
+        sorted({task_dir for task_dirs in tasks_dirs.values() for task_dir in task_dirs}),
+        poll_interval=poll_interval,
+    )
+
+    tasks_to_check = tasks
+    try:
+        while True:
+            reports = _check_tasks(
+                tasks_to_check,
+                tester,
+                private_course_driver,
+                build_jobs=build_jobs,
+                test_jobs=test_jobs,
+                max_failures=len(tasks_to_check),
+                verbose=verbose,
+            )
+            failed = [report.name for report in reports if report.status == TASK_FAILED]
+            if failed:
+                print_info(f'Failed tasks: {failed}', color='red')
+            else:
+                print_info('All checked tasks passed', color='green')
+            print_info('Watching for changes (Ctrl+C to stop)...', color='blue')
 
-        return True
+            tasks_to_check = []
+            while not tasks_to_check:
+                changed_files = watcher.wait_changes()
+                tasks_to_check = [
+                    task for task in tasks
+                    if any(
+                        file.is_relative_to(task_dir)
+                        for file in changed_files
+                        for task_dir in tasks_dirs[task.full_name]
+                    )
+                ]
+            print_info('Changed files:', [str(file) for file in changed_files], color='yellow')
+    except KeyboardInterrupt:
+        print_info('Stop watching', color='blue')
 
 
 def pre_release_check_tasks(
@@ -117,6 +326,21 @@ def pre_release_check_tasks(
         *,
         parallelize: bool = False,
         num_processes: int | None = None,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        max_jobs: int | None = None,
+        durations: TaskDurations | None = None,
+        log_dir: Path | None = None,
+        max_failures: int | None = None,
+        changed_since: str | None = None,
+        check_all_on_shared_changes: bool = False,
+        shard_index: int | None = None,
+        shard_count: int | None = None,
+        shard_durations: TaskDurations | None = None,
+        report_path: Path | None = None,
+        junit_report_path: Path | None = None,
+        watch: bool = False,
+        watch_interval: float = 1.,
         contributing: bool = False,
 ) -> None:
     # select tasks or use `tasks` param
@@ -133,15 +357,76 @@ def pre_release_check_tasks(
             print_info('Testing enabled groups...', color='yellow')
             print_info([i.name for i in course_schedule.get_groups(enabled=True)])
 
+    # select only tasks affected by changes
+    if changed_since:
+        changed_files = get_changed_files_list(private_course_driver.root_dir, changed_since)
+        changed_tasks, shared_files = _get_changed_tasks(changed_files, course_schedule, private_course_driver)
+        if shared_files:
+            print_info(f'Changed shared files since <{changed_since}>:', color='orange')
+            print_info(shared_files)
+        if shared_files and check_all_on_shared_changes:
+            print_info('Shared files changed, testing all selected tasks...', color='yellow')
+        else:
+            tasks = [task for task in tasks if task.full_name in changed_tasks]
+            print_info(f'Testing tasks changed since <{changed_since}>...', color='yellow')
+            print_info([i.full_name for i in tasks])
+
+    # select only tasks of the current shard
+    report = CheckReport(selected_tasks=[task.full_name for task in tasks])
+    if shard_count:
+        assert shard_index is not None and 0 <= shard_index < shard_count, \
+            f'Shard index have to be in [0, {shard_count})'
+        # all shards have to balance with the same history (or without it) to get the same split
+        tasks = split_into_shards(tasks, shard_count, shard_durations)[shard_index]
+        report.shard_index, report.shard_count = shard_index, shard_count
+        print_info(f'Testing shard <{shard_index}> of <{shard_count}>...', color='yellow')
+        print_info([i.full_name for i in tasks])
+
+    # cap concurrent commands of all tasks (and jobs of build tools in them) with shared tokens pool
+    jobserver = None
+    if max_jobs:
+        jobserver = JobServer(max_jobs)
+        print_info(f'Limit concurrent jobs to <{jobserver.jobs}>...', color='blue')
+    tester.set_jobserver(jobserver)
+
     # tests itself
-    success = _check_tasks(
-        tasks,
-        tester,
-        private_course_driver,
-        parallelize=parallelize,
-        num_processes=num_processes,
-        verbose=not contributing,
-    )
+    try:
+        if watch:
+            _watch_tasks(
+                tasks,
+                tester,
+                private_course_driver,
+                poll_interval=watch_interval,
+                build_jobs=build_jobs,
+                test_jobs=test_jobs,
+                verbose=not contributing,
+            )
+            return
+
+        report.tasks = _check_tasks(
+            tasks,
+            tester,
+            private_course_driver,
+            parallelize=parallelize,
+            num_processes=num_processes,
+            build_jobs=build_jobs,
+            test_jobs=test_jobs,
+            durations=durations,
+            log_dir=log_dir,
+            max_failures=max_failures,
+            verbose=not contributing,
+        )
+    finally:
+        tester.set_jobserver(None)
+        if jobserver:
+            jobserver.close()
+
+    if report_path:
+        report.save(report_path)
+        print_info(f'Report is saved to {report_path}', color='blue')
+    if junit_report_path:
+        report.save_junit(junit_report_path)
+        print_info(f'JUnit report is saved to {junit_report_path}', color='blue')
 
-    if not success:
+    if not report.success:
         sys.exit(1)
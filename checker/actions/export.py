@@ -7,6 +7,8 @@ from ..course import CourseConfig, CourseDriver
 from ..course.schedule import CourseSchedule
 from ..utils.files import filename_match_patterns
 from ..utils.git import commit_push_all_repo, setup_repo_in_dir
+from ..utils.manifest import Manifest, get_file_digest
+from ..utils.mirror import GitMirror
 from ..utils.print import print_info
 
 
@@ -119,6 +121,52 @@ def _get_disabled_files(
     return set(all_files) - enabled_files - set(course_driver.root_dir.glob('.git/**/*')) - {course_driver.root_dir}
 
 
+def _sync_dir_files(
+        target_dir: Path,
+        files: dict[str, Path],
+) -> tuple[list[str], list[str]]:
+    """
+    Make the dir (except .git) contain exactly the files given; changed files are found with the dir manifest
+    @param target_dir: Dir to sync
+    @param files: mapping of relative posix paths in the dir to source files
+    @return: copied and deleted files
+    """
+    manifest = Manifest.build(target_dir, ignore_names={'.git'})
+
+    # files are deleted first, so files can replace dirs with the same name and vice versa
+
+    deleted_files = sorted(set(manifest.files) - set(files))
+    for file in deleted_files:
+        (target_dir / file).unlink()
+    emptied_dirs = {
+        folder
+        for file in deleted_files
+        for folder in (target_dir / file).parents
+        if folder != target_dir and folder.is_relative_to(target_dir)
+    }
+    for folder in sorted(emptied_dirs, key=lambda folder: len(folder.parts), reverse=True):
+        if not any(folder.iterdir()):
+            folder.rmdir()
+
+    copied_files = []
+    for file, source in sorted(files.items()):
+        target = target_dir / file
+        entry = manifest.files.get(file)
+        source_stat = source.stat()
+        if (
+                entry is not None
+                and entry.size == source_stat.st_size
+                and target.stat().st_mode == source_stat.st_mode
+                and entry.digest == get_file_digest(source)
+        ):
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(source, target)
+        copied_files.append(file)
+
+    return copied_files, deleted_files
+
+
 def export_public_files(
         course_config: CourseConfig,
         course_schedule: CourseSchedule,
@@ -127,6 +175,7 @@ def export_public_files(
         export_dir: Path,
         *,
         dry_run: bool = False,
+        mirrors_dir: Path | None = None,
 ) -> None:
     export_dir.mkdir(exist_ok=True, parents=True)
 
@@ -160,37 +209,30 @@ def export_public_files(
             git_user_email=course_config.gitlab_service_email,
             git_user_name=course_config.gitlab_service_name,
             branch=course_config.default_branch,
+            mirror=GitMirror(mirrors_dir, course_config.public_repo) if mirrors_dir else None,
         )
 
-    # remove all files from export_dir (to delete deleted files)
-    print_info('Delete all files from old export_dir (keep .git)...', color='orange')
-    deleted_files: set[str] = set()
-    for path in export_dir.glob('*'):
-        if path.name == '.git':
-            continue
-
-        if path.is_file() or path.is_symlink():
-            path.unlink()
-        elif path.is_dir():
-            shutil.rmtree(path)
-        else:
-            print(f'wtf. {path}')
-
-        deleted_files.add(str(path.as_posix()))
-
-    # copy updated files
-    print_info('Copy updated files...', color='orange')
+    # collect files to export
+    print_info('Collect files to export...', color='orange')
+    export_files: dict[str, Path] = {}
     for filename_private, filename_public in sorted(files_and_dirs_to_add_map.items()):
         relative_private_filename = str(filename_private.relative_to(private_course_driver.root_dir))
         relative_public_filename = str(filename_public.relative_to(public_course_driver.root_dir))
         print_info(f'  {relative_private_filename}', color='grey')
         print_info(f'  \t-> {relative_public_filename}', color='grey')
 
+        public_path = filename_public.relative_to(public_course_driver.root_dir)
         if filename_private.is_dir():
-            shutil.copytree(filename_private, export_dir / relative_public_filename, dirs_exist_ok=True)
+            for file in filename_private.glob('**/*'):
+                if file.is_file():
+                    export_files[(public_path / file.relative_to(filename_private)).as_posix()] = file
         else:
-            (export_dir / relative_public_filename).parent.mkdir(exist_ok=True, parents=True)
-            shutil.copy(filename_private, export_dir / relative_public_filename)
+            export_files[public_path.as_posix()] = filename_private
+
+    # sync export_dir with the files: unchanged files are not touched, deleted files are removed (keep .git)
+    print_info('Sync export_dir files...', color='orange')
+    copied_files, deleted_files = _sync_dir_files(export_dir, export_files)
+    print_info(f'  {len(copied_files)} files copied, {len(deleted_files)} files deleted', color='grey')
 
     if not dry_run:
         # files for git add
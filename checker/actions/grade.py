@@ -1,24 +1,60 @@
 from __future__ import annotations
 
+import io
 import os
+import queue
 import subprocess
 import sys
 import tempfile
+import threading
+from collections.abc import Callable
+from contextlib import ExitStack, closing
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
 from ..course import CourseConfig, CourseDriver, CourseSchedule, Group, Task
 from ..exceptions import RunFailedError
 from ..testers import Tester
-from ..utils import get_folders_diff_except_public, get_tracked_files_list
-from ..utils.manytask import PushFailedError, push_report
-from ..utils.print import print_info, print_task_info
+from ..testers.pipeline import TaskPipeline, run_jobs_in_processes
+from ..utils import (
+    fetch_commit,
+    get_commits_changed_files,
+    get_commits_diff_except_public,
+    get_folders_diff_except_public,
+    get_tracked_files_list,
+    has_commit,
+    pack_folder,
+)
+from ..utils.manytask import (
+    SOLUTION_ARCHIVE_NAME,
+    PushFailedError,
+    ScoreReport,
+    get_manytask_client,
+    is_unavailable_error,
+)
+from ..utils.mirror import GitMirror
+from ..utils.outbox import ReportOutbox
+from ..utils.print import capture_output, print_info, print_task_info
+from ..utils.report import TASK_PASSED, CheckReport, TaskReport, measure_task
 
 
 class GitException(Exception):
     pass
 
 
+def _get_commits_changes(
+        solution_root: str,
+        revisions: list[str],
+        author: str | None = None,
+) -> list[str]:
+    try:
+        return get_commits_changed_files(Path(solution_root), revisions, author=author)
+    except subprocess.CalledProcessError as e:
+        print_info(f'Unable to get commits changes: {e}', color='orange')
+        return []
+
+
 def _get_git_changes(
         solution_root: str,
         public_repo_url: str,
@@ -76,37 +112,20 @@ def _get_git_changes(
     elif git_changes_type.startswith('log'):
         if git_changes_type == 'log_between_no_merges':
             print_info(f'Looking log between {prev_commit_sha} and {current_commit_sha} without merges...')
-            prev_commit_sha = '' if prev_commit_sha is None else prev_commit_sha
-            git_status = subprocess.run(
-                f'cd {solution_root} && '
-                f'git log --pretty="%H" --no-merges {prev_commit_sha or ""}..{current_commit_sha} | '
-                f'while read commit_hash; do git show --oneline --name-only $commit_hash'
-                f'| tail -n+2; done | sort | uniq',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                shell=True
-            ).stdout
-            print_info(git_status)
-            changes = git_status.split('\n')
+            changes = _get_commits_changes(solution_root, [f'{prev_commit_sha}..{current_commit_sha}'])
+            print_info('\n'.join(changes))
         elif git_changes_type == 'log_between_by_author':
             assert isinstance(author_name, str)
             print_info(
                 f'Looking log between {prev_commit_sha} and {current_commit_sha} '
                 f'by author="{author_name.split(" ")[0]}"...',
             )
-            prev_commit_sha = '' if prev_commit_sha is None else prev_commit_sha
-            git_status = subprocess.run(
-                f'cd {solution_root} && '
-                f'git log --pretty="%H" --author="{author_name.split(" ")[0]}"'
-                f'{prev_commit_sha or ""}..{current_commit_sha} | '
-                f'while read commit_hash; do git show --oneline --name-only $commit_hash '
-                f'| tail -n+2; done | sort | uniq',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                shell=True,
-            ).stdout
-            print_info(git_status)
-            changes = git_status.split('\n')
+            changes = _get_commits_changes(
+                solution_root,
+                [f'{prev_commit_sha}..{current_commit_sha}'],
+                author=author_name.split(' ')[0],
+            )
+            print_info('\n'.join(changes))
         elif git_changes_type == 'log_between_no_upstream':
             print_info(f'Looking log_between_no_upstream between {prev_commit_sha} and {current_commit_sha} '
                        f'which not in `{public_repo_url}`...')
@@ -126,19 +145,12 @@ def _get_git_changes(
 
             print_info('---')
 
-            git_status = subprocess.run(
-                f'cd {solution_root} && '
-                f'git log --pretty="%H" {prev_commit_sha or ""}..{current_commit_sha} '
-                f'--no-merges --not --remotes=upstream | '
-                f'while read commit_hash; do git show --oneline --name-only $commit_hash '
-                f'| tail -n+2; done | sort | uniq',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                shell=True
-            ).stdout
+            changes = _get_commits_changes(
+                solution_root,
+                [f'{prev_commit_sha}..{current_commit_sha}', '--not', '--remotes=upstream'],
+            )
             print_info('Detected changes in the following files:')
-            print_info(git_status, color='grey')
-            changes = git_status.split('\n')
+            print_info('\n'.join(changes), color='grey')
         else:
             raise GitException(f'Unknown git_changes_type={git_changes_type}')
 
@@ -150,13 +162,10 @@ def _get_git_changes(
 def grade_single_task(
         task: Task,
         tester: Tester,
-        course_config: CourseConfig,
         public_course_driver: CourseDriver,
         private_course_driver: CourseDriver,
-        user_id: int,
-        send_time: datetime,
-        inspect: bool = False
-) -> bool:
+        inspect: bool = False,
+) -> TaskReport:
     print_task_info(task.full_name)
     source_dir = public_course_driver.get_task_solution_dir(task)
     reference_config_dir = private_course_driver.get_task_config_dir(task)
@@ -169,15 +178,16 @@ def grade_single_task(
         'reference_public_tests_dir or reference_private_tests_dir have to exists'
 
     try:
-        score_percentage = tester.test_task(
-            source_dir,
-            reference_config_dir,
-            reference_public_tests_dir,
-            reference_private_tests_dir,
-            reference_tests_root_dir,
-            verbose=inspect,
-            normalize_output=inspect,
-        )
+        with measure_task(task.full_name) as report:
+            report.score = score_percentage = tester.test_task(
+                source_dir,
+                reference_config_dir,
+                reference_public_tests_dir,
+                reference_private_tests_dir,
+                reference_tests_root_dir,
+                verbose=inspect,
+                normalize_output=inspect,
+            )
         score = round(score_percentage * task.max_score)
         if score_percentage == 1.:
             print_info(f'\nSolution score is: {score}', color='green')
@@ -186,26 +196,237 @@ def grade_single_task(
             print_info(f'\nSolution score is: [{task.max_score}*{score_percentage}]={score}', color='green')
         if task.review:
             print_info('\nThis task is "review-able", so, open MR and wait till review.', color='blue')
-        elif not inspect:
-            use_demand_multiplier = not task.marked
-            try:
-                if not course_config.manytask_token:
-                    raise PushFailedError('Unable to find manytask token')
-                files = {
-                    path.name: (str(path.relative_to(source_dir)), open(path, 'rb'))
-                    for path in source_dir.glob('**/*')
-                    if path.is_file()
-                }
-                username, set_score, result_commit_time, result_submit_time, demand_multiplier = push_report(
+    except RunFailedError:
+        # print_info(e)
+        pass
+    return report
+
+
+class _ScoresPusher:
+    """Push scores of passed tasks in a background thread while the next tasks are tested
+    Scores of tasks passed during a push are pushed together by the next one (in a batch request if supported);
+    push output is captured, to be printed between tasks outputs
+    """
+
+    def __init__(
+            self,
+            push: Callable[[list[tuple[Task, TaskReport]]], None],
+    ) -> None:
+        """
+        @param push: Function to push scores with, e.g. `push_scores`
+        """
+        self._push = push
+        self._queue: queue.Queue[tuple[Task, TaskReport] | None] = queue.Queue()
+        self._output = io.StringIO()
+        self._output_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.errors: list[Exception] = []
+
+    def put(
+            self,
+            task: Task,
+            report: TaskReport,
+    ) -> None:
+        if self._thread is None:
+            # started lazily, so no thread runs while workers are forked
+            self._thread = threading.Thread(target=self._run, name='scores-pusher', daemon=True)
+            self._thread.start()
+        self._queue.put((task, report))
+
+    def _run(self) -> None:
+        closed = False
+        while not closed:
+            items = [self._queue.get()]
+            while not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            closed = None in items
+            tasks_reports = [item for item in items if item is not None]
+            if not tasks_reports:
+                continue
+            with capture_output() as output:
+                try:
+                    self._push(tasks_reports)
+                except Exception as e:
+                    self.errors.append(e)
+            with self._output_lock:
+                self._output.write(output.getvalue())
+
+    def pop_output(self) -> str:
+        """
+        @return: output of pushes done since the previous call
+        """
+        with self._output_lock:
+            output = self._output.getvalue()
+            self._output = io.StringIO()
+        return output
+
+    def close(self) -> None:
+        """Wait for all put scores to be pushed"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+
+def grade_tasks(
+        tasks: list[Task],
+        tester: Tester,
+        course_config: CourseConfig,
+        public_course_driver: CourseDriver,
+        private_course_driver: CourseDriver,
+        user_id: int,
+        send_time: datetime,
+        inspect: bool = False,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        parallel: int = 1,
+        outbox_path: Path | None = None,
+) -> list[TaskReport]:
+    jobs = [
+        partial(
+            grade_single_task,
+            task,
+            tester,
+            public_course_driver,
+            private_course_driver,
+            inspect=inspect,
+        )
+        for task in tasks
+    ]
+
+    if parallel > 1:
+        # Each task is tested in a worker process; output is printed in tasks order
+        print_info(f'Grade tasks in <{parallel}> processes...', color='blue')
+        results = run_jobs_in_processes(jobs, parallel)
+    else:
+        # Build next tasks while the current one is tested; output is printed in tasks order
+        results = TaskPipeline(tester, build_jobs=build_jobs, test_jobs=test_jobs).run(jobs)
+
+    # Scores are pushed in the background as soon as tasks pass, not to lose them if the job is killed
+    pusher = None
+    if not inspect:
+        pusher = _ScoresPusher(partial(
+            push_scores,
+            course_config=course_config,
+            public_course_driver=public_course_driver,
+            user_id=user_id,
+            send_time=send_time,
+            outbox_path=outbox_path,
+        ))
+
+    reports = []
+    error: Exception | None = None
+    try:
+        with closing(results):
+            for task, result in zip(tasks, results):
+                print_info(result.output, end='')
+                if pusher:
+                    print_info(pusher.pop_output(), end='')
+                if result.error is not None:
+                    error = result.error
+                    break
+                assert result.result is not None
+                report = result.result
+                reports.append(report)
+                if pusher and not task.review and report.status == TASK_PASSED and report.score is not None:
+                    pusher.put(task, report)
+    finally:
+        if pusher:
+            # Scores of the tasks passed before the failed one are pushed (or saved to the outbox) anyway
+            pusher.close()
+            print_info(pusher.pop_output(), end='')
+
+    if pusher and pusher.errors:
+        if error is None:
+            raise pusher.errors[0]
+        print_info(f'Unable to push scores of passed tasks: {pusher.errors[0]}', color='orange')
+    if error is not None:
+        raise error
+    return reports
+
+
+def push_scores(
+        tasks_reports: list[tuple[Task, TaskReport]],
+        course_config: CourseConfig,
+        public_course_driver: CourseDriver,
+        user_id: int,
+        send_time: datetime,
+        outbox_path: Path | None = None,
+) -> None:
+    """
+    Push scores of tested tasks to manytask at once (in batches if supported), with packed solution files
+    If manytask is unavailable, scores are saved to the outbox (if set) to be pushed later
+    @param tasks_reports: Passed tasks and their reports (score is a percentage of the task max score)
+    @param course_config: Course config with manytask url, token and solution files settings
+    @param public_course_driver: Driver of the student's repo to pack solution files from
+    @param user_id: Gitlab user id of the student
+    @param send_time: Commit time to push scores with
+    @param outbox_path: Outbox db file to save not pushed scores to
+    @raise PushFailedError: if any score is rejected (after pushing the rest)
+    @raise requests.RequestException: if manytask is unavailable and no outbox is set
+    """
+    if not tasks_reports:
+        return
+    if not course_config.manytask_token:
+        raise PushFailedError('Unable to find manytask token')
+    manytask = get_manytask_client(
+        course_config.manytask_url,
+        course_config.manytask_token,
+        connect_timeout=course_config.manytask_connect_timeout,
+        read_timeout=course_config.manytask_read_timeout,
+        retries=course_config.manytask_retries,
+    )
+
+    print_info(f'\nPushing scores of {len(tasks_reports)} tasks...', color='blue')
+    with ExitStack() as stack:
+        score_reports, archives = [], []
+        for task, report in tasks_reports:
+            assert report.score is not None
+            source_dir = public_course_driver.get_task_solution_dir(task)
+            assert source_dir, 'source_dir have to exists'
+            archive = stack.enter_context(pack_folder(
+                source_dir,
+                exclude_patterns=course_config.solution_files_ignore,
+                max_size=course_config.solution_files_max_size,
+            ))
+            archives.append(archive)
+            score_reports.append(ScoreReport(
+                task.name,
+                user_id,
+                round(report.score * task.max_score),
+                files={SOLUTION_ARCHIVE_NAME: (SOLUTION_ARCHIVE_NAME, archive)},
+                send_time=send_time,
+                use_demand_multiplier=not task.marked,
+            ))
+
+        results = manytask.push_reports(score_reports)
+        manytask.print_stats()
+
+        errors: list[Exception] = []
+        for (task, report), score_report, archive, result in zip(tasks_reports, score_reports, archives, results):
+            print_info(f'{task.full_name}:', color='white')
+            if isinstance(result, Exception) and is_unavailable_error(result) and outbox_path is not None:
+                # manytask is down or overloaded even after retries: do not lose the tested score
+                archive.seek(0)
+                ReportOutbox(outbox_path).put(
                     course_config.manytask_url,
-                    course_config.manytask_token,
-                    task.name,
-                    user_id,
-                    score,
-                    files=files,
-                    send_time=send_time,
-                    use_demand_multiplier=use_demand_multiplier,
+                    score_report.task_name,
+                    score_report.user_id,
+                    score_report.score,
+                    send_time=score_report.send_time,
+                    use_demand_multiplier=score_report.use_demand_multiplier,
+                    files=archive.read(),
                 )
+                print_info(
+                    f'Manytask is unavailable ({result.__class__.__name__}), '
+                    f'the score is saved to be pushed later with the commit time',
+                    color='orange',
+                )
+                report.message = 'Score is saved to the outbox'
+            elif isinstance(result, Exception):
+                print_info(f'Unable to push the score: {result}', color='orange')
+                errors.append(result)
+            else:
+                username, set_score, result_commit_time, result_submit_time, demand_multiplier = result
                 print_info(
                     f'Final score for @{username} (according to deadlines and demand): {set_score}',
                     color='blue'
@@ -219,37 +440,49 @@ def grade_single_task(
                     print_info(f'Commit at {result_commit_time} (are validated to Submit Time)', color='grey')
                 if result_submit_time:
                     print_info(f'Submit at {result_submit_time} (deadline is calculated relative to it)', color='grey')
-            except PushFailedError:
-                raise
-        return True
-    except RunFailedError:
-        # print_info(e)
-        return False
 
+    if errors:
+        raise errors[0]
 
-def grade_tasks(
-        tasks: list[Task],
-        tester: Tester,
+
+def _get_changes_using_git_plumbing(
         course_config: CourseConfig,
-        public_course_driver: CourseDriver,
-        private_course_driver: CourseDriver,
-        user_id: int,
-        send_time: datetime,
-        inspect: bool = False
-) -> bool:
-    success = True
-    for task in tasks:
-        success &= grade_single_task(
-            task,
-            tester,
-            course_config,
-            public_course_driver,
-            private_course_driver,
-            user_id,
-            send_time,
-            inspect=inspect
-        )
-    return success
+        current_folder: str,
+        old_hash: str,
+        current_repo_gitlab_path: str,
+        gitlab_token: str,
+        mirror: GitMirror | None = None,
+) -> list[str]:
+    # Same as `_get_changes_using_real_folders`, but inside the current checkout without extra working trees:
+    # only trees of the public and old commits are fetched, blobs are fetched for changed files only
+    gitlab_url_with_token = course_config.gitlab_url.replace('://', f'://gitlab-ci-token:{gitlab_token}@')
+    repo_dir = Path(current_folder)
+    public_repo_url = f'{course_config.gitlab_url}/{course_config.public_repo}.git'
+    if mirror:
+        mirror.update(public_repo_url)
+        public_repo_url = mirror.url
+    remotes = {
+        'checker-public': public_repo_url,
+        'checker-student': f'{gitlab_url_with_token}/{current_repo_gitlab_path}.git',
+    }
+
+    print_info(f'Fetching {course_config.public_repo} of {course_config.default_branch} (trees only)...', color='white')
+    public_commit = fetch_commit(repo_dir, remotes, 'checker-public', course_config.default_branch)
+
+    if has_commit(repo_dir, old_hash):
+        old_commit = old_hash
+    else:
+        print_info(f'Fetching {current_repo_gitlab_path} to get {old_hash} (trees only)...', color='white')
+        old_commit = fetch_commit(repo_dir, remotes, 'checker-student', old_hash)
+
+    print_info('Detected changes (filtering by public repo and git tracked files)', color='white')
+    changes = get_commits_diff_except_public(repo_dir, public_commit, old_commit, 'HEAD', remotes=remotes)
+
+    print_info('\nchanged_files:', color='white')
+    for change in changes:
+        print_info(f'  ->> {change}', color='white')
+
+    return changes
 
 
 def _get_changes_using_real_folders(
@@ -258,6 +491,7 @@ def _get_changes_using_real_folders(
         old_hash: str,
         current_repo_gitlab_path: str,
         gitlab_token: str,
+        mirror: GitMirror | None = None,
 ) -> list[str]:
     gitlab_url_with_token = course_config.gitlab_url.replace('://', f'://gitlab-ci-token:{gitlab_token}@')
 
@@ -266,23 +500,19 @@ def _get_changes_using_real_folders(
             # download public repo, minimal
             print_info(f'Cloning {course_config.public_repo} of {course_config.default_branch}...', color='white')
             # print_info('git clone:', color='grey')
-            subprocess.run(
-                f'git clone --depth=1 --branch={course_config.default_branch} '
-                f'{course_config.gitlab_url}/{course_config.public_repo}.git {public_dir}',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                shell=True,
-            )
-            # print_info(r.stdout, color='grey')
-            # print_info(f'ls -lah {public_dir}', color='grey')
-            subprocess.run(
-                f'ls -lah {public_dir}',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                shell=True,
-            )
+            if mirror:
+                public_repo_url = f'{course_config.gitlab_url}/{course_config.public_repo}.git'
+                mirror.update(public_repo_url)
+                mirror.clone(Path(public_dir), public_repo_url, course_config.default_branch)
+            else:
+                subprocess.run(
+                    f'git clone --depth=1 --branch={course_config.default_branch} '
+                    f'{course_config.gitlab_url}/{course_config.public_repo}.git {public_dir}',
+                    encoding='utf-8',
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    shell=True,
+                )
             # print_info(r.stdout, color='grey')
 
             # download old repo by hash, minimal
@@ -307,15 +537,6 @@ def _get_changes_using_real_folders(
                 cwd=old_dir,
             )
             # print_info(r.stdout, color='grey')
-            # print_info(f'ls -lah {old_dir}', color='grey')
-            subprocess.run(
-                f'ls -lah {old_dir}',
-                encoding='utf-8',
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                shell=True,
-            )
-            # print_info(r.stdout, color='grey')
 
             # get diff
             print_info('Detected changes (filtering by public repo and git tracked files)', color='white')
@@ -345,6 +566,13 @@ def grade_on_ci(
         tester: Tester,
         *,
         test_full_groups: bool = False,
+        build_jobs: int = 1,
+        test_jobs: int = 1,
+        parallel: int = 1,
+        outbox_path: Path | None = None,
+        report_path: Path | None = None,
+        junit_report_path: Path | None = None,
+        mirrors_dir: Path | None = None,
 ) -> None:
     solution_root = os.environ['CI_PROJECT_DIR']
 
@@ -377,34 +605,51 @@ def grade_on_ci(
     gitlab_job_token = os.environ.get('CI_JOB_TOKEN') or ''
 
     print_info('Loading changes...', color='orange')
-    # Get changes using real files difference
+    current_repo_gitlab_path = os.environ.get('CI_PROJECT_PATH', '')
+    public_mirror = GitMirror(mirrors_dir, course_config.public_repo) if mirrors_dir else None
+    # Get changes using files difference in git objects
     try:
-        current_repo_gitlab_path = os.environ['CI_PROJECT_PATH']
-        changes = _get_changes_using_real_folders(
+        changes = _get_changes_using_git_plumbing(
             course_config,
             current_folder=solution_root,
             old_hash=prev_commit_sha or course_config.default_branch,
             current_repo_gitlab_path=current_repo_gitlab_path,
             gitlab_token=gitlab_job_token,
+            mirror=public_mirror,
         )
     except Exception as e:
-        print_info('Ooops... Loading changes failed', color='red')
+        print_info('Ooops... Loading changes with git objects failed', color='red')
         print_info(e)
 
-        print_info('Trying with git diff instead\n')
-        # Get changed files via git
+        print_info('Trying with real folders instead\n')
+        # Get changes using real files difference
         try:
-            changes = _get_git_changes(
-                solution_root,
-                course_config.gitlab_url + '/' + course_config.public_repo,
-                author_name=author_name,
-                current_commit_sha=current_commit_sha,
-                prev_commit_sha=prev_commit_sha,
+            changes = _get_changes_using_real_folders(
+                course_config,
+                current_folder=solution_root,
+                old_hash=prev_commit_sha or course_config.default_branch,
+                current_repo_gitlab_path=current_repo_gitlab_path,
+                gitlab_token=gitlab_job_token,
+                mirror=public_mirror,
             )
-        except GitException as e:
+        except Exception as e:
             print_info('Ooops... Loading changes failed', color='red')
             print_info(e)
-            sys.exit(1)
+
+            print_info('Trying with git diff instead\n')
+            # Get changed files via git
+            try:
+                changes = _get_git_changes(
+                    solution_root,
+                    course_config.gitlab_url + '/' + course_config.public_repo,
+                    author_name=author_name,
+                    current_commit_sha=current_commit_sha,
+                    prev_commit_sha=prev_commit_sha,
+                )
+            except GitException as e:
+                print_info('Ooops... Loading changes failed', color='red')
+                print_info(e)
+                sys.exit(1)
 
     # Process Changed files to Changed tasks
     tasks: list[Task] = []
@@ -442,8 +687,9 @@ def grade_on_ci(
 
     # Grade itself
     user_id = int(os.environ['GITLAB_USER_ID'])
+    report = CheckReport(selected_tasks=[task.full_name for task in tasks])
     if tasks:
-        success = grade_tasks(
+        report.tasks = grade_tasks(
             tasks,
             tester,
             course_config,
@@ -451,11 +697,22 @@ def grade_on_ci(
             private_course_driver,
             user_id=user_id,
             send_time=send_time,
+            build_jobs=build_jobs,
+            test_jobs=test_jobs,
+            parallel=parallel,
+            outbox_path=outbox_path,
         )
     else:
         print_info('No changed tasks found :(', color='blue')
         print_info('Hint: commit some changes in tasks you are interested in')
-        success = False
+        report.errors.append('No changed tasks found')
+
+    if report_path:
+        report.save(report_path)
+        print_info(f'Report is saved to {report_path}', color='blue')
+    if junit_report_path:
+        report.save_junit(junit_report_path, suite_name='grade')
+        print_info(f'JUnit report is saved to {junit_report_path}', color='blue')
 
-    if not success:
+    if not report.success:
         sys.exit(1)
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
+import functools
 import re
-from datetime import datetime
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Tuple
 
 import gitlab.v4.objects
 
 from ..course import CourseConfig, CourseDriver
 from ..course.schedule import CourseSchedule
+from ..testers.pipeline import PipelineResult, run_job_captured
 from ..utils.glab import GitlabConnection
-from ..utils.manytask import PushFailedError, push_report
+from ..utils.manytask import PushFailedError, ScoreReport, get_manytask_client
 from ..utils.print import print_header_info, print_info
+from ..utils.watermark import MrsWatermark
 
 
 BANNED_FILE_EXTENSIONS = {'csv', 'json', 'txt', 'db'}
@@ -18,6 +24,9 @@ REVIEWED_TAG = 'reviewed'
 CHECKLIST_TAG = 'checklist'
 BASIC_CHECKLIST_BANNED_TAGS = {CHECKLIST_TAG, REVIEWED_TAG}
 
+# score to push and the MR discussion to mark it as set in
+MrScore = Tuple[ScoreReport, gitlab.v4.objects.ProjectMergeRequestDiscussion, gitlab.v4.objects.GroupMergeRequest]
+
 
 def grade_students_mrs_to_master(
         course_config: CourseConfig,
@@ -25,8 +34,16 @@ def grade_students_mrs_to_master(
         private_course_driver: CourseDriver,
         gitlab_connection: GitlabConnection,
         *,
+        jobs: int = 1,
+        watermark: MrsWatermark | None = None,
+        full: bool = False,
         dry_run: bool = False,
 ) -> None:
+    """
+    Grade MRs of all students
+    With the watermark only MRs updated since the last successful run are graded (unless `full`),
+    the watermark is moved if all MRs are graded and scores pushed
+    """
     students_projects = gitlab_connection.get_students_projects(course_config.students_group)
     # for project in students_projects:
     #     full_project: gitlab.v4.objects.Project = GITLAB.projects.get(project.id)
@@ -39,6 +56,9 @@ def grade_students_mrs_to_master(
         private_course_driver,
         gitlab_connection,
         usernames,
+        jobs=jobs,
+        watermark=watermark,
+        full=full,
         dry_run=dry_run,
     )
 
@@ -69,27 +89,60 @@ def _grade_mrs(
         gitlab_connection: GitlabConnection,
         usernames: list[str],
         *,
+        jobs: int = 1,
+        watermark: MrsWatermark | None = None,
+        full: bool = False,
         dry_run: bool = False,
 ) -> None:
     """
     Grade all users from list; to be used with individual and massive MRs check
+    Up to `jobs` users are graded at the same time in threads (gitlab rate limit is shared by them),
+    output of each user is printed as one block in the users order
+    Errors of a user are raised after all other users are graded and their scores pushed
+    With the watermark only MRs updated after it and not processed yet are fetched (by iid, not listing all MRs
+    of each user), the watermark is saved if there are no errors
     """
+    assert jobs > 0, 'Number of jobs have to be positive'
+    start_time = time.monotonic()
+    run_time = datetime.now(timezone.utc)
 
     # print users to check
     print_info('Users:', usernames, color='orange')
 
     # get open mrs to filter all users
     students_group = gitlab_connection.get_group(course_config.students_group)
-    students_mrs: list[gitlab.v4.objects.GroupMergeRequest] = (students_group.mergerequests
-                                                               .list(get_all=True))  # type: ignore
-    students_mrs_project_names: set[str] = set()
-    for mr in students_mrs:
-        students_mrs_project_names.update(mr.web_url.split('/'))
-    usernames = [i for i in usernames if i in students_mrs_project_names]
+    updated_after = watermark.get_updated_after() if watermark and not full else None
+    users_mrs_iids: dict[str, list[int]] | None = None
+    if updated_after is not None:
+        assert watermark is not None
+        print_info(f'Lookup MRs updated after {updated_after.isoformat()}', color='orange')
+        students_mrs: list[gitlab.v4.objects.GroupMergeRequest] = students_group.mergerequests.list(  # type: ignore
+            get_all=True, updated_after=updated_after.isoformat(), target_branch=course_config.default_branch,
+        )
+        project_id_to_name = {
+            project.id: project.name
+            for project in gitlab_connection.get_projects_in_group(course_config.students_group)
+        }
+        users_mrs_iids = {}
+        for mr in students_mrs:
+            if watermark.is_processed(f'{mr.project_id}/{mr.iid}', mr.updated_at):
+                continue
+            if mr.project_id in project_id_to_name:
+                users_mrs_iids.setdefault(project_id_to_name[mr.project_id], []).append(mr.iid)
+        usernames = [i for i in usernames if i in users_mrs_iids]
+    else:
+        students_mrs = students_group.mergerequests.list(get_all=True)  # type: ignore
+        students_mrs_project_names: set[str] = set()
+        for mr in students_mrs:
+            students_mrs_project_names.update(mr.web_url.split('/'))
+        usernames = [i for i in usernames if i in students_mrs_project_names]
     print_info('Users with MRs:', usernames, color='orange')
 
     if len(usernames) == 0:
         print_info('Could not find MRs', color='orange')
+        if watermark:
+            watermark.update(run_time, {})
+            watermark.save()
         return
 
     # get tasks we need to check
@@ -101,66 +154,235 @@ def _grade_mrs(
     print_info('Tutors:', [f'<{t.username} {t.name}>' for t in tutors], color='orange')
     id_to_tutor = {t.id: t for t in tutors}
 
-    # get current user
-    for username in usernames:
-        try:
-            user = gitlab_connection.get_user_by_username(username)
-        except Exception:
-            print_info(f'Can not find user with username={username}>', color='orange')
-            continue
+    # index students projects and users once, before users are graded in threads
+    gitlab_connection.get_students_projects(course_config.students_group)
+    gitlab_connection.index_users(course_config.students_group)
+
+    # scores are pushed at once after all MRs are checked
+    mrs_scores: list[MrScore] = []
+    processed_mrs: dict[str, str] = {}
+    errors: list[Exception] = []
+
+    users_jobs = [
+        functools.partial(
+            _grade_user_mrs,
+            course_config,
+            course_schedule,
+            gitlab_connection,
+            username,
+            tag_to_folder,
+            id_to_tutor,
+            mrs_iids=users_mrs_iids[username] if users_mrs_iids is not None else None,
+            dry_run=dry_run,
+        )
+        for username in usernames
+    ]
+    futures: list[Future[PipelineResult[tuple[list[MrScore], dict[str, str]]]]] = []
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures = [executor.submit(run_job_captured, job) for job in users_jobs]
+        for username, future in zip(usernames, futures):
+            result = future.result()
+            print_info(result.output, end='')
+            if result.error is not None:
+                print_info(f'Unable to grade MRs of user {username}: {result.error!r}', color='red')
+                errors.append(result.error)
+                continue
+            assert result.result is not None
+            user_mrs_scores, user_processed_mrs = result.result
+            mrs_scores.extend(user_mrs_scores)
+            processed_mrs.update(user_processed_mrs)
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+    # marking a score changes `updated_at` of the MR, the refreshed one is saved to the watermark
+    processed_mrs.update(_push_mrs_scores(course_config, gitlab_connection, mrs_scores))
+    _print_grading_summary(gitlab_connection, len(usernames), jobs, time.monotonic() - start_time)
+
+    if errors:
+        raise errors[0]
 
-        user_id = user.id
-        print_header_info(f'Current user: <{user.username} {user.name}>')
+    if watermark:
+        watermark.update(run_time, processed_mrs)
+        watermark.save()
+        print_info(f'MRs graded up to {run_time.isoformat()} (saved to {watermark.path})', color='grey')
 
-        # get current user's project
-        project = gitlab_connection.get_project_from_group(course_config.students_group, user.username)
-        full_project = gitlab_connection.gitlab.projects.get(project.id)
-        print_info(f'project {project.path_with_namespace}: {project.web_url}')
 
-        opened_master_mrs = full_project.mergerequests.list(
+def _grade_user_mrs(
+        course_config: CourseConfig,
+        course_schedule: CourseSchedule,
+        gitlab_connection: GitlabConnection,
+        username: str,
+        tag_to_folder: dict[str, str],
+        id_to_tutor: dict[int, gitlab.v4.objects.GroupMember],
+        *,
+        mrs_iids: list[int] | None = None,
+        dry_run: bool = False,
+) -> tuple[list[MrScore], dict[str, str]]:
+    """
+    Check basic checklist of opened MRs of the user and get scores of reviewed ones
+    @param mrs_iids: MRs to check (updated ones); None - all MRs to the default branch
+    @return: scores to push with discussions to mark them as set in; processed MRs keys to `updated_at`
+    """
+    mrs_scores: list[MrScore] = []
+    processed_mrs: dict[str, str] = {}
+
+    # get current user
+    try:
+        user = gitlab_connection.get_user_by_username(username)
+    except Exception:
+        print_info(f'Can not find user with username={username}>', color='orange')
+        return mrs_scores, processed_mrs
+
+    user_id = user.id
+    print_header_info(f'Current user: <{user.username} {user.name}>')
+
+    # get current user's project (from the students group projects index)
+    project = gitlab_connection.get_project_from_group(course_config.students_group, user.username)
+    full_project = gitlab_connection.gitlab.projects.get(project.id, lazy=True)  # only to list mrs
+    print_info(f'project {project.path_with_namespace}: {project.web_url}')
+
+    if mrs_iids is not None:
+        # re-fetch updated MRs only, as project ones (group MRs can't be changed)
+        updated_mrs: list[gitlab.v4.objects.GroupMergeRequest] = [
+            full_project.mergerequests.get(iid) for iid in mrs_iids  # type: ignore
+        ]
+        opened_master_mrs = [mr for mr in updated_mrs if mr.state == 'opened']
+        merged_master_mrs = [mr for mr in updated_mrs if mr.state == 'merged']
+        closed_master_mrs = [mr for mr in updated_mrs if mr.state == 'closed']
+    else:
+        opened_master_mrs = full_project.mergerequests.list(  # type: ignore
             get_all=True, state='opened', target_branch=course_config.default_branch,
         )
-        merged_master_mrs = full_project.mergerequests.list(
+        merged_master_mrs = full_project.mergerequests.list(  # type: ignore
             get_all=True, state='merged', target_branch=course_config.default_branch,
         )
-        closed_master_mrs = full_project.mergerequests.list(
+        closed_master_mrs = full_project.mergerequests.list(  # type: ignore
             get_all=True, state='closed', target_branch=course_config.default_branch,
         )
 
-        if not opened_master_mrs and not merged_master_mrs and not closed_master_mrs:
-            print_info('no open mrs; skip it')
+    if not opened_master_mrs and not merged_master_mrs and not closed_master_mrs:
+        print_info('no open mrs; skip it')
+        return mrs_scores, processed_mrs
+
+    print_info(
+        f'opened_master_mrs {len(opened_master_mrs)} \t '
+        f'merged_master_mrs {len(merged_master_mrs)} \t '
+        f'closed_master_mrs {len(closed_master_mrs)}',
+        color='grey',
+    )
+
+    mr: gitlab.v4.objects.GroupMergeRequest
+
+    # Check basic checklist
+    print_info('Lookup checklist')
+    for mr in opened_master_mrs:
+        print_info(f'Checking MR#{mr.iid} <{mr.title}> ({mr.state})...', color='white')
+        print_info(mr.web_url, color='white')
+        if mr.title.lower().startswith('wip:') or mr.title.lower().startswith('draft:'):
+            print_info('Draft MR - skip it.')
             continue
+        _single_mr_check_basic_checklist(
+            mr, tag_to_folder, dry_run=dry_run,
+        )
 
-        print_info(
-            f'opened_master_mrs {len(opened_master_mrs)} \t '
-            f'merged_master_mrs {len(merged_master_mrs)} \t '
-            f'closed_master_mrs {len(closed_master_mrs)}',
-            color='grey',
+    # Check score
+    print_info('Lookup score to set')
+    for mr in [*opened_master_mrs, *merged_master_mrs, *closed_master_mrs]:
+        print_info(f'Checking MR#{mr.iid} <{mr.title}> ({mr.state})...', color='white')
+        print_info(mr.web_url, color='white')
+        if mr.title.lower().startswith('wip:') or mr.title.lower().startswith('draft:'):
+            print_info('Draft MR - skip it.')
+            continue
+        mr_score = _singe_mr_grade_score_new(
+            course_config, course_schedule, mr, tag_to_folder, id_to_tutor, user_id, dry_run=dry_run,
         )
+        if mr_score:
+            mrs_scores.append(mr_score)
 
-        # Check basic checklist
-        print_info('Lookup checklist')
-        for mr in opened_master_mrs:  # type: ignore
-            print_info(f'Checking MR#{mr.iid} <{mr.title}> ({mr.state})...', color='white')
-            print_info(mr.web_url, color='white')
-            if mr.title.lower().startswith('wip:') or mr.title.lower().startswith('draft:'):
-                print_info('Draft MR - skip it.')
-                continue
-            _single_mr_check_basic_checklist(
-                mr, tag_to_folder, dry_run=dry_run,
-            )
+    # `updated_at` after own changes of the MR, not to fetch it again for them
+    for mr in [*opened_master_mrs, *merged_master_mrs, *closed_master_mrs]:
+        processed_mrs[f'{mr.project_id}/{mr.iid}'] = mr.updated_at
+    return mrs_scores, processed_mrs
 
-        # Check score
-        print_info('Lookup score to set')
-        for mr in [*opened_master_mrs, *merged_master_mrs, *closed_master_mrs]:
-            print_info(f'Checking MR#{mr.iid} <{mr.title}> ({mr.state})...', color='white')
-            print_info(mr.web_url, color='white')
-            if mr.title.lower().startswith('wip:') or mr.title.lower().startswith('draft:'):
-                print_info('Draft MR - skip it.')
-                continue
-            _singe_mr_grade_score_new(
-                course_config, course_schedule, mr, tag_to_folder, id_to_tutor, user_id, dry_run=dry_run,
+
+def _print_grading_summary(
+        gitlab_connection: GitlabConnection,
+        users_num: int,
+        jobs: int,
+        wall: float,
+) -> None:
+    calls = sum(stats.count for stats in gitlab_connection.stats.values())
+    throttled = sum(stats.errors for stats in gitlab_connection.stats.values())
+    waited = gitlab_connection.rate_limiter.waited if gitlab_connection.rate_limiter else 0.
+    calls_by_method = ', '.join(f'{method} {stats.count}' for method, stats in sorted(gitlab_connection.stats.items()))
+    print_header_info(f'Graded MRs of {users_num} users in {wall:.1f}s ({jobs} jobs)')
+    print_info(f'Gitlab api calls: {calls} ({calls_by_method or "none"})', color='grey')
+    print_info(f'Throttled (429 or failed): {throttled}, waited for rate limit: {waited:.1f}s', color='grey')
+
+
+def _push_mrs_scores(
+        course_config: CourseConfig,
+        gitlab_connection: GitlabConnection,
+        mrs_scores: list[MrScore],
+) -> dict[str, str]:
+    """
+    Push scores of reviewed MRs in batches and mark each pushed one in its score discussion
+    Push errors are raised after all other scores are pushed and marked
+    @return: marked MRs keys to `updated_at` after marking
+    """
+    if not mrs_scores:
+        return {}
+    if not course_config.manytask_token:
+        raise PushFailedError('Unable to find manytask token')
+
+    manytask = get_manytask_client(
+        course_config.manytask_url,
+        course_config.manytask_token,
+        connect_timeout=course_config.manytask_connect_timeout,
+        read_timeout=course_config.manytask_read_timeout,
+        retries=course_config.manytask_retries,
+    )
+    print_header_info(f'Pushing {len(mrs_scores)} scores')
+    results = manytask.push_reports([score_report for score_report, _, _ in mrs_scores])
+    manytask.print_stats()
+
+    errors: list[Exception] = []
+    marked_mrs: dict[str, str] = {}
+    for (score_report, mr_score_discussion, mr), result in zip(mrs_scores, results):
+        if isinstance(result, Exception):
+            print_info(
+                f'Unable to set score of {score_report.task_name} for user {score_report.user_id}: {result}',
+                color='orange',
             )
+            errors.append(result)
+            continue
+
+        username, score, _, _, _ = result
+        print_info(
+            f'Set score of {score_report.task_name} for @{username}: {score}',
+            color='blue',
+        )
+        # print_info(f'Submit at {commit_time} (deadline is calculated relative to)', color='grey')
+
+        mr_score_discussion.notes.create({'body': f'Score {score_report.score} set'})
+        try:
+            mr_score_discussion.save()
+        except Exception:
+            print_info('ERROR with saving mr_score_discussion', color='orange')
+        print_info(f'Score {score_report.score} set', color='grey')
+
+        try:
+            project = gitlab_connection.gitlab.projects.get(mr.project_id, lazy=True)
+            marked_mrs[f'{mr.project_id}/{mr.iid}'] = project.mergerequests.get(mr.iid).updated_at
+        except gitlab.GitlabError as e:
+            print_info(f'Unable to refresh MR#{mr.iid}, it is checked again by the next run: {e}', color='grey')
+
+    if errors:
+        raise errors[0]
+    return marked_mrs
 
 
 def _get_tag_to_folder_dict(course_schedule: CourseSchedule, course_driver: CourseDriver) -> dict[str, str]:
@@ -186,10 +408,11 @@ def _singe_mr_grade_score_new(
         user_id: int,
         *,
         dry_run: bool = False,
-) -> None:
+) -> MrScore | None:
     """
-    Get single MR, find or create score discussion and set a score from it
+    Get single MR, find or create score discussion and get a score to set from it
     Looking for comment by tutor under '#### MR score discussion:'
+    @return: score to push and the discussion to mark it as set in; None if there is no new score
     """
     print_info('labels', mr.labels, color='grey')
     print_info('source_branch', mr.source_branch, color='grey')
@@ -203,7 +426,7 @@ def _singe_mr_grade_score_new(
 
     if not tag:
         print_info(f'Can not find any of {tag_to_folder.keys()} in MR tags ({mr.labels}). Skip it')
-        return
+        return None
 
     # get actual task
     task_name = tag_to_folder[tag].split('/')[-1]
@@ -240,7 +463,7 @@ def _singe_mr_grade_score_new(
 
     if REVIEWED_TAG not in mr.labels:
         print_info(f'No `{REVIEWED_TAG}` tag. Skip it')
-        return
+        return None
 
     # get scores
     notes = [
@@ -251,11 +474,11 @@ def _singe_mr_grade_score_new(
 
     if not notes:
         print_info('No replays on discussion note. Skip it.', color='grey')
-        return
+        return None
 
     if 'Score' in notes[-1].body and 'set' in notes[-1].body:
         print_info('Score already set. Skip it.', color='grey')
-        return
+        return None
 
     score_notes: list[tuple[int, gitlab.v4.objects.ProjectMergeRequestDiscussionNote]] = []
     for note in notes:
@@ -276,38 +499,18 @@ def _singe_mr_grade_score_new(
 
     if not score_notes:
         print_info('No score replays on discussion note. Skip it.', color='grey')
-        return
+        return None
 
     # set score from last score
     last_score, last_note = score_notes[-1]
-
-    try:
-        if not course_config.manytask_token:
-            raise PushFailedError('Unable to find manytask token')
-
-        username, score, _, _, _ = push_report(
-            course_config.manytask_url,
-            course_config.manytask_token,
-            task_name,
-            user_id,
-            last_score,
-            check_deadline=False,
-            use_demand_multiplier=False,
-        )
-        print_info(
-            f'Set score for @{username}: {score}',
-            color='blue',
-        )
-        # print_info(f'Submit at {commit_time} (deadline is calculated relative to)', color='grey')
-    except PushFailedError:
-        raise
-
-    mr_score_discussion.notes.create({'body': f'Score {last_score} set'})
-    try:
-        mr_score_discussion.save()
-    except Exception:
-        print_info('ERROR with saving mr_score_discussion', color='orange')
-    print_info(f'Score {last_score} set', color='grey')
+    score_report = ScoreReport(
+        task_name,
+        user_id,
+        last_score,
+        check_deadline=False,
+        use_demand_multiplier=False,
+    )
+    return score_report, mr_score_discussion, mr
 
 
 def _single_mr_check_basic_checklist(
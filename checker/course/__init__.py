@@ -1,3 +1,4 @@
 from .config import CourseConfig  # noqa: F401
 from .driver import CourseDriver  # noqa: F401
+from .durations import TaskDurations  # noqa: F401
 from .schedule import CourseSchedule, Group, Task  # noqa: F401
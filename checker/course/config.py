@@ -5,7 +5,7 @@ Include tests, layout, manytask url, gitlab urls, etc. settings
 from __future__ import annotations
 
 import os
-from dataclasses import InitVar, dataclass
+from dataclasses import InitVar, dataclass, field
 from pathlib import Path
 
 import yaml
@@ -14,6 +14,13 @@ from ..exceptions import BadConfig
 from ..utils.print import print_info
 
 
+# caches, envs and vcs dirs, binaries and data files
+SOLUTION_FILES_IGNORE = [
+    '.*', '__pycache__', '*.pyc', '*.so', '*.o', '*.a', '*.egg-info', 'venv', 'node_modules', 'build',
+    '*.zip', '*.tar', '*.gz', '*.xz', '*.csv', '*.npy', '*.pkl', '*.parquet',
+]
+
+
 @dataclass
 class CourseConfig:
     # main course settings
@@ -49,6 +56,19 @@ class CourseConfig:
     layout: str = 'groups'
     executor: str = 'sandbox'
 
+    # manytask client default (seconds)
+    manytask_connect_timeout: float = 5.
+    manytask_read_timeout: float = 60.
+    manytask_retries: int = 3
+
+    # gitlab client default (requests per second of the whole job, all threads)
+    gitlab_rate_limit: float | None = None
+    gitlab_rate_limit_burst: int = 10
+
+    # solution files pushed to manytask with the score, packed to tar.gz
+    solution_files_max_size: int = 1024 * 1024  # bytes, before compression
+    solution_files_ignore: list[str] = field(default_factory=lambda: list(SOLUTION_FILES_IGNORE))
+
     # info
     links: dict[str, str] | None = None
 
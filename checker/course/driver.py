@@ -406,3 +406,23 @@ class CourseDriver:
             return path_split[0]
         else:
             assert False, 'Not Reachable'  # pragma: no cover
+
+    def get_task_owned_dirs(
+            self,
+            task: Task,
+    ) -> list[Path]:
+        """
+        Get all dirs with files of the task (solution, template, tests, config)
+        Dirs can be nested or not exist, e.g. to map deleted files to the task
+        @param task: Task to get dirs of
+        @return: list of the task dirs
+        """
+        owned_dirs = [
+            self.get_task_dir(task, check_exists=False),
+            self.get_task_solution_dir(task, check_exists=False),
+            self.get_task_template_dir(task, check_exists=False),
+            self.get_task_public_test_dir(task, check_exists=False),
+            self.get_task_private_test_dir(task, check_exists=False),
+            self.get_task_config_dir(task, check_exists=False),
+        ]
+        return sorted({owned_dir for owned_dir in owned_dirs if owned_dir})
@@ -0,0 +1,170 @@
+"""
+History of tasks testing durations
+Used to schedule the longest tasks first, so a heavy task started last does not dominate the whole run
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import statistics
+import tempfile
+from pathlib import Path
+
+from ..utils.print import print_info
+from .schedule import Task
+
+
+# Estimated testing time (seconds) of a task without history
+DEFAULT_SYSTEM_DURATIONS = {
+    'python': 10.,
+    'make': 10.,
+    'cpp': 100.,
+}
+DEFAULT_DURATION = 30.
+
+
+def get_default_durations_path() -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'checker' / 'durations.json'
+
+
+class TaskDurations:
+    """Tasks wall time of previous runs, stored in a small json file per course"""
+
+    def __init__(
+            self,
+            path: Path,
+            course: str,
+            system: str,
+            smoothing: float = 0.5,
+    ) -> None:
+        """
+        @param path: History file path
+        @param course: Course name to keep durations of
+        @param system: Testing system to estimate unknown tasks with
+        @param smoothing: Weight of the new measurement in the recorded duration
+        """
+        self.path = path
+        self.course = course
+        self.system = system
+        self.smoothing = smoothing
+
+        self._history: dict[str, dict[str, float]] = {}
+        try:
+            with open(path) as f:
+                history = json.load(f)
+            if not isinstance(history, dict):
+                raise TypeError(f'Got <{type(history).__name__}> instead of <dict>')
+            self._history = history
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, TypeError) as e:
+            print_info(f'WARNING: unable to read durations history {path}, ignore it:', e, color='orange')
+
+    @property
+    def durations(self) -> dict[str, float]:
+        return self._history.setdefault(self.course, {})
+
+    def estimate(self) -> float:
+        """
+        Duration of a task without history
+        @return: median of the known course tasks durations or the system default
+        """
+        if self.durations:
+            return statistics.median(self.durations.values())
+        return DEFAULT_SYSTEM_DURATIONS.get(self.system, DEFAULT_DURATION)
+
+    def get(
+            self,
+            task_name: str,
+    ) -> float:
+        """
+        @param task_name: Task full name
+        @return: Recorded (or estimated) task duration in seconds
+        """
+        if task_name in self.durations:
+            return self.durations[task_name]
+        return self.estimate()
+
+    def record(
+            self,
+            task_name: str,
+            duration: float,
+    ) -> None:
+        """
+        Record measured task duration (smoothed with the previous ones)
+        @param task_name: Task full name
+        @param duration: Measured wall time in seconds
+        """
+        if task_name in self.durations:
+            duration = self.smoothing * duration + (1 - self.smoothing) * self.durations[task_name]
+        self.durations[task_name] = round(duration, 3)
+
+    def save(self) -> None:
+        """Atomically write the history file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.path.name}.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._history, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def sort_longest_first(
+            self,
+            tasks: list[Task],
+    ) -> list[Task]:
+        """
+        Order tasks for LPT (longest processing time first) scheduling
+        @param tasks: Tasks to order
+        @return: Tasks sorted by duration descending (stable for equal durations)
+        """
+        return sorted(tasks, key=lambda task: self.get(task.full_name), reverse=True)
+
+    def predict_makespan(
+            self,
+            tasks: list[Task],
+            workers: int,
+    ) -> float:
+        """
+        Simulate tasks execution in the given order, every task starts on the first free worker
+        @param tasks: Tasks in submission order
+        @param workers: Number of parallel workers
+        @return: Predicted wall time of all tasks in seconds
+        """
+        loads = [0.] * max(min(workers, len(tasks)), 1)
+        for task in tasks:
+            heapq.heapreplace(loads, loads[0] + self.get(task.full_name))
+        return max(loads)
+
+
+def split_into_shards(
+        tasks: list[Task],
+        shard_count: int,
+        durations: TaskDurations | None = None,
+) -> list[list[Task]]:
+    """
+    Deterministically split tasks into shards with balanced total duration (longest first, to the least loaded shard)
+    The same tasks and durations history give the same split on any machine
+    @param tasks: Tasks to split
+    @param shard_count: Number of shards
+    @param durations: Durations history to balance with; equal durations (round-robin) if None
+    @return: Tasks of each shard in the original order
+    """
+    assert shard_count > 0, 'Shards count have to be positive'
+
+    def get_duration(task: Task) -> float:
+        return durations.get(task.full_name) if durations else 1.
+
+    shards: list[list[Task]] = [[] for _ in range(shard_count)]
+    loads = [0.] * shard_count
+    for task in sorted(tasks, key=lambda task: (-get_duration(task), task.full_name)):
+        shard_index = min(range(shard_count), key=lambda i: (loads[i], i))
+        shards[shard_index].append(task)
+        loads[shard_index] += get_duration(task)
+
+    tasks_order = {task.full_name: i for i, task in enumerate(tasks)}
+    return [sorted(shard, key=lambda task: tasks_order[task.full_name]) for shard in shards]
@@ -79,7 +79,9 @@ class ManytaskRequestFailedError(CheckerException):
 
 
 class PushFailedError(ManytaskRequestFailedError):
-    pass
+    def __init__(self, msg: str = '', status_code: int | None = None) -> None:
+        super().__init__(msg)
+        self.status_code = status_code  # None if the response is not an http error, e.g. can not be decoded
 
 
 class GetFailedError(ManytaskRequestFailedError):
@@ -1 +1,2 @@
+from .jobserver import JobServer  # noqa: F401
 from .sandbox import Sandbox  # noqa: F401
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+
+@lru_cache(maxsize=None)
+def get_make_version() -> tuple[int, ...] | None:
+    """
+    Version of GNU make installed, as jobserver auth format depends on it
+    @return: version numbers or None if make is not available
+    """
+    try:
+        output = subprocess.run(['make', '--version'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = re.match(r'GNU Make (\d+(?:\.\d+)*)', output)
+    return tuple(int(i) for i in match.group(1).split('.')) if match else None
+
+
+class JobServer:
+    """Tokens pool in GNU make jobserver style, shared between processes through a named pipe
+    Every external command takes a token for its run (the implicit token of the build tool),
+    build tools (make, ninja >= 1.13 with make >= 4.4) take extra tokens from the same pool via MAKEFLAGS,
+    so total concurrent CPU-bound work across all tasks is capped with `jobs`
+    """
+
+    TOKEN = b'+'
+
+    def __init__(
+            self,
+            jobs: int,
+    ) -> None:
+        """
+        @param jobs: Max number of concurrently running jobs
+        """
+        assert jobs > 0, 'Jobs number have to be positive'
+        self.jobs = jobs
+        self._owner = True
+        self._dir = Path(tempfile.mkdtemp(prefix='checker-jobserver-'))
+        self._dir.chmod(0o755)  # sandboxed commands are executed as another user
+        self.fifo_path = self._dir / 'fifo'
+        os.mkfifo(self.fifo_path)
+        self.fifo_path.chmod(0o666)
+        self._fd: int | None = None
+        os.write(self._get_fd(), self.TOKEN * jobs)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the pipe is opened lazily in each process and removed by the original object only
+        state = self.__dict__.copy()
+        state['_fd'] = None
+        state['_owner'] = False
+        return state
+
+    def __enter__(self) -> JobServer:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _get_fd(self) -> int:
+        if self._fd is None:
+            # opened for read and write, so reads block until a token is returned, never getting EOF
+            self._fd = os.open(self.fifo_path, os.O_RDWR)
+            # make < 4.4 knows no fifo auth, so the pipe is inherited by commands (executed with close_fds=False)
+            os.set_inheritable(self._fd, True)
+        return self._fd
+
+    def acquire(self) -> bytes:
+        """
+        Take a token from the pool, block until one is available
+        @return: token to return with `release`
+        """
+        return os.read(self._get_fd(), 1)
+
+    def release(
+            self,
+            token: bytes,
+    ) -> None:
+        """
+        Return a token to the pool
+        @param token: token got from `acquire`
+        """
+        os.write(self._get_fd(), token)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold a token while in the context"""
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def env(self) -> dict[str, str]:
+        """
+        Environment variables to pass the pool to child build tools
+        No `-j` is forced, but make joins the pool and runs independent targets in parallel within it
+        @return: variables to add to the command environment
+        """
+        make_version = get_make_version()
+        if make_version is None or make_version >= (4, 4):
+            # ninja supports fifo auth only
+            auth = f'--jobserver-auth=fifo:{self.fifo_path}'
+        else:
+            fd = self._get_fd()
+            auth_option = '--jobserver-auth' if make_version >= (4, 2) else '--jobserver-fds'
+            auth = f'{auth_option}={fd},{fd}'
+        return {
+            'MAKEFLAGS': f' {auth}',
+        }
+
+    def close(self) -> None:
+        """Close the pipe; the original (not unpickled) object also removes it"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._owner:
+            shutil.rmtree(self._dir, ignore_errors=True)
@@ -4,11 +4,13 @@ import grp
 import io
 import os
 import pwd
+import signal
 import subprocess
 import sys
+import threading
 import time
 from collections.abc import Callable
-from contextlib import redirect_stderr, redirect_stdout
+from contextlib import nullcontext, redirect_stderr, redirect_stdout
 from typing import Any
 
 
@@ -18,18 +20,93 @@ except ImportError:
     unshare = None
 
 from ..exceptions import ExecutionFailedError, TimeoutExpiredError
-from ..utils.print import print_info
+from ..utils.print import is_output_captured, print_info
+from .jobserver import JobServer
+
+
+_POPEN_HAS_USER = sys.version_info >= (3, 9)  # Popen `user`, `group` and `extra_groups` arguments
 
 
 class Sandbox:
     ENV_WHITELIST = ['PATH']
 
+    # Process groups of running external commands (of all instances), to terminate them on cancellation
+    _running_groups: set[int] = set()
+    _running_lock = threading.RLock()  # re-entrant, as termination can be called from a signal handler
+    _terminated = threading.Event()
+
     def __init__(
             self,
             *,
             dry_run: bool = False,
+            jobserver: JobServer | None = None,
     ) -> None:
         self.dry_run = dry_run
+        self.jobserver = jobserver
+
+    @classmethod
+    def terminate_all(cls) -> None:
+        """
+        Kill process trees of all running external commands in this process
+        and fail new commands until `reset_terminated` is called
+        """
+        cls._terminated.set()
+        with cls._running_lock:
+            running_groups = list(cls._running_groups)
+        for process_group in running_groups:
+            cls._kill_group(process_group)
+
+    @classmethod
+    def reset_terminated(cls) -> None:
+        """Allow execution of external commands after `terminate_all`"""
+        cls._terminated.clear()
+
+    @staticmethod
+    def _kill_group(
+            process_group: int,
+    ) -> None:
+        try:
+            os.killpg(process_group, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @classmethod
+    def _run_process(
+            cls,
+            command: str | list[str],
+            *,
+            check: bool = False,
+            timeout: float | None = None,
+            **kwargs: Any,
+    ) -> subprocess.CompletedProcess[Any]:
+        # Same as subprocess.run, but the command runs in its own process group (session),
+        # so the whole process tree is killed on timeout or termination
+        with cls._running_lock:
+            if cls._terminated.is_set():
+                raise ExecutionFailedError('Execution cancelled', output='Execution cancelled\n')
+            process = subprocess.Popen(command, start_new_session=True, **kwargs)
+            cls._running_groups.add(process.pid)
+        try:
+            if cls._terminated.is_set():  # terminated while starting
+                cls._kill_group(process.pid)
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                cls._kill_group(process.pid)
+                stdout, stderr = process.communicate()
+                raise subprocess.TimeoutExpired(process.args, timeout, output=stdout, stderr=stderr)  # type: ignore
+            except BaseException:
+                cls._kill_group(process.pid)
+                process.wait()
+                raise
+        finally:
+            with cls._running_lock:
+                cls._running_groups.discard(process.pid)
+
+        returncode = process.poll()
+        if check and returncode:
+            raise subprocess.CalledProcessError(returncode, process.args, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(process.args, returncode, stdout, stderr)  # type: ignore
 
     def _execute_external(
             self,
@@ -37,6 +114,7 @@ class Sandbox:
             *,
             capture_output: bool = False,
             verbose: bool = False,
+            sandbox: bool = False,
             **kwargs: Any,
     ) -> str | None:
         if verbose or self.dry_run:
@@ -44,57 +122,73 @@ class Sandbox:
                 cmdline = command
             else:
                 cmdline = ' '.join(command)
-            if 'preexec_fn' in kwargs:
+            if sandbox:
                 cmdline = 'sandbox ' + cmdline
             if 'cwd' in kwargs:
                 cmdline = f'cd {kwargs["cwd"]} && {cmdline}'
             print_info('$', cmdline, color='grey')
-            print_info('  execution kwargs: ', kwargs, color='grey')
+            print_info('  execution kwargs: ', {k: v for k, v in kwargs.items() if k != 'env'}, color='grey')
 
         if self.dry_run:
             return None
 
         kwargs['check'] = kwargs.get('check', True)  # set check if missing
+        # every external command takes a jobserver token, the build tools take extra ones themselves
+        job_slot = self.jobserver.slot() if self.jobserver else nullcontext()
+        if self.jobserver:
+            kwargs['env'] = {**kwargs.get('env', os.environ), **self.jobserver.env()}
+        # output printed by print_info is captured (e.g. task is tested in a thread of a pipeline),
+        # so the command output is captured too and printed after it in the right place
+        forward_output = not capture_output and is_output_captured()
         try:
-            if capture_output:
+            if capture_output or forward_output:
                 start_time = time.monotonic()
-                completed_process = subprocess.run(
-                    command,
-                    close_fds=False,
-                    encoding='utf-8',
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,  # https://docs.python.org/3/library/subprocess.html -> capture_output
-                    **kwargs
-                )
+                with job_slot:
+                    completed_process = self._run_process(
+                        command,
+                        close_fds=False,
+                        encoding='utf-8',
+                        errors='replace',
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,  # https://docs.python.org/3/library/subprocess.html -> capture_output
+                        **kwargs
+                    )
                 elapsed_time_seconds = time.monotonic() - start_time
                 timeout_msg = ''
                 if verbose and 'timeout' in kwargs:
                     timeout_msg = f'\nElapsed time is {elapsed_time_seconds:.2f} ' \
                                   f'with a limit of {kwargs["timeout"]:.0f} seconds\n'
+                if forward_output:
+                    print_info((completed_process.stdout or '') + timeout_msg, end='')
+                    return None
                 if completed_process.stdout:
                     return completed_process.stdout + timeout_msg
                 return None
             else:
                 start_time = time.monotonic()
-                subprocess.run(
-                    command,
-                    close_fds=False,
-                    **kwargs
-                )
+                with job_slot:
+                    self._run_process(
+                        command,
+                        close_fds=False,
+                        **kwargs
+                    )
                 elapsed_time_seconds = time.monotonic() - start_time
                 if verbose and 'timeout' in kwargs:
                     print_info(f'Elapsed time is {elapsed_time_seconds:.2f} '
                                f'with a limit of {kwargs["timeout"]:.0f} seconds')
                 return None
         except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            output = e.output or ''
+            output = output if isinstance(output, str) else output.decode('utf-8', errors='replace')
+            if forward_output:
+                print_info(output, end='')
+
             timeout_msg = ''
             if isinstance(e, subprocess.TimeoutExpired):
                 timeout_msg = f'Your solution exceeded time limit: {kwargs["timeout"]} seconds'
                 if not capture_output:
                     print_info(timeout_msg, color='red')
 
-            output = e.output or ''
-            output = output if isinstance(output, str) else output.decode('utf-8')
             output = output + timeout_msg if capture_output else None
             if isinstance(e, subprocess.TimeoutExpired):
                 raise TimeoutExpiredError(output=output) from e
@@ -125,6 +219,32 @@ class Sandbox:
             command(**kwargs)
             return None
 
+    @staticmethod
+    def _get_nobody_kwargs(
+            verbose: bool = False,
+    ) -> dict[str, Any]:
+        # Popen arguments to run the command as nobody/nogroup (requires root)
+        try:
+            if os.geteuid() != 0:
+                raise PermissionError('Not running as root')
+            uid = pwd.getpwnam('nobody').pw_uid
+            gid = grp.getgrnam('nogroup').gr_gid
+        except Exception as e:
+            print_info('WARNING: UID and GID change failed, running with current user')
+            if verbose:
+                print_info(e.__class__.__name__, e)
+            return {}
+        if _POPEN_HAS_USER:
+            return {'user': uid, 'group': gid, 'extra_groups': []}
+
+        def set_up_user() -> None:  # pragma: nocover
+            # python 3.8 has no Popen user/group arguments; no python objects are touched here
+            os.setgroups([])
+            os.setresgid(gid, gid, gid)
+            os.setresuid(uid, uid, uid)
+
+        return {'preexec_fn': set_up_user}
+
     def __call__(
             self,
             command: str | list[str] | Callable[..., Any],
@@ -137,15 +257,16 @@ class Sandbox:
             **kwargs: Any,
     ) -> str | None:
         if isinstance(command, list) or isinstance(command, str):
-
-            def set_up_env_sandbox() -> None:  # pragma: nocover
-                env = os.environ.copy()
-                os.environ.clear()
-                for variable in self.ENV_WHITELIST:
-                    os.environ[variable] = env[variable]
-
-            def set_up_sandbox() -> None:  # pragma: nocover
-                set_up_env_sandbox()
+            # sandbox is set up with Popen arguments, not in preexec_fn: commands are run from several threads
+            # (pipelined tasks), and preexec_fn is not safe in the presence of threads
+            if (env_sandbox or sandbox) and 'env' not in kwargs:
+                kwargs['env'] = {
+                    variable: os.environ[variable]
+                    for variable in self.ENV_WHITELIST
+                    if variable in os.environ
+                }
+            if sandbox:
+                kwargs.update(self._get_nobody_kwargs(verbose=verbose))
 
                 # if unshare:
                 #     try:
@@ -158,27 +279,11 @@ class Sandbox:
                 # else:
                 #     print_info('WARNING: unshare is not installed, running without ip namespace')
 
-                try:
-                    uid = pwd.getpwnam('nobody').pw_uid
-                    gid = grp.getgrnam('nogroup').gr_gid
-                    os.setgroups([])
-                    if sys.platform.startswith('linux'):
-                        os.setresgid(gid, gid, gid)
-                        os.setresuid(uid, uid, uid)
-                except Exception as e:
-                    print_info('WARNING: UID and GID change failed, running with current user')
-                    if verbose:
-                        print_info(e.__class__.__name__, e)
-
-                set_up_env_sandbox()
-
-            if env_sandbox:
-                kwargs['preexec_fn'] = set_up_env_sandbox
-            if sandbox:
-                kwargs['preexec_fn'] = set_up_sandbox
             if timeout is not None:
                 kwargs['timeout'] = timeout
-            return self._execute_external(command, capture_output=capture_output, verbose=verbose, **kwargs)
+            return self._execute_external(
+                command, capture_output=capture_output, verbose=verbose, sandbox=sandbox, **kwargs,
+            )
         elif callable(command):
             if env_sandbox or sandbox or timeout:
                 print_info('WARNING: env_sandbox, sandbox and timeout unavailable for callable execution, skip it')
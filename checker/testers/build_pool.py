@@ -0,0 +1,135 @@
+"""
+Pool of build directories for testers
+Directories are pre-created in the build root (e.g. tmpfs mount) and removed in-process in background
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+
+class BuildDirPool:
+    """Pool of pre-created build directories
+    Process-safe: free directory is claimed with atomic rename, so the pool can be shared between processes
+    Released directories are renamed to trash and removed by background reaper thread
+    """
+
+    FREE_PREFIX = 'checker-free-'
+    BUILD_PREFIX = 'checker-build-'
+    TRASH_PREFIX = 'checker-trash-'
+
+    def __init__(
+            self,
+            root: Path | None = None,
+            size: int = 2,
+            background_cleanup: bool = True,
+    ) -> None:
+        """
+        @param root: Directory to create build directories in (default: system temp dir)
+        @param size: Number of pre-created build directories to keep ready
+        @param background_cleanup: Remove released directories in background thread
+        """
+        self.root = root or Path(tempfile.gettempdir())
+        self.size = size
+        self.background_cleanup = background_cleanup
+
+        self._queue: queue.Queue[Path] | None = None
+        self._reaper: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # threads and locks can not be passed to other processes, each process starts its own reaper
+        state = self.__dict__.copy()
+        state['_queue'] = None
+        state['_reaper'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _create_dir(self, prefix: str) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        new_dir = Path(tempfile.mkdtemp(prefix=prefix, dir=self.root))
+        new_dir.chmod(0o777)  # Set mode for build directory (for code generation and so on)
+        return new_dir
+
+    def _list(self, prefix: str) -> list[Path]:
+        try:
+            with os.scandir(self.root) as entries:
+                return [Path(entry.path) for entry in entries if entry.name.startswith(prefix)]
+        except FileNotFoundError:
+            return []
+
+    def fill(self) -> None:
+        """Pre-create free build directories up to the pool size"""
+        for _ in range(self.size - len(self._list(self.FREE_PREFIX))):
+            self._create_dir(self.FREE_PREFIX)
+
+    def acquire(self) -> Path:
+        """
+        Get empty build directory; pre-created one if any available
+        @return: Path to the build directory
+        """
+        for free_dir in self._list(self.FREE_PREFIX):
+            build_dir = free_dir.with_name(self.BUILD_PREFIX + free_dir.name[len(self.FREE_PREFIX):])
+            try:
+                os.rename(free_dir, build_dir)
+            except OSError:  # claimed by another process
+                continue
+            return build_dir
+        return self._create_dir(self.BUILD_PREFIX)
+
+    def release(self, build_dir: Path) -> None:
+        """
+        Remove build directory; in background if background_cleanup is set
+        @param build_dir: Build directory got with acquire
+        """
+        if not self.background_cleanup:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            self.fill()
+            return
+
+        trash_dir = build_dir.with_name(self.TRASH_PREFIX + build_dir.name)
+        try:
+            os.rename(build_dir, trash_dir)
+        except OSError:
+            trash_dir = build_dir
+        self._get_queue().put(trash_dir)
+
+    def wait(self) -> None:
+        """Wait till all released directories are removed"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _get_queue(self) -> queue.Queue[Path]:
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue()
+                # remove trash left by killed processes
+                for trash_dir in self._list(self.TRASH_PREFIX):
+                    self._queue.put(trash_dir)
+                self._reaper = threading.Thread(target=self._reap, name='build-dir-reaper', daemon=True)
+                self._reaper.start()
+                atexit.register(self.wait)
+            return self._queue
+
+    def _reap(self) -> None:
+        assert self._queue is not None
+        while True:
+            trash_dir = self._queue.get()
+            try:
+                shutil.rmtree(trash_dir, ignore_errors=True)
+                if self._queue.empty():
+                    self.fill()
+            except OSError:  # pragma: nocover
+                pass
+            finally:
+                self._queue.task_done()
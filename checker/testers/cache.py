@@ -0,0 +1,199 @@
+"""
+Content-addressed cache of task testing results
+Allows to skip build and tests for the solution with exactly the same inputs as already tested one
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from ..utils.manifest import get_folder_manifest
+
+
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes
+CACHE_IGNORE_NAMES = {'.git', '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache', '.DS_Store'}
+
+
+def _get_checker_version() -> str:
+    try:
+        return version('manytask-checker')
+    except PackageNotFoundError:  # pragma: nocover
+        return 'unknown'
+
+
+def _update_with_file(hasher: hashlib.blake2b, file: Path, name: str) -> None:
+    hasher.update(f'file:{name}\0'.encode())
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    hasher.update(b'\0')
+
+
+def _update_with_tree(
+        hasher: hashlib.blake2b,
+        folder: Path,
+        manifests_dir: Path | None = None,
+        ignore_names: set[str] = CACHE_IGNORE_NAMES,
+) -> None:
+    # saved manifests allow not to re-read unchanged files of the same folder on the next run
+    manifest_path = None
+    if manifests_dir is not None:
+        folder_hash = hashlib.blake2b(str(folder.absolute()).encode(), digest_size=16).hexdigest()
+        manifest_path = manifests_dir / f'{folder_hash}.json'
+    manifest = get_folder_manifest(folder, manifest_path, ignore_names=ignore_names)
+    hasher.update(f'tree:{manifest.get_tree_hash()}\0'.encode())
+
+
+@dataclass
+class CachedResult:
+    score: float
+    log: str
+
+
+class ResultCache:
+    """Directory-based content-addressed cache of testing results with size-bounded LRU eviction
+    Each entry is a single json file; entry access time is tracked with file mtime
+    """
+
+    def __init__(
+            self,
+            cache_dir: Path,
+            max_size: int = DEFAULT_CACHE_MAX_SIZE,
+    ) -> None:
+        """
+        @param cache_dir: Directory to store cache entries in (created if not exists)
+        @param max_size: Max total size of the cache entries in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def compute_key(
+            tester_name: str,
+            source_dir: Path,
+            config_dir: Path,
+            public_tests_dir: Path | None,
+            private_tests_dir: Path | None,
+            tests_root_dir: Path,
+            normalize_output: bool = False,
+            verbose: bool = False,
+            env_whitelist: list[str] | None = None,
+            manifests_dir: Path | None = None,
+    ) -> str:
+        """
+        Compute cache key for the testing inputs
+        @param tester_name: Type of the tester (class name)
+        @param source_dir: Solution dir
+        @param config_dir: Directory with task config
+        @param public_tests_dir: Directory with public tests
+        @param private_tests_dir: Directory with private tests
+        @param tests_root_dir: Course root dir; the whole tree is accounted, as testers build from it
+            (e.g. shared libraries and CMakeLists.txt of groups)
+        @param normalize_output: Output mode, affects stored log
+        @param verbose: Verbose mode, stored log can exhibit private tests information
+        @param env_whitelist: Environment variables passed into the sandbox
+        @param manifests_dir: Directory to keep manifests of the dirs in, to hash only changed files next time
+        @return: hex digest
+        """
+        hasher = hashlib.blake2b(digest_size=32)
+
+        hasher.update(f'tester:{tester_name}\0'.encode())
+        hasher.update(f'version:{_get_checker_version()}\0'.encode())
+        hasher.update(f'python:{sys.version}\0platform:{platform.platform()}\0'.encode())
+        for variable in env_whitelist or []:
+            hasher.update(f'env:{variable}={os.environ.get(variable, "")}\0'.encode())
+        hasher.update(f'normalize_output:{normalize_output}\0verbose:{verbose}\0'.encode())
+
+        for label, folder in [
+            ('source', source_dir),
+            ('public', public_tests_dir),
+            ('private', private_tests_dir),
+        ]:
+            hasher.update(f'dir:{label}\0'.encode())
+            if folder is not None and folder.exists():
+                _update_with_tree(hasher, folder, manifests_dir)
+
+        config_file = config_dir / '.tester.json'
+        if config_file.exists():
+            _update_with_file(hasher, config_file, 'config:.tester.json')
+
+        hasher.update(b'dir:root\0')
+        root_ignore_names = CACHE_IGNORE_NAMES
+        if manifests_dir is not None and tests_root_dir.absolute() in manifests_dir.absolute().parents:
+            # the cache itself is not an input (e.g. `--cache-dir` inside the course)
+            cache_dir_name = manifests_dir.absolute().relative_to(tests_root_dir.absolute()).parts[0]
+            root_ignore_names = root_ignore_names | {cache_dir_name}
+        _update_with_tree(hasher, tests_root_dir, manifests_dir, ignore_names=root_ignore_names)
+
+        return hasher.hexdigest()
+
+    @property
+    def manifests_dir(self) -> Path:
+        """Manifests of hashed dirs; they are evicted along with entries"""
+        return self.cache_dir / 'manifests'
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f'{key}.json'
+
+    def get(
+            self,
+            key: str,
+    ) -> CachedResult | None:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path) as f:
+                raw_entry = json.load(f)
+            result = CachedResult(score=float(raw_entry['score']), log=str(raw_entry['log']))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+
+        try:
+            os.utime(entry_path)  # mark as recently used
+        except OSError:  # pragma: nocover
+            pass
+        return result
+
+    def put(
+            self,
+            key: str,
+            result: CachedResult,
+    ) -> None:
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write atomically as cache can be shared between several processes
+        fd, tmp_name = tempfile.mkstemp(dir=entry_path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(asdict(result), f)
+            os.replace(tmp_name, entry_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries till cache fits max_size"""
+        entries: list[tuple[float, int, Path]] = []
+        total_size = 0
+        for entry_path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:  # pragma: nocover
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_size += stat.st_size
+
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
@@ -12,6 +12,7 @@ from ..exceptions import (
 )
 from ..utils.files import check_files_contains_regexp, copy_files
 from ..utils.print import print_info
+from ..utils.timings import timed_stage
 from .tester import Tester
 
 
@@ -51,37 +52,40 @@ class CppTester(Tester):
             verbose: bool = False,
             normalize_output: bool = False,
     ) -> None:
-        check_files_contains_regexp(
-            source_dir,
-            regexps=test_config.forbidden_regexp,
-            patterns=test_config.allow_change,
-            raise_on_found=True,
-        )
+        with timed_stage('regexp'):
+            check_files_contains_regexp(
+                source_dir,
+                regexps=test_config.forbidden_regexp,
+                patterns=test_config.allow_change,
+                raise_on_found=True,
+            )
         task_dir = public_tests_dir
-        self._executor(
-            copy_files,
-            source=source_dir,
-            target=task_dir,
-            patterns=test_config.allow_change,
-            verbose=verbose,
-        )
-        self._executor(
-            copy_files,
-            source=task_dir,
-            target=build_dir,
-            patterns=test_config.copy_to_build,
-            verbose=verbose,
-        )
-
-        try:
-            print_info('Running cmake...', color='orange')
+        with timed_stage('copy'):
             self._executor(
-                ['cmake', '-G', 'Ninja', str(tests_root_dir),
-                 '-DGRADER=YES', '-DENABLE_PRIVATE_TESTS=YES',
-                 f'-DCMAKE_BUILD_TYPE={test_config.build_type}'],
-                cwd=build_dir,
+                copy_files,
+                source=source_dir,
+                target=task_dir,
+                patterns=test_config.allow_change,
                 verbose=verbose,
             )
+            self._executor(
+                copy_files,
+                source=task_dir,
+                target=build_dir,
+                patterns=test_config.copy_to_build,
+                verbose=verbose,
+            )
+
+        try:
+            print_info('Running cmake...', color='orange')
+            with timed_stage('build'):
+                self._executor(
+                    ['cmake', '-G', 'Ninja', str(tests_root_dir),
+                     '-DGRADER=YES', '-DENABLE_PRIVATE_TESTS=YES',
+                     f'-DCMAKE_BUILD_TYPE={test_config.build_type}'],
+                    cwd=build_dir,
+                    verbose=verbose,
+                )
         except ExecutionFailedError:
             print_info('ERROR', color='red')
             raise BuildFailedError('cmake execution failed')
@@ -89,11 +93,12 @@ class CppTester(Tester):
         for test_binary in test_config.tests:
             try:
                 print_info(f'Building {test_binary}...', color='orange')
-                self._executor(
-                    ['ninja', '-v', test_binary],
-                    cwd=build_dir,
-                    verbose=verbose,
-                )
+                with timed_stage('build'):
+                    self._executor(
+                        ['ninja', '-v', test_binary],
+                        cwd=build_dir,
+                        verbose=verbose,
+                    )
             except ExecutionFailedError:
                 print_info('ERROR', color='red')
                 raise BuildFailedError(f'Can\'t build {test_binary}')
@@ -104,11 +109,12 @@ class CppTester(Tester):
         try:
             print_info('Running clang format...', color='orange')
             format_path = tests_root_dir / 'run-clang-format.py'
-            self._executor(
-                [str(format_path), '-r', str(task_dir)],
-                cwd=build_dir,
-                verbose=verbose,
-            )
+            with timed_stage('lint'):
+                self._executor(
+                    [str(format_path), '-r', str(task_dir)],
+                    cwd=build_dir,
+                    verbose=verbose,
+                )
             print_info('[No issues]')
             print_info('OK', color='green')
         except ExecutionFailedError:
@@ -118,29 +124,18 @@ class CppTester(Tester):
         try:
             print_info('Running clang tidy...', color='orange')
             files = [str(file) for file in task_dir.rglob('*.cpp')]  # type: ignore
-            self._executor(
-                ['clang-tidy', '-p', '.', *files],
-                cwd=build_dir,
-                verbose=verbose,
-            )
+            with timed_stage('lint'):
+                self._executor(
+                    ['clang-tidy', '-p', '.', *files],
+                    cwd=build_dir,
+                    verbose=verbose,
+                )
             print_info('[No issues]')
             print_info('OK', color='green')
         except ExecutionFailedError:
             print_info('ERROR', color='red')
             raise StylecheckFailedError('Style error (clang tidy)')
 
-    def _clean_build(  # type: ignore[override]
-            self,
-            test_config: TaskTestConfig,
-            build_dir: Path,
-            verbose: bool = False,
-    ) -> None:
-        self._executor(
-            ['rm', '-rf', str(build_dir)],
-            check=False,
-            verbose=verbose,
-        )
-
     def _run_tests(  # type: ignore[override]
             self,
             test_config: TaskTestConfig,
@@ -156,15 +151,16 @@ class CppTester(Tester):
                 args = test_config.args.get(test_binary, [])
                 if test_binary in test_config.input_file:
                     stdin = open(build_dir / test_config.input_file[test_binary], 'r')
-                self._executor(
-                    [str(build_dir / test_binary), *args],
-                    sandbox=True,
-                    cwd=build_dir,
-                    verbose=verbose,
-                    capture_output=test_config.capture_output,
-                    timeout=test_config.timeout,
-                    stdin=stdin
-                )
+                with timed_stage('tests'):
+                    self._executor(
+                        [str(build_dir / test_binary), *args],
+                        sandbox=True,
+                        cwd=build_dir,
+                        verbose=verbose,
+                        capture_output=test_config.capture_output,
+                        timeout=test_config.timeout,
+                        stdin=stdin
+                    )
                 if test_config.is_crash_me:
                     print_info('ERROR', color='red')
                     raise TestsFailedError('Program has not crashed')
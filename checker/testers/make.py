@@ -6,6 +6,7 @@ from pathlib import Path
 from ..exceptions import ExecutionFailedError, TestsFailedError
 from ..utils.files import copy_files
 from ..utils.print import print_info
+from ..utils.timings import timed_stage
 from .tester import Tester
 
 
@@ -29,43 +30,32 @@ class MakeTester(Tester):
             verbose: bool = False,
             normalize_output: bool = False,
     ) -> None:
-        self._executor(
-            copy_files,
-            source=source_dir,
-            target=build_dir,
-            ignore_patterns=[],
-            verbose=verbose,
-        )
-
-        if public_tests_dir is not None:
+        with timed_stage('copy'):
             self._executor(
                 copy_files,
-                source=public_tests_dir,
+                source=source_dir,
                 target=build_dir,
-                patterns=test_config.public_test_files,
+                ignore_patterns=[],
                 verbose=verbose,
             )
 
-        if private_tests_dir is not None:
-            self._executor(
-                copy_files,
-                source=private_tests_dir,
-                target=build_dir,
-                patterns=test_config.private_test_files,
-                verbose=verbose,
-            )
+            if public_tests_dir is not None:
+                self._executor(
+                    copy_files,
+                    source=public_tests_dir,
+                    target=build_dir,
+                    patterns=test_config.public_test_files,
+                    verbose=verbose,
+                )
 
-    def _clean_build(  # type: ignore[override]
-            self,
-            test_config: TaskTestConfig,
-            build_dir: Path,
-            verbose: bool = False,
-    ) -> None:
-        self._executor(
-            ['rm', '-rf', str(build_dir)],
-            check=False,
-            verbose=verbose,
-        )
+            if private_tests_dir is not None:
+                self._executor(
+                    copy_files,
+                    source=private_tests_dir,
+                    target=build_dir,
+                    patterns=test_config.private_test_files,
+                    verbose=verbose,
+                )
 
     def _run_tests(  # type: ignore[override]
             self,
@@ -80,14 +70,15 @@ class MakeTester(Tester):
         tests_err = None
         try:
             print_info('Running tests...', color='orange')
-            output = self._executor(
-                tests_cmd,
-                sandbox=sandbox,
-                cwd=str(build_dir),
-                timeout=test_config.test_timeout,
-                verbose=verbose,
-                capture_output=True,
-            )
+            with timed_stage('tests'):
+                output = self._executor(
+                    tests_cmd,
+                    sandbox=sandbox,
+                    cwd=str(build_dir),
+                    timeout=test_config.test_timeout,
+                    verbose=verbose,
+                    capture_output=True,
+                )
             print_info(output, end='')
             print_info('OK', color='green')
         except ExecutionFailedError as e:
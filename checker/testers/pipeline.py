@@ -0,0 +1,143 @@
+"""
+Pipelined execution of several tasks testing in one process (or each task in a worker process)
+Build of the next tasks overlaps with testing of the current one, output is reported per task in original order
+"""
+from __future__ import annotations
+
+import multiprocessing
+from collections.abc import Callable, Generator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Generic, TypeVar
+
+from ..utils.print import capture_output
+from .tester import Tester
+
+
+T = TypeVar('T')
+
+# jobs of `run_jobs_in_processes`, inherited by forked workers (testers hold locks and threads, so can't be pickled)
+_forked_jobs: Sequence[Callable[[], Any]] = ()
+
+
+@dataclass
+class PipelineResult(Generic[T]):
+    result: T | None
+    error: Exception | None
+    output: str
+
+
+def run_job(
+        job: Callable[[], T],
+) -> PipelineResult[T]:
+    """
+    Run the job printing its output right away; errors are returned, not raised
+    @param job: Job to run
+    @return: result or error of the job (output is empty)
+    """
+    try:
+        return PipelineResult(result=job(), error=None, output='')
+    except Exception as e:
+        return PipelineResult(result=None, error=e, output='')
+
+
+def run_job_captured(
+        job: Callable[[], T],
+) -> PipelineResult[T]:
+    """
+    Run the job capturing its output (external commands output included); errors are returned, not raised
+    @param job: Job to run
+    @return: result or error of the job with its output
+    """
+    with capture_output() as output:
+        result = run_job(job)
+    result.output = output.getvalue()
+    return result
+
+
+def _run_forked_job(
+        index: int,
+) -> PipelineResult[Any]:
+    return run_job_captured(_forked_jobs[index])
+
+
+def run_jobs_in_processes(
+        jobs: Sequence[Callable[[], T]],
+        processes: int,
+) -> Generator[PipelineResult[T], None, None]:
+    """
+    Execute each job in a forked worker process (isolated as parallel checks are); stop iteration to cancel
+    not started jobs
+    @param jobs: Jobs to run, inherited by workers; results and errors have to be picklable
+    @param processes: Number of worker processes
+    @return: results with captured output in the jobs order, each one as soon as it and all the previous are done
+    """
+    global _forked_jobs
+    assert processes > 0, 'Number of processes have to be positive'
+    assert not _forked_jobs, 'Jobs are already running in processes'
+
+    _forked_jobs = jobs
+    futures: list[Future[PipelineResult[T]]] = []
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork'))
+    try:
+        futures = [executor.submit(_run_forked_job, index) for index in range(len(jobs))]
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        _forked_jobs = ()
+
+
+class TaskPipeline:
+    """Stage-level scheduler of tasks testing
+    Each job is executed in a separate thread, the tester limits number of tasks in each stage
+    (`build` - copy, build and check; `test` - tests and linters), so task N+1 is built while task N is tested
+    With a single job for each stage tasks are tested one by one in the current thread, output is printed right away
+    """
+
+    def __init__(
+            self,
+            tester: Tester,
+            build_jobs: int = 1,
+            test_jobs: int = 1,
+    ) -> None:
+        """
+        @param tester: Tester used by jobs
+        @param build_jobs: Max tasks in `build` stage at the same time (CPU-heavy compile)
+        @param test_jobs: Max tasks in `test` stage at the same time
+        """
+        assert build_jobs > 0 and test_jobs > 0, 'Stages concurrency have to be positive'
+        self.tester = tester
+        self.build_jobs = build_jobs
+        self.test_jobs = test_jobs
+
+    def run(
+            self,
+            jobs: Sequence[Callable[[], T]],
+    ) -> Generator[PipelineResult[T], None, None]:
+        """
+        Execute jobs pipelined; stop iteration to cancel not started jobs
+        @param jobs: Jobs testing single task each (with tester provided)
+        @return: results with captured output in the jobs order
+        """
+        if self.build_jobs == 1 and self.test_jobs == 1:
+            # no extra concurrency requested, so no pipelining
+            for job in jobs:
+                yield run_job(job)
+            return
+
+        self.tester.set_stage_concurrency(build=self.build_jobs, test=self.test_jobs)
+        futures: list[Future[PipelineResult[T]]] = []
+        # every task in flight is either in build or test stage, so limit threads to avoid extra build dirs
+        executor = ThreadPoolExecutor(max_workers=self.build_jobs + self.test_jobs)
+        try:
+            futures = [executor.submit(run_job_captured, job) for job in jobs]
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.tester.set_stage_concurrency()
@@ -7,6 +7,7 @@ from pathlib import Path
 from ..exceptions import BuildFailedError, ExecutionFailedError, RunFailedError, StylecheckFailedError, TestsFailedError
 from ..utils.files import check_folder_contains_regexp, copy_files
 from ..utils.print import print_info
+from ..utils.timings import timed_stage
 from .tester import Tester
 
 
@@ -66,107 +67,100 @@ class PythonTester(Tester):
             normalize_output: bool = False,
     ) -> None:
         # Copy submitted code (ignore tests)
-        self._executor(
-            copy_files,
-            source=source_dir,
-            target=build_dir,
-            ignore_patterns=test_config.test_files + IGNORE_FILE_PATTERNS,
-            verbose=verbose,
-        )
+        with timed_stage('copy'):
+            self._executor(
+                copy_files,
+                source=source_dir,
+                target=build_dir,
+                ignore_patterns=test_config.test_files + IGNORE_FILE_PATTERNS,
+                verbose=verbose,
+            )
 
         # Check submitted code using forbidden regexp
-        self._executor(
-            check_folder_contains_regexp,
-            folder=build_dir,
-            extensions=self.SOURCE_FILES_EXTENSIONS,
-            regexps=test_config.forbidden_regexp,
-            raise_on_found=True,
-            verbose=verbose,
-        )
+        with timed_stage('regexp'):
+            self._executor(
+                check_folder_contains_regexp,
+                folder=build_dir,
+                extensions=self.SOURCE_FILES_EXTENSIONS,
+                regexps=test_config.forbidden_regexp,
+                raise_on_found=True,
+                verbose=verbose,
+            )
 
         # Install submitted code as module if needed
         if test_config.module_test:
-            # assert setup files exists
-            setup_files = {i.name for i in build_dir.glob(r'setup.*')} | \
-                          {i.name for i in build_dir.glob(r'pyproject.*')}
-            if 'setup.py' not in setup_files and 'setup.cfg' not in setup_files and 'pyproject.toml' not in setup_files:
-                raise BuildFailedError(
-                    'This task is in editable `module` mode. You have to provide pyproject.toml/setup.cfg/setup.py file'
-                )
-            if 'setup.py' not in setup_files:
-                raise BuildFailedError('This task is in editable `module` mode. You have to provide setup.py file')
+            with timed_stage('build'):
+                # assert setup files exists
+                setup_files = {i.name for i in build_dir.glob(r'setup.*')} | \
+                              {i.name for i in build_dir.glob(r'pyproject.*')}
+                if not setup_files & {'setup.py', 'setup.cfg', 'pyproject.toml'}:
+                    raise BuildFailedError(
+                        'This task is in editable `module` mode. '
+                        'You have to provide pyproject.toml/setup.cfg/setup.py file'
+                    )
+                if 'setup.py' not in setup_files:
+                    raise BuildFailedError('This task is in editable `module` mode. You have to provide setup.py file')
 
-            if test_config.build_wheel:
-                task_build_dir_dist = build_dir / 'dist'
-                output = self._executor(
-                    ['pip3', 'wheel', '--wheel-dir', str(task_build_dir_dist), str(build_dir)],
-                    verbose=verbose,
-                    env_sandbox=sandbox,
-                    capture_output=normalize_output,
-                )
-                if normalize_output:
-                    print_info(output or '', end='')
+                if test_config.build_wheel:
+                    task_build_dir_dist = build_dir / 'dist'
+                    output = self._executor(
+                        ['pip3', 'wheel', '--wheel-dir', str(task_build_dir_dist), str(build_dir)],
+                        verbose=verbose,
+                        env_sandbox=sandbox,
+                        capture_output=normalize_output,
+                    )
+                    if normalize_output:
+                        print_info(output or '', end='')
 
-                output = self._executor(
-                    ['pip3', 'install', '--prefer-binary', '--force-reinstall', '--find-links',
-                     str(task_build_dir_dist), str(build_dir)],
-                    verbose=verbose,
-                    env_sandbox=sandbox,
-                    capture_output=normalize_output,
-                )
-                if normalize_output:
-                    print_info(output or '', end='')
+                    output = self._executor(
+                        ['pip3', 'install', '--prefer-binary', '--force-reinstall', '--find-links',
+                         str(task_build_dir_dist), str(build_dir)],
+                        verbose=verbose,
+                        env_sandbox=sandbox,
+                        capture_output=normalize_output,
+                    )
+                    if normalize_output:
+                        print_info(output or '', end='')
 
-                if (build_dir / 'build').exists():
+                    if (build_dir / 'build').exists():
+                        output = self._executor(
+                            ['rm', '-rf', str(build_dir / 'build')],
+                            verbose=verbose,
+                            env_sandbox=sandbox,
+                            capture_output=normalize_output,
+                        )
+                        if normalize_output:
+                            print_info(output or '', end='')
+                else:
                     output = self._executor(
-                        ['rm', '-rf', str(build_dir / 'build')],
+                        ['pip3', 'install', '-e', str(build_dir), '--force'],
                         verbose=verbose,
                         env_sandbox=sandbox,
                         capture_output=normalize_output,
                     )
                     if normalize_output:
                         print_info(output or '', end='')
-            else:
-                output = self._executor(
-                    ['pip3', 'install', '-e', str(build_dir), '--force'],
-                    verbose=verbose,
-                    env_sandbox=sandbox,
-                    capture_output=normalize_output,
-                )
-                if normalize_output:
-                    print_info(output or '', end='')
 
         # Copy public test files
-        if public_tests_dir is not None:
-            self._executor(
-                copy_files,
-                source=public_tests_dir,
-                target=build_dir,
-                patterns=test_config.public_test_files,
-                verbose=verbose,
-            )
-
-        # Copy private test files
-        if private_tests_dir is not None:
-            self._executor(
-                copy_files,
-                source=private_tests_dir,
-                target=build_dir,
-                patterns=test_config.private_test_files,
-                verbose=verbose,
-            )
+        with timed_stage('copy'):
+            if public_tests_dir is not None:
+                self._executor(
+                    copy_files,
+                    source=public_tests_dir,
+                    target=build_dir,
+                    patterns=test_config.public_test_files,
+                    verbose=verbose,
+                )
 
-    def _clean_build(  # type: ignore[override]
-            self,
-            test_config: TaskTestConfig,
-            build_dir: Path,
-            verbose: bool = False,
-    ) -> None:
-        self._executor(
-            ['rm', '-rf', str(build_dir)],
-            check=False,
-            verbose=verbose,
-        )
+            # Copy private test files
+            if private_tests_dir is not None:
+                self._executor(
+                    copy_files,
+                    source=private_tests_dir,
+                    target=build_dir,
+                    patterns=test_config.private_test_files,
+                    verbose=verbose,
+                )
 
     @staticmethod
     def _parse_summary_score(
@@ -267,13 +261,14 @@ class PythonTester(Tester):
         styles_err = None
         try:
             print_info('Running codestyle checks...', color='orange')
-            output = self._executor(
-                codestyle_cmd,
-                sandbox=sandbox,
-                cwd=str(build_dir),
-                verbose=verbose,
-                capture_output=normalize_output,
-            )
+            with timed_stage('lint'):
+                output = self._executor(
+                    codestyle_cmd,
+                    sandbox=sandbox,
+                    cwd=str(build_dir),
+                    verbose=verbose,
+                    capture_output=normalize_output,
+                )
             if normalize_output:
                 print_info(output or '', end='')
             print_info('[No issues]')
@@ -293,13 +288,14 @@ class PythonTester(Tester):
         try:
             if test_config.run_mypy:
                 print_info('Running mypy checks...', color='orange')
-                output = self._executor(
-                    mypy_cmd,
-                    sandbox=sandbox,
-                    cwd=str(build_dir.parent),  # mypy didn't work from cwd
-                    verbose=verbose,
-                    capture_output=normalize_output,
-                )
+                with timed_stage('mypy'):
+                    output = self._executor(
+                        mypy_cmd,
+                        sandbox=sandbox,
+                        cwd=str(build_dir.parent),  # mypy didn't work from cwd
+                        verbose=verbose,
+                        capture_output=normalize_output,
+                    )
                 if normalize_output:
                     print_info(output, end='')
                 print_info('OK', color='green')
@@ -319,13 +315,14 @@ class PythonTester(Tester):
         import_err = None
         try:
             print_info('Collecting tests...', color='orange')
-            output = self._executor(
-                tests_collection_cmd,
-                sandbox=sandbox,
-                cwd=str(build_dir),
-                verbose=verbose,
-                capture_output=normalize_output,
-            )
+            with timed_stage('tests'):
+                output = self._executor(
+                    tests_collection_cmd,
+                    sandbox=sandbox,
+                    cwd=str(build_dir),
+                    verbose=verbose,
+                    capture_output=normalize_output,
+                )
             if normalize_output:
                 print_info(output, end='')
                 output = ''
@@ -345,14 +342,15 @@ class PythonTester(Tester):
         tests_output = ''
         try:
             print_info('Running tests...', color='orange')
-            output = self._executor(
-                tests_cmd,
-                sandbox=sandbox,
-                cwd=str(build_dir),
-                timeout=test_config.test_timeout,
-                verbose=verbose,
-                capture_output=test_config.partially_scored or normalize_output,
-            )
+            with timed_stage('tests'):
+                output = self._executor(
+                    tests_cmd,
+                    sandbox=sandbox,
+                    cwd=str(build_dir),
+                    timeout=test_config.test_timeout,
+                    verbose=verbose,
+                    capture_output=test_config.partially_scored or normalize_output,
+                )
             if normalize_output or test_config.partially_scored:
                 print_info(output, end='')
             print_info('OK', color='green')
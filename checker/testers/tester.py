@@ -1,15 +1,21 @@
 from __future__ import annotations
 
 import json
-import tempfile
+import threading
 from abc import abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 from ..exceptions import RunFailedError, TaskTesterTestConfigException, TesterNotImplemented
+from ..executors.jobserver import JobServer
 from ..executors.sandbox import Sandbox
-from ..utils.print import print_info
+from ..utils.print import capture_output, print_info
+from ..utils.timings import timed_stage
+from .build_pool import BuildDirPool
+from .cache import DEFAULT_CACHE_MAX_SIZE, CachedResult, ResultCache
 
 
 class Tester:
@@ -67,10 +73,30 @@ class Tester:
             self,
             cleanup: bool = True,
             dry_run: bool = False,
+            cache_dir: Path | None = None,
+            cache_max_size: int = DEFAULT_CACHE_MAX_SIZE,
+            use_cache: bool | None = None,
+            build_root: Path | None = None,
+            build_pool_size: int | None = None,
     ):
+        """
+        @param cleanup: Perform cleanup after testing
+        @param dry_run: Setup dry run mode (really executes nothing)
+        @param cache_dir: Directory for results cache; None to disable caching
+        @param cache_max_size: Max size of results cache in bytes
+        @param use_cache: Force cache usage on/off; None - use for non-verbose runs only
+        @param build_root: Directory to create build directories in, e.g. tmpfs mount (default: system temp dir)
+        @param build_pool_size: Number of pre-created build directories (default: 2 if build_root set, else 0)
+        """
         self.cleanup = cleanup
         self.dry_run = dry_run
         self._executor = Sandbox(dry_run=dry_run)
+        if build_pool_size is None:
+            build_pool_size = 2 if build_root else 0
+        self.build_pool = BuildDirPool(build_root, size=build_pool_size)
+        self.cache = ResultCache(cache_dir, max_size=cache_max_size) if cache_dir and not dry_run else None
+        self.use_cache = use_cache
+        self._stage_slots: dict[str, threading.BoundedSemaphore] = {}
 
     @classmethod
     def create(
@@ -78,6 +104,10 @@ class Tester:
             system: str,
             cleanup: bool = True,
             dry_run: bool = False,
+            cache_dir: Path | None = None,
+            cache_max_size: int = DEFAULT_CACHE_MAX_SIZE,
+            use_cache: bool | None = None,
+            build_root: Path | None = None,
     ) -> 'Tester':
         """
         Main creation entrypoint to Tester
@@ -85,20 +115,75 @@ class Tester:
         @param system: Type of the testing system
         @param cleanup: Perform cleanup after testing
         @param dry_run: Setup dry run mode (really executes nothing)
+        @param cache_dir: Directory for results cache; None to disable caching
+        @param cache_max_size: Max size of results cache in bytes
+        @param use_cache: Force cache usage on/off; None - use for non-verbose runs only
+        @param build_root: Directory to create build directories in, e.g. tmpfs mount (default: system temp dir)
         @return: Configured Tester object (python, cpp, etc.)
         """
+        kwargs: dict[str, Any] = dict(
+            cleanup=cleanup,
+            dry_run=dry_run,
+            cache_dir=cache_dir,
+            cache_max_size=cache_max_size,
+            use_cache=use_cache,
+            build_root=build_root,
+        )
         if system == 'python':
             from . import python
-            return python.PythonTester(cleanup=cleanup, dry_run=dry_run)
+            return python.PythonTester(**kwargs)
         elif system == 'make':
             from . import make
-            return make.MakeTester(cleanup=cleanup, dry_run=dry_run)
+            return make.MakeTester(**kwargs)
         elif system == 'cpp':
             from . import cpp
-            return cpp.CppTester(cleanup=cleanup, dry_run=dry_run)
+            return cpp.CppTester(**kwargs)
         else:
             raise TesterNotImplemented(f'Tester for <{system}> are not supported right now')
 
+    def __getstate__(self) -> dict[str, Any]:
+        # stage slots limit threads of the current process only
+        state = self.__dict__.copy()
+        state['_stage_slots'] = {}
+        return state
+
+    def set_stage_concurrency(
+            self,
+            **limits: int | None,
+    ) -> None:
+        """
+        Limit number of tasks concurrently executing the stage (in threads of the current process)
+        Available stages: `build` (copy files, build and check) and `test` (run tests and linters)
+        @param limits: stage name to max concurrent tasks; None or 0 for unlimited; no args to reset all limits
+        """
+        self._stage_slots = {
+            stage: threading.BoundedSemaphore(limit)
+            for stage, limit in limits.items()
+            if limit
+        }
+
+    def set_jobserver(
+            self,
+            jobserver: JobServer | None,
+    ) -> None:
+        """
+        Share jobserver tokens pool with all executed commands and build tools
+        @param jobserver: JobServer to use; None to run commands without limits
+        """
+        self._executor.jobserver = jobserver
+
+    @contextmanager
+    def _stage(
+            self,
+            stage: str,
+    ) -> Iterator[None]:
+        slot = self._stage_slots.get(stage)
+        if slot is None:
+            yield
+            return
+        with slot:
+            yield
+
     @abstractmethod
     def _gen_build(
             self,
@@ -126,21 +211,25 @@ class Tester:
         """
         pass
 
-    @abstractmethod
     def _clean_build(
             self,
             test_config: TaskTestConfig,
             build_dir: Path,
             verbose: bool = False,
-    ) -> None:  # pragma: nocover
+    ) -> None:
         """
         Clean build directory after testing
+        Directory is removed in-process in background, so the result is returned before deletion finishes
         @param test_config: Test config to pass into each stage
         @param build_dir: Build directory to clean up
         @param verbose: Verbose output (can exhibit private tests information)
         @return: None
         """
-        pass
+        if verbose or self.dry_run:
+            print_info(f'> release build directory {build_dir}', color='grey')
+        if self.dry_run:
+            return
+        self.build_pool.release(build_dir)
 
     @abstractmethod
     def _run_tests(
@@ -171,60 +260,123 @@ class Tester:
             tests_root_dir: Path,
             verbose: bool = False,
             normalize_output: bool = False,
+            use_cache: bool | None = None,
     ) -> float:
         """ Inner function to test the task (Folders already specified)
         Perform the following actions:
         * _gen_build: copy source and test files, check forbidden regxp, build and install if necessary
         * _run_tests: run testing and linting
         * _clean_build: cleanup if necessary
+        If results cache is set up, successful results are stored and reused for exactly the same inputs
         @param source_dir: Solution dir (student's solution or authors' solution)
         @param config_dir: Directory with task config
         @param public_tests_dir: Directory to copy public tests from
         @param private_tests_dir: Directory to copy private tests from
         @param verbose: Verbose output (can exhibit private tests information)
         @param normalize_output: Normalize all stages output to stderr
+        @param use_cache: Force cache usage on/off; None - use tester setting
         @raise RunFailedError: on any build/test error
         @return: Percentage of the final score
         """
-        # Read test config
-        test_config = self.TaskTestConfig.from_json(config_dir / '.tester.json')
+        use_cache = self.use_cache if use_cache is None else use_cache
+        if use_cache is None:
+            use_cache = not verbose  # verbose output can not be restored from cache
+        if self.cache is None or not use_cache:
+            return self._test_task(
+                source_dir,
+                config_dir,
+                public_tests_dir,
+                private_tests_dir,
+                tests_root_dir,
+                verbose=verbose,
+                normalize_output=normalize_output,
+            )
 
-        # Create build dir as tmp dir
-        build_dir = Path(tempfile.mkdtemp())
-        build_dir.chmod(0o777)  # Set mode for build directory (for code generation and so on)
+        with timed_stage('cache'):
+            cache_key = ResultCache.compute_key(
+                self.__class__.__name__,
+                source_dir,
+                config_dir,
+                public_tests_dir,
+                private_tests_dir,
+                tests_root_dir,
+                normalize_output=normalize_output,
+                verbose=verbose,
+                env_whitelist=self._executor.ENV_WHITELIST,
+                manifests_dir=self.cache.manifests_dir,
+            )
+            cached_result = self.cache.get(cache_key)
+        if cached_result:
+            print_info('Exactly the same solution has already been tested, using cached result', color='grey')
+            print_info(cached_result.log, end='')
+            return cached_result.score
 
-        try:
-            self._gen_build(
-                test_config,
-                build_dir,
+        # external commands output is captured along with print_info (see Sandbox), so the log is complete
+        with capture_output(tee=True) as log:
+            score_percentage = self._test_task(
                 source_dir,
+                config_dir,
                 public_tests_dir,
                 private_tests_dir,
                 tests_root_dir,
-                sandbox=True,
                 verbose=verbose,
                 normalize_output=normalize_output,
             )
+        self.cache.put(cache_key, CachedResult(score=score_percentage, log=log.getvalue()))
+
+        return score_percentage
+
+    def _test_task(
+            self,
+            source_dir: Path,
+            config_dir: Path,
+            public_tests_dir: Path | None,
+            private_tests_dir: Path | None,
+            tests_root_dir: Path,
+            verbose: bool = False,
+            normalize_output: bool = False,
+    ) -> float:
+        # Read test config
+        test_config = self.TaskTestConfig.from_json(config_dir / '.tester.json')
+
+        # Get build dir from the pool
+        build_dir = self.build_pool.acquire()
+
+        try:
+            with self._stage('build'):
+                self._gen_build(
+                    test_config,
+                    build_dir,
+                    source_dir,
+                    public_tests_dir,
+                    private_tests_dir,
+                    tests_root_dir,
+                    sandbox=True,
+                    verbose=verbose,
+                    normalize_output=normalize_output,
+                )
 
             # Do not disable sandbox (otherwise it will not clear environ,
             # so environ-related issues may be missed, such as empty locale)
-            score_percentage = self._run_tests(
-                test_config,
-                build_dir,
-                sandbox=True,
-                verbose=verbose,
-                normalize_output=normalize_output
-            )
+            with self._stage('test'):
+                score_percentage = self._run_tests(
+                    test_config,
+                    build_dir,
+                    sandbox=True,
+                    verbose=verbose,
+                    normalize_output=normalize_output
+                )
         except RunFailedError as e:
             print_info('\nOoops... Something went wrong: ' + e.msg + (e.output or ''), color='red')
             raise e
         finally:
             if self.cleanup:
-                self._clean_build(
-                    test_config,
-                    build_dir,
-                    verbose=verbose
-                )
+                with timed_stage('cleanup'):
+                    self._clean_build(
+                        test_config,
+                        build_dir,
+                        verbose=verbose
+                    )
             else:
                 print_info(f'Keeping build directory: {build_dir}')
 
@@ -1,6 +1,14 @@
 from .files import *  # noqa: F403
 from .git import *  # noqa: F403
 from .glab import *  # noqa: F403
+from .manifest import *  # noqa: F403
 from .manytask import *  # noqa: F403
+from .mirror import *  # noqa: F403
+from .outbox import *  # noqa: F403
 from .print import *  # noqa: F403
+from .progress import *  # noqa: F403
+from .report import *  # noqa: F403
 from .template import *  # noqa: F403
+from .timings import *  # noqa: F403
+from .watch import *  # noqa: F403
+from .watermark import *  # noqa: F403
@@ -1,9 +1,18 @@
 from __future__ import annotations
 
+import fnmatch
+import hashlib
+import os
 import re
 import shutil
-import subprocess
+import tarfile
+import tempfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from stat import S_ISREG
+from typing import IO
 
 from .print import print_info
 
@@ -143,6 +152,121 @@ def check_files_contains_regexp(
     return False
 
 
+DIFF_CHUNK_SIZE = 1 << 20
+DIFF_IN_MEMORY_SIZE = 64 << 20  # larger files are compared by streamed digests
+DIFF_WORKERS = 8
+
+
+def _scan_folder(
+        folder: Path,
+        exclude_patterns: list[str] | None = None,
+) -> dict[str, int]:
+    # relative file path to its size; patterns are matched against base names, as `diff --exclude` does
+    files = {}
+    stack = [(str(folder), '')]
+    while stack:
+        current_dir, prefix = stack.pop()
+        with os.scandir(current_dir) as entries:
+            for entry in entries:
+                if exclude_patterns and any(fnmatch.fnmatchcase(entry.name, p) for p in exclude_patterns):
+                    continue
+                if entry.is_dir():
+                    stack.append((entry.path, f'{prefix}{entry.name}/'))
+                elif entry.is_file():
+                    files[f'{prefix}{entry.name}'] = entry.stat().st_size
+    return files
+
+
+def _stat_files(
+        folder: Path,
+        files: Iterable[str],
+) -> dict[str, int]:
+    # same as `_scan_folder`, but for the given files only
+    sizes = {}
+    for file in files:
+        try:
+            stat = os.stat(os.path.join(folder, file))
+        except FileNotFoundError:
+            continue
+        if S_ISREG(stat.st_mode):
+            sizes[file] = stat.st_size
+    return sizes
+
+
+def _get_file_digest(
+        path: str,
+) -> bytes:
+    # hash of the content with trailing CRs of lines stripped, as `diff --strip-trailing-cr` does
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        pending_cr = b''
+        while chunk := f.read(DIFF_CHUNK_SIZE):
+            chunk = pending_cr + chunk
+            pending_cr = b'\r' if chunk.endswith(b'\r') else b''
+            digest.update(chunk[:len(chunk) - len(pending_cr)].replace(b'\r\n', b'\n'))
+        digest.update(pending_cr)
+    return digest.digest()
+
+
+def _read_file(
+        path: str,
+) -> bytes:
+    with open(path, 'rb', buffering=0) as f:
+        return f.read()
+
+
+def _is_file_changed(
+        old_path: str,
+        new_path: str,
+        max_size: int,
+) -> bool:
+    if max_size > DIFF_IN_MEMORY_SIZE:
+        return _get_file_digest(old_path) != _get_file_digest(new_path)
+
+    old_content, new_content = _read_file(old_path), _read_file(new_path)
+    if old_content == new_content:
+        return False
+    if b'\r' not in old_content and b'\r' not in new_content:
+        return True
+    return old_content.replace(b'\r\n', b'\n') != new_content.replace(b'\r\n', b'\n')
+
+
+def _get_changed_files(
+        old_folder: Path,
+        old_files: dict[str, int],
+        new_folder: Path,
+        new_files: dict[str, int],
+        files: Iterable[str] | None = None,
+) -> list[str]:
+    changed, candidates = [], []
+    for file in (old_files.keys() | new_files.keys()) if files is None else files:
+        old_size, new_size = old_files.get(file, 0), new_files.get(file, 0)
+        if old_size == 0 or new_size == 0:
+            # missing files are treated as empty ones; only empty content is empty after CRs stripping
+            if old_size != new_size:
+                changed.append(file)
+        else:
+            candidates.append(file)
+
+    # files are compared in threads by batches (reading, comparing and hashing release the GIL)
+    def compare_batch(batch: list[str]) -> list[bool]:
+        return [
+            _is_file_changed(
+                os.path.join(old_folder, file),
+                os.path.join(new_folder, file),
+                max(old_files[file], new_files[file]),
+            )
+            for file in batch
+        ]
+
+    batch_size = max(1, -(-len(candidates) // DIFF_WORKERS))
+    batches = [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)]
+    with ThreadPoolExecutor(max_workers=DIFF_WORKERS) as executor:
+        is_changed = [result for batch_results in executor.map(compare_batch, batches) for result in batch_results]
+    changed.extend(file for file, file_changed in zip(candidates, is_changed) if file_changed)
+    return sorted(changed)
+
+
 def get_folders_diff(
         old_folder: Path,
         new_folder: Path,
@@ -150,56 +274,20 @@ def get_folders_diff(
         exclude_patterns: list[str] | None = None,
 ) -> list[str]:
     """
-    Return diff files between 2 folders
+    Return diff files between 2 folders, same as `diff --brief --recursive --new-file --strip-trailing-cr`
+    (missing files are treated as empty, trailing CRs of lines are ignored) but in-process
     @param old_folder: Old folder
     @param new_folder: New folder with some changes files, based on old folder
-    @param skip_binary: Skip binary files
-    @param exclude_patterns: Exclude files that match pattern
+    @param skip_binary: Not used: `diff --brief` never reported binary files separately, they are compared as others
+    @param exclude_patterns: Exclude files and folders which names match pattern
     @return: list of changed files as strings
     """
-    # diff docs https://www.gnu.org/software/diffutils/manual/html_node/diff-Options.html
-    # -N/--new-file - If one file is missing, treat it as present but empty
-    # -w/--ignore-all-space - ignore all spaces and tabs  e.g. if ( a == b)  is equal to if(a==b)
-    # -r/--recursive - recursively compare any subdirectories found
-    # -q/--brief - report only when files differ
-    # --strip-trailing-cr - strip trailing carriage return on input
-    # -x/--exclude [pattern] - exclude files that match pattern
-
-    # TODO: check format options to work, or --left-column options
-    exclude_args = [f'--exclude={pattern}' for pattern in exclude_patterns] if exclude_patterns else []
-    # exclude_args = []
-    result = subprocess.run(
-        [
-            'diff',
-            '--brief',
-            '--recursive',
-            '--new-file',
-            '--strip-trailing-cr',
-            *exclude_args,
-            old_folder.absolute(),
-            new_folder.absolute()
-        ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+    return _get_changed_files(
+        old_folder,
+        _scan_folder(old_folder, exclude_patterns),
+        new_folder,
+        _scan_folder(new_folder, exclude_patterns),
     )
-    output = result.stdout.decode()
-
-    # TODO: make it work with whitespace in filenames
-
-    changed = []
-    for line in output.split('\n'):
-        if line.startswith('Only in'):
-            assert False, 'Will be treated as change due to --new-file option'
-        elif line.startswith('Files'):
-            _, file1, _, file2, _ = line.split()
-            changed.append(Path(file2).relative_to(new_folder))
-        elif line.startswith('Binary files'):
-            if skip_binary:
-                continue
-            _, _, file1, _, file2, _ = line.split()
-            changed.append(Path(file2).relative_to(new_folder))
-
-    return [str(i) for i in changed]
 
 
 def get_folders_diff_except_public(
@@ -214,22 +302,25 @@ def get_folders_diff_except_public(
     @param public_folder: Public folder
     @param old_folder: Old folder
     @param new_folder: New folder with some changes files, based on old folder
-    @param skip_binary: Skip binary files
-    @param exclude_patterns: Exclude files that match pattern
+    @param skip_binary: Not used, see `get_folders_diff`
+    @param exclude_patterns: Exclude files and folders which names match pattern
     @return: list of changed files as strings
     """
 
-    changed_files_old_new = get_folders_diff(
+    new_files = _scan_folder(new_folder, exclude_patterns)
+    changed_files_old_new = _get_changed_files(
         old_folder,
+        _scan_folder(old_folder, exclude_patterns),
         new_folder,
-        skip_binary=skip_binary,
-        exclude_patterns=exclude_patterns,
+        new_files,
     )
-    changed_files_public_new = get_folders_diff(
+    # only files changed since the old folder are compared with the public one, the rest of it is not even listed
+    changed_files_public_new = _get_changed_files(
         public_folder,
+        _stat_files(public_folder, changed_files_old_new),
         new_folder,
-        skip_binary=skip_binary,
-        exclude_patterns=exclude_patterns,
+        new_files,
+        files=changed_files_old_new,
     )
 
     # TODO: Remove logging
@@ -244,3 +335,42 @@ def get_folders_diff_except_public(
         str(i)
         for i in set(changed_files_old_new) & set(changed_files_public_new)
     ]
+
+
+PACK_IN_MEMORY_SIZE = 4 << 20  # larger archives are spilled to a temp file
+PACK_COMPRESS_LEVEL = 6
+
+
+@contextmanager
+def pack_folder(
+        folder: Path,
+        exclude_patterns: list[str] | None = None,
+        max_size: int | None = None,
+) -> Iterator[IO[bytes]]:
+    """
+    Pack files of the folder into tar.gz archive, built in memory (spilled to a temp file if large)
+    Each file is read once and closed right after it is added; the archive is closed on exit
+    @param folder: Folder to pack
+    @param exclude_patterns: Exclude files and folders which names match pattern
+    @param max_size: Max total size of packed files (before compression); files not fitting are skipped
+    @return: archive file object at position 0
+    """
+    files = _scan_folder(folder, exclude_patterns) if folder.is_dir() else {}
+
+    total_size, skipped_files = 0, []
+    with tempfile.SpooledTemporaryFile(max_size=PACK_IN_MEMORY_SIZE) as archive:
+        with tarfile.open(fileobj=archive, mode='w:gz', compresslevel=PACK_COMPRESS_LEVEL) as tar:
+            for file, size in sorted(files.items()):
+                if max_size is not None and total_size + size > max_size:
+                    skipped_files.append(file)
+                    continue
+                total_size += size
+                tar.add(folder / file, arcname=file, recursive=False)
+
+        if skipped_files:
+            print_info(f'Warning: files over the size limit of {max_size} bytes are not packed:', color='orange')
+            for file in skipped_files:
+                print_info(f'  {file}', color='orange')
+
+        archive.seek(0)
+        yield archive
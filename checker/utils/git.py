@@ -3,7 +3,9 @@ from __future__ import annotations
 import shutil
 import subprocess
 from pathlib import Path
+from typing import Any
 
+from .mirror import GitMirror
 from .print import print_info
 
 
@@ -25,6 +27,242 @@ def get_tracked_files_list(
     return r.stdout.splitlines()
 
 
+def get_changed_files_list(
+        repo_dir: Path,
+        ref: str,
+) -> list[str]:
+    """
+    Get files changed in the working tree since the git ref (committed, staged, unstaged and untracked ones)
+    @param repo_dir: Directory inside the repo to get changes of
+    @param ref: Git ref (commit, branch, tag) to compare with
+    @return: Changed files paths relative to `repo_dir` (renamed files are listed with both old and new paths)
+    """
+    r = subprocess.run(
+        ['git', 'diff', '--name-only', '--no-renames', '--relative', '-z', ref, '--', '.'],
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=repo_dir,
+    )
+    changed_files = r.stdout.split('\0')
+
+    r = subprocess.run(
+        ['git', 'ls-files', '--others', '--exclude-standard', '-z'],
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=repo_dir,
+    )
+    changed_files.extend(r.stdout.split('\0'))
+
+    return sorted({file for file in changed_files if file})
+
+
+def get_commits_changed_files(
+        repo_dir: Path,
+        revisions: list[str],
+        author: str | None = None,
+) -> list[str]:
+    """
+    Get files changed by non-merge commits of the revision range in a single `git log` call
+    @param repo_dir: Directory inside the repo
+    @param revisions: `git log` revisions arguments, e.g. ['prev..current'] or ['current', '--not', '--remotes=x']
+    @param author: Only commits by the matching author (`git log --author` pattern)
+    @return: Sorted unique files paths relative to the repo root
+    """
+    author_args = [f'--author={author}'] if author else []
+    r = subprocess.run(
+        ['git', 'log', '--no-merges', '--name-only', '--format=', '-z', *author_args, *revisions, '--'],
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=repo_dir,
+    )
+    return sorted({file for file in r.stdout.split('\0') if file})
+
+
+def _run_git_with_remotes(
+        repo_dir: Path,
+        args: list[str],
+        remotes: dict[str, str] | None,
+        **kwargs: Any,
+) -> subprocess.CompletedProcess[Any]:
+    # remotes are set up for the single git call only, so urls (with credentials) are not saved into the repo config;
+    # promisor remotes let git fetch filtered out blobs on demand
+    config_args = []
+    for name, url in (remotes or {}).items():
+        config_args += [
+            '-c', f'remote.{name}.url={url}',
+            '-c', f'remote.{name}.promisor=true',
+            '-c', f'remote.{name}.partialclonefilter=blob:none',
+        ]
+    r = subprocess.run(['git', *config_args, *args], cwd=repo_dir, **kwargs)
+    if r.returncode != 0:
+        # do not expose urls with credentials in the error
+        raise subprocess.CalledProcessError(r.returncode, ['git', *args], output=r.stdout, stderr=r.stderr)
+    return r
+
+
+def fetch_commit(
+        repo_dir: Path,
+        remotes: dict[str, str],
+        remote: str,
+        ref: str,
+) -> str:
+    """
+    Fetch a single commit with its trees only, blobs are fetched on demand later (`read_blobs`)
+    @param repo_dir: Repo to fetch into
+    @param remotes: Remote name to url mapping; passed at fetch time only
+    @param remote: Name of the remote to fetch from
+    @param ref: Branch, tag or commit sha to fetch
+    @return: Fetched commit sha
+    """
+    _run_git_with_remotes(
+        repo_dir,
+        ['fetch', '--filter=blob:none', '--depth=1', '--no-tags', remote, ref],
+        remotes,
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    r = subprocess.run(
+        ['git', 'rev-parse', 'FETCH_HEAD'],
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=repo_dir,
+    )
+    return r.stdout.strip()
+
+
+def has_commit(
+        repo_dir: Path,
+        commit: str,
+) -> bool:
+    r = subprocess.run(
+        ['git', 'cat-file', '-e', f'{commit}^{{commit}}'],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=repo_dir,
+    )
+    return r.returncode == 0
+
+
+def get_tree_blobs(
+        repo_dir: Path,
+        commit: str,
+) -> dict[str, str]:
+    """
+    List files of the commit without reading them
+    @param repo_dir: Repo with the commit (blobs may be missing)
+    @param commit: Commit-ish to list files of
+    @return: mapping of file paths (relative to the repo root) to their blob hashes
+    """
+    r = subprocess.run(
+        ['git', 'ls-tree', '-r', '-z', '--full-tree', commit],
+        encoding='utf-8',
+        stdout=subprocess.PIPE,
+        check=True,
+        cwd=repo_dir,
+    )
+    blobs = {}
+    for entry in r.stdout.split('\0'):
+        if not entry:
+            continue
+        info, path = entry.split('\t', maxsplit=1)
+        _, object_type, object_hash = info.split()
+        if object_type == 'blob':  # skip submodules
+            blobs[path] = object_hash
+    return blobs
+
+
+def read_blobs(
+        repo_dir: Path,
+        blobs: set[str],
+        remotes: dict[str, str] | None = None,
+) -> dict[str, bytes]:
+    """
+    Read blobs contents in a single git call; missing blobs are fetched from promisor `remotes`
+    @param repo_dir: Repo to read from
+    @param blobs: Blob hashes to read
+    @param remotes: Remote name to url mapping of promisor remotes (see `fetch_commit`)
+    @return: mapping of blob hashes to contents
+    """
+    blobs_list = sorted(blobs)
+    r = _run_git_with_remotes(
+        repo_dir,
+        ['cat-file', '--batch'],
+        remotes,
+        input=''.join(f'{blob}\n' for blob in blobs_list).encode(),
+        stdout=subprocess.PIPE,
+    )
+    contents = {}
+    output = r.stdout
+    for blob in blobs_list:
+        header_end = output.index(b'\n')
+        header = output[:header_end].decode().split()
+        if header[1] != 'blob':
+            raise ValueError(f'Unable to read blob {blob}: {" ".join(header[1:])}')
+        size = int(header[2])
+        contents[blob] = output[header_end + 1:header_end + 1 + size]
+        output = output[header_end + 1 + size + 1:]
+    return contents
+
+
+def get_commits_diff_except_public(
+        repo_dir: Path,
+        public_commit: str,
+        old_commit: str,
+        new_commit: str = 'HEAD',
+        remotes: dict[str, str] | None = None,
+) -> list[str]:
+    """
+    Files of the new commit changed since the old one and different from the public one,
+    same as `get_folders_diff_except_public` on the commits checkouts, but trees are compared by blob hashes
+    and only contents of the changed files are read (trailing CRs are ignored, missing files are treated as empty)
+    @param repo_dir: Repo with all the commits (blobs may be missing, see `fetch_commit`)
+    @param public_commit: Commit of the public repo
+    @param old_commit: Previous checked commit
+    @param new_commit: Current commit
+    @param remotes: Remote name to url mapping of promisor remotes to fetch missing blobs from
+    @return: list of changed files paths relative to the repo root
+    """
+    new_blobs = get_tree_blobs(repo_dir, new_commit)
+    old_blobs = get_tree_blobs(repo_dir, old_commit)
+    public_blobs = get_tree_blobs(repo_dir, public_commit)
+
+    candidates = [
+        path for path, blob in new_blobs.items()
+        if old_blobs.get(path) != blob and public_blobs.get(path) != blob
+    ]
+    contents = read_blobs(
+        repo_dir,
+        {
+            blob
+            for path in candidates
+            for blob in [new_blobs[path], old_blobs.get(path), public_blobs.get(path)]
+            if blob is not None
+        },
+        remotes=remotes,
+    )
+
+    def get_content(blob: str | None) -> bytes:
+        return contents[blob] if blob is not None else b''
+
+    def is_changed(content: bytes, base_content: bytes) -> bool:
+        return content.replace(b'\r\n', b'\n') != base_content.replace(b'\r\n', b'\n')
+
+    changed = []
+    for path in candidates:
+        content = get_content(new_blobs[path])
+        if (
+                is_changed(content, get_content(old_blobs.get(path)))
+                and is_changed(content, get_content(public_blobs.get(path)))
+        ):
+            changed.append(path)
+    return changed
+
+
 def setup_repo_in_dir(
         repo_dir: Path,
         remote_repo_url: str,
@@ -33,6 +271,7 @@ def setup_repo_in_dir(
         git_user_email: str = 'no-reply@gitlab.manytask.org',
         git_user_name: str = 'Manytask Bot',
         branch: str = DEFAULT_BRANCH,
+        mirror: GitMirror | None = None,
 ) -> None:
     remote_repo_url = remote_repo_url.replace('https://', '').replace('http://', '').replace('.git', '')
     remote_repo_url = f'https://{service_username}:{service_token}@{remote_repo_url}.git'
@@ -41,17 +280,28 @@ def setup_repo_in_dir(
     shutil.rmtree(repo_dir)
     repo_dir.mkdir()
 
-    print_info('* git clone...')
-    r = subprocess.run(
-        f'git clone --depth=1 --branch={branch} {remote_repo_url} ./',
-        encoding='utf-8',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        shell=True,
-        cwd=repo_dir,
-    )
-    print_info(r.stdout, color='grey')
-    if r.returncode != 0:
+    if mirror:
+        print_info(f'* git clone from mirror {mirror.path}...')
+        try:
+            mirror.update(remote_repo_url)
+            mirror.clone(repo_dir, remote_repo_url, branch)
+            returncode = 0
+        except subprocess.CalledProcessError as e:
+            print_info(e.output, color='grey')
+            returncode = e.returncode
+    else:
+        print_info('* git clone...')
+        r = subprocess.run(
+            f'git clone --depth=1 --branch={branch} {remote_repo_url} ./',
+            encoding='utf-8',
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            shell=True,
+            cwd=repo_dir,
+        )
+        print_info(r.stdout, color='grey')
+        returncode = r.returncode
+    if returncode != 0:
         print_info('empty repo, init it first')
         r = subprocess.run(
             f'git init --initial-branch {branch} && git remote add origin {remote_repo_url} && git fetch',
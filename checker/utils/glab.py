@@ -1,14 +1,109 @@
 from __future__ import annotations
 
+import threading
+import time
 import typing
 from pathlib import Path
+from typing import Any
 
 import gitlab
 import gitlab.v4.objects
+import requests
+import requests.adapters
 
+from .manytask import RequestStats, get_retry_after
 from .print import print_info
 
 
+GITLAB_RATE_LIMIT_BURST = 10  # requests sent at once after idle
+
+
+class RateLimiter:
+    """Token bucket shared by threads: `rate` requests per second on average, up to `burst` at once"""
+
+    def __init__(
+            self,
+            rate: float,
+            burst: int = GITLAB_RATE_LIMIT_BURST,
+    ) -> None:
+        assert rate > 0 and burst > 0, 'Rate and burst have to be positive'
+        self.rate = rate
+        self.burst = burst
+        self.waited = 0.  # seconds, total of all threads
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait for a token to send a request"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(float(self.burst), self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+                self.waited += delay
+            time.sleep(delay)
+
+    def pause(
+            self,
+            seconds: float,
+    ) -> None:
+        """Stop all threads sending requests for `seconds` (e.g. `Retry-After` of 429 response); bucket is emptied"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.
+
+
+class _RateLimitedAdapter(requests.adapters.HTTPAdapter):
+    # every gitlab api request (including python-gitlab retries) goes through the limiter and is counted
+
+    def __init__(
+            self,
+            rate_limiter: RateLimiter | None,
+            stats: dict[str, RequestStats],
+            **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.rate_limiter = rate_limiter
+        self.stats = stats
+        self._stats_lock = threading.Lock()
+
+    def send(
+            self,
+            request: requests.PreparedRequest,
+            *args: Any,
+            **kwargs: Any,
+    ) -> requests.Response:
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        start_time = time.monotonic()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except requests.RequestException:
+            self._record(str(request.method), time.monotonic() - start_time, error=True)
+            raise
+        self._record(str(request.method), time.monotonic() - start_time, error=response.status_code == 429)
+
+        if response.status_code == 429 and self.rate_limiter:
+            # python-gitlab retries it after `Retry-After` itself, hold back other threads for the same time
+            self.rate_limiter.pause(get_retry_after(response) or 1 / self.rate_limiter.rate)
+        return response
+
+    def _record(
+            self,
+            method: str,
+            latency: float,
+            error: bool,
+    ) -> None:
+        with self._stats_lock:
+            self.stats.setdefault(method, RequestStats()).add(latency, error=error)
+
+
 class GitlabConnection:
     def __init__(
             self,
@@ -16,19 +111,80 @@ class GitlabConnection:
             api_token: str | None = None,
             private_token: str | None = None,
             job_token: str | None = None,
+            *,
+            rate_limit: float | None = None,
+            rate_limit_burst: int = GITLAB_RATE_LIMIT_BURST,
+            pool_size: int = 10,
     ):
+        """
+        @param gitlab_host_url: Gitlab url, e.g. `https://gitlab.manytask.org`
+        @param rate_limit: Max requests per second of all threads using the connection (None - not limited)
+        @param rate_limit_burst: Max requests sent at once after idle
+        @param pool_size: Max keep-alive connections (i.e. threads sending requests at the same time)
+        """
+        # 429 is retried after `Retry-After` by python-gitlab anyway, transient errors (5xx) are retried too
         if api_token:
-            self.gitlab = gitlab.Gitlab(gitlab_host_url, private_token=api_token)
+            self.gitlab = gitlab.Gitlab(gitlab_host_url, private_token=api_token, retry_transient_errors=True)
         elif private_token:
-            self.gitlab = gitlab.Gitlab(gitlab_host_url, private_token=private_token)
+            self.gitlab = gitlab.Gitlab(gitlab_host_url, private_token=private_token, retry_transient_errors=True)
         elif job_token:
-            self.gitlab = gitlab.Gitlab(gitlab_host_url, job_token=job_token)
+            self.gitlab = gitlab.Gitlab(gitlab_host_url, job_token=job_token, retry_transient_errors=True)
         else:
             print_info(
                 'None of `api_token`/`private_token` or `job_token` provided; use without credentials',
                 color='orange',
             )
-            self.gitlab = gitlab.Gitlab(gitlab_host_url)
+            self.gitlab = gitlab.Gitlab(gitlab_host_url, retry_transient_errors=True)
+
+        self.rate_limiter = RateLimiter(rate_limit, rate_limit_burst) if rate_limit else None
+        self.stats: dict[str, RequestStats] = {}  # http method to stats of api requests
+        adapter = _RateLimitedAdapter(self.rate_limiter, self.stats, pool_connections=1, pool_maxsize=pool_size)
+        self.gitlab.session.mount('http://', adapter)
+        self.gitlab.session.mount('https://', adapter)
+
+        # indexes memoized for the run (see `invalidate`)
+        self._groups: dict[str, gitlab.v4.objects.Group] = {}  # group name to group (with id)
+        self._group_projects: dict[str, dict[str, gitlab.v4.objects.GroupProject]] = {}  # group name to projects
+        # username to user (or group member, with the same id, username and name)
+        self._users: dict[str, gitlab.v4.objects.User | gitlab.v4.objects.GroupMember] = {}
+        self._user_locks: dict[str, threading.Lock] = {}  # username to lock of its search
+        self._lock = threading.RLock()  # indexes are shared by threads grading students
+
+    def invalidate(
+            self,
+    ) -> None:
+        """Drop memoized groups, projects and users to get them from gitlab again (e.g. new students registered)"""
+        with self._lock:
+            self._groups.clear()
+            self._group_projects.clear()
+            self._users.clear()
+
+    def _get_group(
+            self,
+            name: str,
+    ) -> gitlab.v4.objects.Group:
+        with self._lock:
+            if name in self._groups:
+                return self._groups[name]
+
+            _groups = typing.cast(list[gitlab.v4.objects.Group], self.gitlab.groups.list(get_all=True, search=name))
+            assert len(_groups) >= 1, f'Could not find group name={name}'
+            # search matches substrings, prefer the exact match
+            _name_to_group = {group.name: group for group in reversed(_groups)}
+
+            self._groups[name] = _name_to_group.get(name, _groups[0])
+            return self._groups[name]
+
+    def _get_group_projects(
+            self,
+            group_name: str,
+    ) -> dict[str, gitlab.v4.objects.GroupProject]:
+        with self._lock:
+            if group_name not in self._group_projects:
+                group = self._get_group(group_name)
+                projects = typing.cast(list[gitlab.v4.objects.GroupProject], group.projects.list(all=True))
+                self._group_projects[group_name] = {project.name: project for project in projects}
+            return self._group_projects[group_name]
 
     def get_project_from_group(
             self,
@@ -37,15 +193,8 @@ class GitlabConnection:
     ) -> gitlab.v4.objects.GroupProject:
         print_info('Get private Project', color='grey')
 
-        _groups = self.gitlab.groups.list(get_all=True, search=group_name)
-
-        print_info(_groups, color='grey')
-        assert len(_groups) >= 1, f'Could not find group_name={group_name}'
-        group = _groups[0]  # type: ignore
+        project = self._get_group_projects(group_name)[project_name]
 
-        project = {i.name: i for i in group.projects.list(all=True)}[project_name]
-
-        project = typing.cast(gitlab.v4.objects.GroupProject, project)
         print_info(f'Got private project: <{project.name}>', color='grey')
 
         return project
@@ -63,16 +212,8 @@ class GitlabConnection:
     ) -> list[gitlab.v4.objects.GroupProject]:
         print_info(f'Get projects in group_name={group_name}', color='grey')
 
-        _groups = self.gitlab.groups.list(get_all=True, search=group_name)
-
-        assert len(_groups) >= 1, f'Could not find group_name={group_name}'
-        group = _groups[0]  # type: ignore
+        projects = list(self._get_group_projects(group_name).values())
 
-        print_info(f'Got group: <{group.name}>', color='grey')
-
-        projects = group.projects.list(all=True)
-
-        projects = typing.cast(list[gitlab.v4.objects.GroupProject], projects)
         print_info(f'Got {len(projects)} projects', color='grey')
 
         return projects
@@ -83,17 +224,14 @@ class GitlabConnection:
     ) -> list[gitlab.v4.objects.GroupMember]:
         print_info(f'Get members in group_name={group_name}', color='grey')
 
-        _groups = self.gitlab.groups.list(get_all=True, search=group_name)
-
-        print_info(_groups, color='grey')
-        assert len(_groups) >= 1, f'Could not find group_name={group_name}'
-        group = _groups[0]  # type: ignore
+        group = self._get_group(group_name)
 
         print_info(f'Got group: <{group.name}>', color='grey')
 
-        members = group.members_all.list(all=True, get_all=True)
-
-        members = typing.cast(list[gitlab.v4.objects.GroupMember], members)
+        members = typing.cast(
+            list[gitlab.v4.objects.GroupMember],
+            group.members_all.list(all=True, get_all=True),
+        )
         print_info(f'Got {len(members)} members', color='grey')
 
         return members
@@ -118,27 +256,59 @@ class GitlabConnection:
 
         return members
 
+    def index_users(
+            self,
+            group_name: str,
+    ) -> None:
+        """
+        Memoize users of the group (members, inherited ones too) with one paginated listing of its members
+        Users not found there are searched one by one by `get_user_by_username`
+        @param group_name: Group to index members of, e.g. students group
+        """
+        group = self._get_group(group_name)
+        members = typing.cast(
+            list[gitlab.v4.objects.GroupMember],
+            group.members_all.list(get_all=True, per_page=100),
+        )
+        print_info(f'Indexed {len(members)} users of group_name={group_name}', color='grey')
+        with self._lock:
+            for member in members:
+                self._users.setdefault(member.username, member)
+
     def get_user_by_username(
             self,
             username: str,
-    ) -> gitlab.v4.objects.User:
+    ) -> gitlab.v4.objects.User | gitlab.v4.objects.GroupMember:
         print_info(f'Get user with username={username}', color='grey')
 
-        _users = self.gitlab.users.list(get_all=True, search=username)
-        assert len(_users) > 0, f'Could not find username={username}'
-
-        if len(_users) > 1:
-            print_info(
-                f'Got multiple users: <{[(user.username, user.name) for user in _users]}>',
-                color='grey'
-            )
-            _username_to_user = {user.username: user for user in _users}
-            assert username in _username_to_user, f'Could not find username={username}'
-            user = _username_to_user[username]
-        else:
-            user = _users[0]  # type: ignore
-
-        user = typing.cast(gitlab.v4.objects.User, user)
+        with self._lock:
+            if username in self._users:
+                return self._users[username]
+            user_lock = self._user_locks.setdefault(username, threading.Lock())
+
+        # a user is searched once, while other users are searched at the same time (not under the common lock)
+        with user_lock:
+            with self._lock:
+                if username in self._users:
+                    return self._users[username]
+
+            _users = self.gitlab.users.list(get_all=True, search=username)
+            assert len(_users) > 0, f'Could not find username={username}'
+
+            if len(_users) > 1:
+                print_info(
+                    f'Got multiple users: <{[(user.username, user.name) for user in _users]}>',
+                    color='grey'
+                )
+                _username_to_user = {user.username: user for user in _users}
+                assert username in _username_to_user, f'Could not find username={username}'
+                user = _username_to_user[username]
+            else:
+                user = _users[0]  # type: ignore
+
+            user = typing.cast(gitlab.v4.objects.User, user)
+            with self._lock:
+                self._users[username] = user
         print_info(f'Got user: <{user.name}>', color='grey')
 
         return user
@@ -181,11 +351,4 @@ class GitlabConnection:
     ) -> gitlab.v4.objects.Group:
         print_info(f'Get group name={name}', color='grey')
 
-        _groups = self.gitlab.groups.list(get_all=True, search=name)
-
-        assert len(_groups) >= 1, f'Could not find group name={name}'
-        group = _groups[0]  # type: ignore
-
-        group = typing.cast(gitlab.v4.objects.Group, group)
-
-        return group
+        return self._get_group(name)
@@ -0,0 +1,228 @@
+"""
+Manifests of directories: size, mtime and content hash of each file, organized into a Merkle tree
+Unchanged files (same size and mtime) are not re-read on refresh; subtrees hashes can be used as content keys
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+MANIFEST_VERSION = 1
+# files modified this close to the previous scan may be changed again without mtime change (coarse timestamps)
+MANIFEST_RACY_INTERVAL_NS = 2 * 10**9
+
+
+def get_file_digest(
+        path: Path | str,
+) -> str:
+    """
+    @param path: File to hash
+    @return: blake2b hex digest of the file content
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@dataclass(frozen=True)
+class FileEntry:
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+@dataclass
+class Manifest:
+    """Files of a directory by relative posix paths; directories are hashed lazily from their children hashes"""
+    files: dict[str, FileEntry] = field(default_factory=dict)
+    scanned_at_ns: int = 0
+    _tree: dict[str, dict[str, str]] | None = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def build(
+            cls,
+            folder: Path,
+            ignore_names: Iterable[str] = (),
+            previous: Manifest | None = None,
+    ) -> Manifest:
+        """
+        Scan the folder; files with the same size and mtime as in the previous manifest are not re-read
+        @param folder: Folder to scan (not existing one is treated as empty)
+        @param ignore_names: Names of files and dirs to skip, e.g. `.git`
+        @param previous: Previous manifest of the same folder
+        @return: manifest of the folder
+        """
+        ignore_names = set(ignore_names)
+        scanned_at_ns = time.time_ns()
+        trusted_before_ns = previous.scanned_at_ns - MANIFEST_RACY_INTERVAL_NS if previous else 0
+
+        files = {}
+        stack = [(str(folder), '')] if folder.is_dir() else []
+        while stack:
+            current_dir, prefix = stack.pop()
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    if entry.name in ignore_names:
+                        continue
+                    path = f'{prefix}{entry.name}'
+                    if entry.is_dir():
+                        stack.append((entry.path, f'{path}/'))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        old_entry = previous.files.get(path) if previous else None
+                        if (
+                                old_entry is not None
+                                and old_entry.size == stat.st_size
+                                and old_entry.mtime_ns == stat.st_mtime_ns
+                                and stat.st_mtime_ns < trusted_before_ns
+                        ):
+                            files[path] = old_entry
+                        else:
+                            files[path] = FileEntry(stat.st_size, stat.st_mtime_ns, get_file_digest(entry.path))
+        return cls(dict(sorted(files.items())), scanned_at_ns)
+
+    def refresh(
+            self,
+            folder: Path,
+            ignore_names: Iterable[str] = (),
+    ) -> Manifest:
+        """Same as `build` with this manifest as the previous one"""
+        return self.build(folder, ignore_names=ignore_names, previous=self)
+
+    def _get_tree(self) -> dict[str, dict[str, str]]:
+        # dir path ('' for the root) to its children names and hashes: `file:<digest>` or `dir:<hash>`
+        if self._tree is not None:
+            return self._tree
+
+        tree: dict[str, dict[str, str]] = {'': {}}
+        for path, entry in self.files.items():
+            folder, _, name = path.rpartition('/')
+            parent = folder
+            while parent not in tree:
+                tree[parent] = {}
+                parent = parent.rpartition('/')[0]
+            tree[folder][name] = f'file:{entry.digest}'
+
+        # children dirs are hashed before their parents
+        for folder in sorted(tree, key=lambda folder: folder.count('/'), reverse=True):
+            if folder:
+                parent, _, name = folder.rpartition('/')
+                tree[parent][name] = f'dir:{self._hash_nodes(tree[folder])}'
+        self._tree = tree
+        return tree
+
+    @staticmethod
+    def _hash_nodes(
+            nodes: dict[str, str],
+    ) -> str:
+        hasher = hashlib.blake2b(digest_size=32)
+        for name, node in sorted(nodes.items()):
+            hasher.update(f'{name}\0{node}\0'.encode())
+        return hasher.hexdigest()
+
+    def get_tree_hash(
+            self,
+            subdir: str = '',
+    ) -> str:
+        """
+        @param subdir: Relative posix path of the subdir; '' for the whole folder
+        @return: hash of names and contents of all files in the subdir (the same for empty and not existing subdirs)
+        """
+        return self._hash_nodes(self._get_tree().get(subdir.strip('/'), {}))
+
+    def diff(
+            self,
+            other: Manifest,
+    ) -> list[str]:
+        """
+        Compare with the other manifest; subtrees with equal hashes are skipped without comparing files
+        @param other: Manifest of the new state
+        @return: sorted added, removed and changed (by content) files
+        """
+        old_tree, new_tree = self._get_tree(), other._get_tree()
+        changed = []
+        dirs = ['']
+        while dirs:
+            folder = dirs.pop()
+            old_nodes, new_nodes = old_tree.get(folder, {}), new_tree.get(folder, {})
+            for name in old_nodes.keys() | new_nodes.keys():
+                old_node, new_node = old_nodes.get(name, ''), new_nodes.get(name, '')
+                if old_node == new_node:
+                    continue
+                path = f'{folder}/{name}' if folder else name
+                # file may be replaced with a dir of the same name and vice versa
+                if old_node.startswith('file:') or new_node.startswith('file:'):
+                    changed.append(path)
+                if old_node.startswith('dir:') or new_node.startswith('dir:'):
+                    dirs.append(path)
+        return sorted(changed)
+
+    def save(
+            self,
+            path: Path,
+    ) -> None:
+        """Save as json atomically (manifests can be shared between several processes)"""
+        data = {
+            'version': MANIFEST_VERSION,
+            'scanned_at_ns': self.scanned_at_ns,
+            'files': {file: [entry.size, entry.mtime_ns, entry.digest] for file, entry in self.files.items()},
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(
+            cls,
+            path: Path,
+    ) -> Manifest | None:
+        """
+        @param path: Path of the saved manifest
+        @return: loaded manifest; None if not exists, corrupted or of other version
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data['version'] != MANIFEST_VERSION:
+                return None
+            files = {
+                file: FileEntry(int(size), int(mtime_ns), str(digest))
+                for file, (size, mtime_ns, digest) in data['files'].items()
+            }
+            return cls(files, int(data['scanned_at_ns']))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+
+
+def get_folder_manifest(
+        folder: Path,
+        manifest_path: Path | None = None,
+        ignore_names: Iterable[str] = (),
+) -> Manifest:
+    """
+    Build the folder manifest reusing the saved one, and save the new one in its place
+    @param folder: Folder to scan
+    @param manifest_path: Path to keep the manifest at between runs; None to build from scratch and not save
+    @param ignore_names: Names of files and dirs to skip
+    @return: up-to-date manifest of the folder
+    """
+    previous = Manifest.load(manifest_path) if manifest_path else None
+    manifest = Manifest.build(folder, ignore_names=ignore_names, previous=previous)
+    if manifest_path:
+        manifest.save(manifest_path)
+    return manifest
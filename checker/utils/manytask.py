@@ -1,14 +1,433 @@
 """Helpers to interact with manytask (push scores tasks)"""
 from __future__ import annotations
 
-import io
 import json
+import os
+import random
+import threading
 import time
-from datetime import datetime
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import IO, Any, Optional, Tuple
 
 import requests
+import requests.adapters
 
 from ..exceptions import GetFailedError, PushFailedError
+from .print import print_info
+from .timings import timed_stage
+
+
+MANYTASK_CONNECT_TIMEOUT = 5.  # seconds
+MANYTASK_READ_TIMEOUT = 60.  # seconds
+MANYTASK_RETRIES = 3
+MANYTASK_BACKOFF_BASE = 1.  # seconds
+MANYTASK_BACKOFF_MAX = 30.  # seconds
+MANYTASK_RETRY_STATUSES = (429, 500, 502, 503, 504)
+MANYTASK_BATCH_SIZE = 50  # reports in one batch request
+MANYTASK_BATCH_UNSUPPORTED_STATUSES = (404, 405, 501)
+MANYTASK_AUTH_ERROR_STATUSES = (401, 403)  # token is invalid, no report can be pushed with it
+SOLUTION_ARCHIVE_NAME = 'solution.tar.gz'  # solution files are pushed with the score packed into one archive
+
+# username, score, commit time, submit time, demand multiplier
+PushResult = Tuple[str, int, Optional[str], Optional[str], Optional[float]]
+
+
+@dataclass
+class RequestStats:
+    count: int = 0  # requests sent, including retries
+    errors: int = 0  # requests failed with connection errors, timeouts or retryable statuses
+    total: float = 0.  # seconds
+    max: float = 0.  # seconds
+
+    def add(self, latency: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.total += latency
+        self.max = max(self.max, latency)
+
+
+@dataclass
+class ScoreReport:
+    """Arguments of a single `ManytaskClient.push_report` call"""
+    task_name: str
+    user_id: int
+    score: float
+    files: dict[str, tuple[str, IO[bytes]]] | None = None
+    send_time: datetime | None = None
+    check_deadline: bool = True
+    use_demand_multiplier: bool = True
+
+
+def _parse_push_result(
+        result: dict[str, Any],
+) -> PushResult:
+    try:
+        result_commit_time = result.get('commit_time', None)
+        result_submit_time = result.get('submit_time', None)
+        demand_multiplier = float(result.get('demand_multiplier', 1))
+        return result['username'], result['score'], result_commit_time, result_submit_time, demand_multiplier
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise PushFailedError('Unable to decode response') from e
+
+
+def is_unavailable_error(
+        error: Exception,
+) -> bool:
+    """
+    @param error: Error of a push or get request
+    @return: manytask is down or overloaded even after retries (connection errors, 5xx, 429), the request can be
+        repeated later; other errors are rejections of the request itself
+    """
+    if isinstance(error, requests.RequestException):
+        return True
+    return isinstance(error, PushFailedError) and error.status_code in MANYTASK_RETRY_STATUSES
+
+
+def get_retry_after(
+        response: requests.Response,
+) -> float | None:
+    """
+    @param response: Response with 429 or 503 status
+    @return: seconds to wait from `Retry-After` header (delay or http date); None if not set or invalid
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.)
+    except (TypeError, ValueError):
+        return None
+
+
+class ManytaskClient:
+    """Manytask api client with a keep-alive connections pool
+    Failed requests (connection errors, timeouts, 429 and 5xx) are retried with exponential backoff and full jitter,
+    so concurrent jobs do not retry in lockstep; `Retry-After` of the server takes precedence
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            token: str,
+            *,
+            connect_timeout: float = MANYTASK_CONNECT_TIMEOUT,
+            read_timeout: float = MANYTASK_READ_TIMEOUT,
+            retries: int = MANYTASK_RETRIES,
+            backoff_base: float = MANYTASK_BACKOFF_BASE,
+            backoff_max: float = MANYTASK_BACKOFF_MAX,
+            pool_size: int = 10,
+    ) -> None:
+        """
+        @param base_url: Manytask url, e.g. `https://py.manytask.org`
+        @param token: Tester token
+        @param connect_timeout: Seconds to wait for connection to be established
+        @param read_timeout: Seconds to wait for the server response (between bytes, not the total time)
+        @param retries: Max attempts of each request
+        @param backoff_base: Max delay before the first retry, doubled for each next one
+        @param backoff_max: Max delay between retries (`Retry-After` is capped by it too)
+        @param pool_size: Max keep-alive connections (i.e. requests at the same time without re-connects)
+        """
+        assert retries > 0, 'Number of retries have to be positive'
+        self.base_url = base_url.rstrip('/')
+        self._token = token
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_supported: bool | None = None  # unknown until the first batch request
+        self.stats: dict[str, RequestStats] = {}
+        self._stats_lock = threading.Lock()
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def _get_backoff(
+            self,
+            attempt: int,
+    ) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(
+            self,
+            endpoint: str,
+            latency: float,
+            error: bool,
+    ) -> None:
+        with self._stats_lock:
+            self.stats.setdefault(endpoint, RequestStats()).add(latency, error=error)
+
+    def print_stats(self) -> None:
+        """Print requests count, failures and latency of each endpoint (e.g. at the end of a job)"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        for endpoint, endpoint_stats in sorted(stats.items()):
+            print_info(
+                f'Manytask /api/{endpoint}: {endpoint_stats.count} requests ({endpoint_stats.errors} failed), '
+                f'avg {endpoint_stats.total / endpoint_stats.count:.2f}s, max {endpoint_stats.max:.2f}s',
+                color='grey',
+            )
+
+    def _request(
+            self,
+            send: Callable[..., requests.Response],
+            endpoint: str,
+            data: dict[str, Any],
+            files: dict[str, tuple[str, IO[bytes]]] | None = None,
+    ) -> requests.Response:
+        for attempt in range(self.retries):
+            if files:
+                # re-send files from the start on retries
+                for _, file in files.values():
+                    file.seek(0)
+
+            start_time = time.monotonic()
+            try:
+                with timed_stage('manytask'):
+                    response = send(url=f'{self.base_url}/api/{endpoint}', data=data, files=files, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(endpoint, time.monotonic() - start_time, error=True)
+                if attempt + 1 == self.retries:
+                    raise
+                # do not expose token in logs: exception only, not the request
+                reason, delay = e.__class__.__name__, self._get_backoff(attempt)
+            else:
+                retryable = response.status_code in MANYTASK_RETRY_STATUSES
+                self._record(endpoint, time.monotonic() - start_time, error=retryable)
+                if not retryable or attempt + 1 == self.retries:
+                    return response
+                retry_after = get_retry_after(response)
+                reason = str(response.status_code)
+                delay = self._get_backoff(attempt) if retry_after is None else min(retry_after, self.backoff_max)
+
+            print_info(
+                f'Manytask /api/{endpoint} failed ({reason}), retry {attempt + 1}/{self.retries - 1} in {delay:.1f}s',
+                color='grey',
+            )
+            time.sleep(delay)
+        assert False, 'Not Reachable'  # pragma: no cover
+
+    def push_report(
+            self,
+            task_name: str,
+            user_id: int,
+            score: float,
+            files: dict[str, tuple[str, IO[bytes]]] | None = None,
+            send_time: datetime | None = None,
+            check_deadline: bool = True,
+            use_demand_multiplier: bool = True,
+    ) -> PushResult:
+        # Do not expose token in logs.
+        data = {
+            'token': self._token,
+            'task': task_name,
+            'user_id': user_id,
+            'score': score,
+            'check_deadline': check_deadline,
+            'use_demand_multiplier': use_demand_multiplier,
+        }
+        if send_time:
+            data['commit_time'] = send_time
+
+        response = self._request(self._session.post, 'report', data, files=files)
+
+        if response.status_code >= 500:
+            response.raise_for_status()
+            assert False, 'Not Reachable'  # pragma: no cover
+        elif response.status_code >= 400:
+            # Client error often means early submission
+            raise PushFailedError(f'{response.status_code}: {response.text}', status_code=response.status_code)
+        else:
+            try:
+                return _parse_push_result(response.json())
+            except json.JSONDecodeError as e:
+                raise PushFailedError('Unable to decode response') from e
+
+    def _is_batch_supported(self) -> bool:
+        # probe `/api/reports` with an empty batch once, not to upload solution files to a server without it
+        if self.batch_supported is None:
+            response = self._request(self._session.post, 'reports', {'token': self._token, 'reports': '[]'})
+            if response.status_code >= 500 and response.status_code not in MANYTASK_BATCH_UNSUPPORTED_STATUSES:
+                response.raise_for_status()
+            try:
+                self.batch_supported = response.status_code < 400 and response.json()['results'] == []
+            except (json.JSONDecodeError, KeyError, TypeError):
+                self.batch_supported = False
+        return self.batch_supported
+
+    def _push_batch(
+            self,
+            reports: list[ScoreReport],
+    ) -> list[PushResult | Exception] | None:
+        # one request to `/api/reports`; files of the i-th report are sent as `<i>/<name>` fields
+        # None if the server does not support batches or can not handle this one (e.g. too large)
+        # Do not expose token in logs.
+        data = {
+            'token': self._token,
+            'reports': json.dumps([
+                {
+                    'task': report.task_name,
+                    'user_id': report.user_id,
+                    'score': report.score,
+                    'check_deadline': report.check_deadline,
+                    'use_demand_multiplier': report.use_demand_multiplier,
+                    **({'commit_time': str(report.send_time)} if report.send_time else {}),
+                }
+                for report in reports
+            ]),
+        }
+        files = {
+            f'{index}/{name}': file
+            for index, report in enumerate(reports)
+            for name, file in (report.files or {}).items()
+        }
+
+        response = self._request(self._session.post, 'reports', data, files=files or None)
+
+        if response.status_code in MANYTASK_BATCH_UNSUPPORTED_STATUSES:
+            self.batch_supported = False
+            return None
+        if response.status_code >= 500:
+            response.raise_for_status()
+        if response.status_code >= 400:
+            return None
+        try:
+            results = response.json()['results']
+            assert isinstance(results, list) and len(results) == len(reports)
+        except (json.JSONDecodeError, KeyError, TypeError, AssertionError):
+            return None
+        self.batch_supported = True
+
+        batch_results: list[PushResult | Exception] = []
+        for result in results:
+            if isinstance(result, dict) and 'error' in result:
+                status_code = result.get('status', 400)
+                batch_results.append(PushFailedError(f'{status_code}: {result["error"]}', status_code=status_code))
+                continue
+            try:
+                batch_results.append(_parse_push_result(result))
+            except PushFailedError as e:
+                batch_results.append(e)
+        return batch_results
+
+    def push_reports(
+            self,
+            reports: list[ScoreReport],
+    ) -> list[PushResult | Exception]:
+        """
+        Push many reports in batch requests, falling back to a request per report if batches are not supported
+        (checked once with an empty batch, so solution files are not uploaded twice)
+        Once a request fails with a connection or server error (after retries) or the token is rejected,
+        the rest is not pushed
+        @param reports: Reports to push
+        @return: push result or error (PushFailedError, requests.RequestException) of each report, in order
+        """
+        results: list[PushResult | Exception] = []
+        for start in range(0, len(reports), MANYTASK_BATCH_SIZE):
+            batch = reports[start:start + MANYTASK_BATCH_SIZE]
+            batch_results = None
+            if len(batch) > 1:
+                try:
+                    if self._is_batch_supported():
+                        batch_results = self._push_batch(batch)
+                except requests.RequestException as e:
+                    return results + [e] * (len(reports) - len(results))
+
+            if batch_results is None:
+                for report in batch:
+                    try:
+                        results.append(self.push_report(
+                            report.task_name,
+                            report.user_id,
+                            report.score,
+                            files=report.files,
+                            send_time=report.send_time,
+                            check_deadline=report.check_deadline,
+                            use_demand_multiplier=report.use_demand_multiplier,
+                        ))
+                    except PushFailedError as e:
+                        if e.status_code in MANYTASK_AUTH_ERROR_STATUSES:
+                            return results + [e] * (len(reports) - len(results))
+                        results.append(e)
+                    except requests.RequestException as e:
+                        return results + [e] * (len(reports) - len(results))
+            else:
+                results.extend(batch_results)
+        return results
+
+    def get_score(
+            self,
+            task_name: str,
+            user_id: int,
+    ) -> float | None:
+        # Do not expose token in logs.
+        data = {
+            'token': self._token,
+            'task': task_name,
+            'user_id': user_id,
+        }
+
+        response = self._request(self._session.get, 'score', data)
+
+        if response.status_code >= 500:
+            response.raise_for_status()
+            assert False, 'Not Reachable'  # pragma: no cover
+        # Client error often means early submission
+        elif response.status_code >= 400:
+            raise GetFailedError(f'{response.status_code}: {response.text}')
+        else:
+            try:
+                result = response.json()
+                return result['score']
+            except (json.JSONDecodeError, KeyError):
+                # raise GetFailedError()
+                pass
+
+        return None
+
+
+_clients: dict[tuple[Any, ...], ManytaskClient] = {}
+_clients_lock = threading.Lock()
+
+
+def _forget_clients() -> None:
+    # connections of the parent process must not be shared with forked workers
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+
+def get_manytask_client(
+        base_url: str,
+        token: str,
+        **kwargs: Any,
+) -> ManytaskClient:
+    """
+    Get the shared client of the process, so keep-alive connections are reused by all requests
+    @param base_url: Manytask url
+    @param token: Tester token
+    @param kwargs: Other `ManytaskClient` args, e.g. timeouts
+    @return: client created on the first call with the same args
+    """
+    key = (base_url, token, *sorted(kwargs.items()))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ManytaskClient(base_url, token, **kwargs)
+        return _clients[key]
 
 
 def push_report(
@@ -17,47 +436,20 @@ def push_report(
         task_name: str,
         user_id: int,
         score: float,
-        files: dict[str, tuple[str, io.BufferedReader]] | None = None,
+        files: dict[str, tuple[str, IO[bytes]]] | None = None,
         send_time: datetime | None = None,
         check_deadline: bool = True,
         use_demand_multiplier: bool = True,
-) -> tuple[str, int, str | None, str | None, float | None]:
-    # Do not expose token in logs.
-    data = {
-        'token': tester_token,
-        'task': task_name,
-        'user_id': user_id,
-        'score': score,
-        'check_deadline': check_deadline,
-        'use_demand_multiplier': use_demand_multiplier,
-    }
-    if send_time:
-        data['commit_time'] = send_time
-
-    response = None
-    for _ in range(3):
-        response = requests.post(url=f'{report_base_url}/api/report', data=data, files=files)
-
-        if response.status_code < 500:
-            break
-        time.sleep(1.0)
-    assert response is not None
-
-    if response.status_code >= 500:
-        response.raise_for_status()
-        assert False, 'Not Reachable'  # pragma: no cover
-    elif response.status_code >= 400:
-        # Client error often means early submission
-        raise PushFailedError(f'{response.status_code}: {response.text}')
-    else:
-        try:
-            result = response.json()
-            result_commit_time = result.get('commit_time', None)
-            result_submit_time = result.get('submit_time', None)
-            demand_multiplier = float(result.get('demand_multiplier', 1))
-            return result['username'], result['score'], result_commit_time, result_submit_time, demand_multiplier
-        except (json.JSONDecodeError, KeyError) as e:
-            raise PushFailedError('Unable to decode response') from e
+) -> PushResult:
+    return get_manytask_client(report_base_url, tester_token).push_report(
+        task_name,
+        user_id,
+        score,
+        files=files,
+        send_time=send_time,
+        check_deadline=check_deadline,
+        use_demand_multiplier=use_demand_multiplier,
+    )
 
 
 def get_score(
@@ -66,32 +458,4 @@ def get_score(
         task_name: str,
         user_id: int,
 ) -> float | None:
-    # Do not expose token in logs.
-    data = {
-        'token': tester_token,
-        'task': task_name,
-        'user_id': user_id,
-    }
-    # response = None
-    for _ in range(3):
-        response = requests.get(url=f'{report_base_url}/api/score', data=data)
-
-        if response.status_code < 500:
-            break
-        time.sleep(1.0)
-
-    if response.status_code >= 500:
-        response.raise_for_status()
-        assert False, 'Not Reachable'  # pragma: no cover
-    # Client error often means early submission
-    elif response.status_code >= 400:
-        raise GetFailedError(f'{response.status_code}: {response.text}')
-    else:
-        try:
-            result = response.json()
-            return result['score']
-        except (json.JSONDecodeError, KeyError):
-            # raise GetFailedError()
-            pass
-
-    return None
+    return get_manytask_client(report_base_url, tester_token).get_score(task_name, user_id)
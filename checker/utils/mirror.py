@@ -0,0 +1,128 @@
+"""
+Runner-local bare mirrors of remote repos
+Jobs clone and fetch from the local mirror; only the mirror is fetched from the remote, incrementally
+"""
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import subprocess
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from .print import print_info
+
+
+def get_url_without_credentials(
+        url: str,
+) -> str:
+    parts = urlsplit(url)
+    if '@' not in parts.netloc:
+        return url
+    return urlunsplit(parts._replace(netloc=parts.netloc.rsplit('@', maxsplit=1)[1]))
+
+
+class GitMirror:
+    """Bare mirror of remote repo branches in the local cache dir, shared by all jobs of the runner
+    Updates are serialized with a file lock; the remote url is passed at fetch time only, so credentials are not saved
+    """
+
+    STAMP_FILE = 'checker-fetched'
+
+    def __init__(
+            self,
+            mirrors_dir: Path,
+            url: str,
+    ) -> None:
+        """
+        @param mirrors_dir: Directory to keep mirrors in (created if not exists)
+        @param url: Remote repo url (credentials are ignored, used to name the mirror only)
+        """
+        url = get_url_without_credentials(url).removesuffix('/').removesuffix('.git')
+        name = url.rsplit('/', maxsplit=1)[-1]
+        url_hash = hashlib.sha256(url.encode()).hexdigest()[:16]
+        self.path = mirrors_dir / f'{name}-{url_hash}.git'
+        self._lock_path = mirrors_dir / f'{name}-{url_hash}.lock'
+
+    @property
+    def url(self) -> str:
+        """Url to fetch from the mirror with (file:// for filters to work)"""
+        return self.path.absolute().as_uri()
+
+    @contextmanager
+    def _lock(
+            self,
+            shared: bool = False,
+    ) -> Iterator[None]:
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _git(
+            self,
+            *args: str,
+            cwd: Path | None = None,
+    ) -> None:
+        r = subprocess.run(
+            ['git', *args],
+            encoding='utf-8',
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd or self.path,
+        )
+        if r.returncode != 0:
+            # do not expose credentials in the error
+            safe_args = [get_url_without_credentials(arg) for arg in args]
+            raise subprocess.CalledProcessError(r.returncode, ['git', *safe_args], output=r.stdout)
+
+    def update(
+            self,
+            remote_url: str,
+    ) -> None:
+        """
+        Create the mirror or fetch new commits of all branches into it
+        If another job has fetched while this one was waiting for the lock, the fetch is skipped
+        @param remote_url: Remote repo url, may contain credentials
+        """
+        requested_at = time.time()
+        with self._lock():
+            stamp = self.path / self.STAMP_FILE
+            if stamp.exists() and stamp.stat().st_mtime >= requested_at:
+                return
+
+            if not self.path.exists():
+                print_info(f'Creating git mirror {self.path}...', color='grey')
+                self.path.mkdir(parents=True)
+                self._git('init', '--bare')
+                # allow partial fetches (blob:none) of any commit from the mirror
+                self._git('config', 'uploadpack.allowFilter', 'true')
+                self._git('config', 'uploadpack.allowAnySHA1InWant', 'true')
+
+            start_time = time.monotonic()
+            self._git('fetch', '--prune', '--no-tags', remote_url, '+refs/heads/*:refs/heads/*')
+            stamp.touch()
+            print_info(f'Git mirror is updated in {time.monotonic() - start_time:.1f}s', color='grey')
+
+    def clone(
+            self,
+            target_dir: Path,
+            remote_url: str,
+            branch: str,
+    ) -> None:
+        """
+        Clone the mirror branch with `origin` set to the remote repo (objects are hardlinked, not downloaded)
+        @param target_dir: Directory to clone into (empty or not existing)
+        @param remote_url: Remote repo url to set as origin, may contain credentials
+        @param branch: Branch to check out
+        @raise subprocess.CalledProcessError: if the branch does not exist (e.g. empty repo)
+        """
+        with self._lock(shared=True):
+            self._git('clone', '--branch', branch, str(self.path), str(target_dir), cwd=target_dir.parent)
+        self._git('remote', 'set-url', 'origin', remote_url, cwd=target_dir)
@@ -0,0 +1,216 @@
+"""
+Durable outbox of score reports not delivered to manytask (e.g. it is down or overloaded)
+Reports are kept in sqlite db on a runner volume and pushed later with the original commit time
+"""
+from __future__ import annotations
+
+import io
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from ..exceptions import PushFailedError
+from .manytask import (
+    MANYTASK_AUTH_ERROR_STATUSES,
+    SOLUTION_ARCHIVE_NAME,
+    ManytaskClient,
+    ScoreReport,
+    is_unavailable_error,
+)
+from .print import print_info
+
+
+OUTBOX_LOCK_TIMEOUT = 60.  # seconds, db is shared by concurrent jobs
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    base_url TEXT NOT NULL,
+    task_name TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    send_time TEXT NOT NULL,
+    check_deadline INTEGER NOT NULL,
+    use_demand_multiplier INTEGER NOT NULL,
+    files BLOB,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    UNIQUE (base_url, task_name, user_id, send_time)
+)
+'''
+
+
+@dataclass
+class PendingReport:
+    id: int
+    task_name: str
+    user_id: int
+    score: float
+    send_time: datetime | None
+    check_deadline: bool
+    use_demand_multiplier: bool
+    files: bytes | None  # packed solution files
+    attempts: int
+
+
+class ReportOutbox:
+    """Queue of reports to push, in sqlite db file
+    Each operation opens its own connection, so the outbox can be used from forked workers and concurrent jobs
+    """
+
+    def __init__(
+            self,
+            path: Path,
+    ) -> None:
+        """
+        @param path: Path of the db file (created with parent dirs if not exists)
+        """
+        self.path = path
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.path, timeout=OUTBOX_LOCK_TIMEOUT)) as connection:
+            with connection:  # transaction
+                connection.execute(_SCHEMA)
+                yield connection
+
+    def put(
+            self,
+            base_url: str,
+            task_name: str,
+            user_id: int,
+            score: float,
+            send_time: datetime | None = None,
+            check_deadline: bool = True,
+            use_demand_multiplier: bool = True,
+            files: bytes | None = None,
+    ) -> None:
+        """
+        Save the report to push later; a report of the same commit (send time) replaces the saved one
+        The token is not saved, reports are pushed with the token of the flushing job
+        @param base_url: Manytask url to push to
+        @param files: Packed solution files (see `pack_folder`)
+        Other params are the same as for `ManytaskClient.push_report`
+        """
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO reports '
+                '(base_url, task_name, user_id, score, send_time, check_deadline, use_demand_multiplier, files, '
+                'created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    base_url.rstrip('/'), task_name, user_id, score, send_time.isoformat() if send_time else '',
+                    check_deadline, use_demand_multiplier, files, time.time(),
+                ),
+            )
+
+    def get_pending(
+            self,
+            base_url: str,
+    ) -> list[PendingReport]:
+        """
+        @param base_url: Manytask url
+        @return: saved reports to push to the manytask, oldest first
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                'SELECT id, task_name, user_id, score, send_time, check_deadline, use_demand_multiplier, files, '
+                'attempts FROM reports WHERE base_url = ? ORDER BY id',
+                (base_url.rstrip('/'),),
+            ).fetchall()
+        return [
+            PendingReport(
+                id=report_id,
+                task_name=task_name,
+                user_id=user_id,
+                score=score,
+                send_time=datetime.fromisoformat(send_time) if send_time else None,
+                check_deadline=bool(check_deadline),
+                use_demand_multiplier=bool(use_demand_multiplier),
+                files=files,
+                attempts=attempts,
+            )
+            for report_id, task_name, user_id, score, send_time, check_deadline, use_demand_multiplier, files, attempts
+            in rows
+        ]
+
+    def remove(
+            self,
+            report_id: int,
+    ) -> None:
+        with self._connect() as connection:
+            connection.execute('DELETE FROM reports WHERE id = ?', (report_id,))
+
+    def mark_failed(
+            self,
+            report_id: int,
+            error: str,
+    ) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                'UPDATE reports SET attempts = attempts + 1, last_error = ? WHERE id = ?',
+                (error, report_id),
+            )
+
+
+def flush_outbox(
+        outbox: ReportOutbox,
+        client: ManytaskClient,
+) -> tuple[int, int]:
+    """
+    Push saved reports oldest first (in batches if supported); stop on the first connection error, server error or 429
+    (manytask is still unavailable or overloaded) or auth error (token is rejected).
+    Pushing the same report twice sets the same score, so concurrent flushes are safe
+    Only reports rejected by manytask itself (4xx, e.g. unknown task or user) are dropped, they would not be accepted
+    later; reports failed otherwise (e.g. response can not be decoded) are kept and marked failed
+    @param outbox: Outbox to push reports from
+    @param client: Manytask client to push with
+    @return: number of pushed reports and number of reports left in the outbox
+    """
+    reports = outbox.get_pending(client.base_url)
+    score_reports = [
+        ScoreReport(
+            report.task_name,
+            report.user_id,
+            report.score,
+            files=(
+                {SOLUTION_ARCHIVE_NAME: (SOLUTION_ARCHIVE_NAME, io.BytesIO(report.files))}
+                if report.files is not None else None
+            ),
+            send_time=report.send_time,
+            check_deadline=report.check_deadline,
+            use_demand_multiplier=report.use_demand_multiplier,
+        )
+        for report in reports
+    ]
+
+    pushed, stopped = 0, False
+    for report, result in zip(reports, client.push_reports(score_reports)):
+        if isinstance(result, PushFailedError) and result.status_code in MANYTASK_AUTH_ERROR_STATUSES:
+            if not stopped:
+                print_info(f'Manytask rejected the token ({result}), stop pushing', color='orange')
+                outbox.mark_failed(report.id, str(result))
+                stopped = True
+        elif isinstance(result, Exception) and is_unavailable_error(result):
+            if not stopped:
+                print_info(f'Manytask is unavailable ({result.__class__.__name__}), stop pushing', color='orange')
+                outbox.mark_failed(report.id, result.__class__.__name__)
+                stopped = True
+        elif isinstance(result, PushFailedError) and result.status_code is not None:
+            print_info(f'Report of {report.task_name} for user {report.user_id} is rejected: {result}', color='orange')
+            outbox.remove(report.id)
+        elif isinstance(result, Exception):
+            print_info(f'Unable to push {report.task_name} for user {report.user_id}: {result}', color='orange')
+            outbox.mark_failed(report.id, str(result))
+        else:
+            username, score, _, _, _ = result
+            print_info(f'Pushed {report.task_name} for @{username}: {score}', color='blue')
+            outbox.remove(report.id)
+            pushed += 1
+    return pushed, len(outbox.get_pending(client.base_url))
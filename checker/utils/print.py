@@ -1,9 +1,41 @@
 from __future__ import annotations
 
+import io
 import sys
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
 from typing import Any
 
 
+_capture = threading.local()
+
+
+@contextmanager
+def capture_output(
+        tee: bool = False,
+) -> Iterator[io.StringIO]:
+    """
+    Capture print_info output of the current thread (other threads are not affected)
+    @param tee: Pass captured output further (to outer capture or to the file)
+    @return: buffer with captured output
+    """
+    buffer = io.StringIO()
+    captures: list[tuple[io.StringIO, bool]] = getattr(_capture, 'stack', [])
+    _capture.stack = [*captures, (buffer, tee)]
+    try:
+        yield buffer
+    finally:
+        _capture.stack = captures
+
+
+def is_output_captured() -> bool:
+    """
+    @return: print_info output of the current thread is captured (not printed right away)
+    """
+    return bool(getattr(_capture, 'stack', []))
+
+
 def print_info(
         *args: Any,
         file: Any = None,
@@ -22,13 +54,18 @@ def print_info(
         'endc': '\033[0m',
     }
 
-    file = file or sys.stderr
-
     data = ' '.join(map(str, args))
     if color in colors:
-        print(colors[color] + data + colors['endc'], file=file, **kwargs)
-    else:
-        print(data, file=file, **kwargs)
+        data = colors[color] + data + colors['endc']
+
+    if file is None:
+        for buffer, tee in reversed(getattr(_capture, 'stack', [])):
+            print(data, file=buffer, **kwargs)
+            if not tee:
+                return
+
+    file = file or sys.stderr
+    print(data, file=file, **kwargs)
     file.flush()
 
 
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import io
+import multiprocessing.queues
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, TextIO
+
+from .print import print_info
+
+
+class TaskOutputStream(io.TextIOBase):
+    """Text stream sending task output to the parent process line by line
+    Only the current line is kept in memory (long lines are sent in chunks);
+    whole output can be written to the task log file as well
+    """
+
+    MAX_LINE_LENGTH = 64 * 1024
+
+    def __init__(
+            self,
+            output_queue: multiprocessing.queues.Queue[Any] | queue.Queue[Any],
+            task_name: str,
+            log_file: Path | None = None,
+    ) -> None:
+        """
+        @param output_queue: Queue to put ('line', task_name, line) messages into
+        @param task_name: Task name to send with every line
+        @param log_file: File to write whole task output into
+        """
+        super().__init__()
+        self.output_queue = output_queue
+        self.task_name = task_name
+        self._buffer = ''
+        self._log: TextIO | None = None
+        if log_file is not None:
+            log_file.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(log_file, 'w')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if self._log is not None:
+            self._log.write(s)
+        self._buffer += s
+        while (newline := self._buffer.find('\n')) != -1:
+            self._send(self._buffer[:newline + 1])
+            self._buffer = self._buffer[newline + 1:]
+        while len(self._buffer) > self.MAX_LINE_LENGTH:
+            self._send(self._buffer[:self.MAX_LINE_LENGTH] + '\n')
+            self._buffer = self._buffer[self.MAX_LINE_LENGTH:]
+        return len(s)
+
+    def _send(self, line: str) -> None:
+        self.output_queue.put(('line', self.task_name, line))
+
+    def close(self) -> None:
+        if self._buffer:
+            self._send(self._buffer + '\n')
+            self._buffer = ''
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        super().close()
+
+
+class CheckProgress:
+    """Live output of parallel checks
+    Prints lines of running tasks with task name prefix and progress summary (running/done/failed, ETA)
+    """
+
+    def __init__(
+            self,
+            total: int,
+            workers: int,
+            estimates: dict[str, float] | None = None,
+            report_interval: float = 30.,
+    ) -> None:
+        """
+        @param total: Number of tasks to check
+        @param workers: Number of parallel workers
+        @param estimates: Expected duration of the tasks in seconds (task name to seconds)
+        @param report_interval: Print summary at least every `report_interval` seconds
+        """
+        self.total = total
+        self.workers = workers
+        self.estimates = estimates or {}
+        self.report_interval = report_interval
+
+        self.start_time = time.monotonic()
+        self.running: dict[str, float] = {}
+        self.done: set[str] = set()
+        self.failed: set[str] = set()
+        self._lock = threading.Lock()
+
+    def start(
+            self,
+            task_name: str,
+    ) -> None:
+        with self._lock:
+            if task_name not in self.done:  # messages may come after the task result
+                self.running[task_name] = time.monotonic()
+
+    def finish(
+            self,
+            task_name: str,
+            failed: bool = False,
+    ) -> None:
+        with self._lock:
+            self.running.pop(task_name, None)
+            self.done.add(task_name)
+            if failed:
+                self.failed.add(task_name)
+        self.print_summary()
+
+    def eta(self) -> float | None:
+        """
+        @return: Estimated time to finish all tasks in seconds; None if unknown yet
+        """
+        now = time.monotonic()
+        left = self.total - len(self.done)
+        if left == 0:
+            return 0.
+        if self.estimates:
+            # expected duration of not finished tasks minus time already spent on running ones
+            not_started = [
+                duration for name, duration in self.estimates.items()
+                if name not in self.done and name not in self.running
+            ]
+            in_progress = [
+                max(self.estimates.get(name, 0.) - (now - start_time), 0.)
+                for name, start_time in self.running.items()
+            ]
+            return (sum(not_started) + sum(in_progress)) / self.workers
+        if not self.done:
+            return None
+        return (now - self.start_time) / len(self.done) * left
+
+    def summary(self) -> str:
+        with self._lock:
+            eta = self.eta()
+            eta_str = '?' if eta is None else f'{eta:.0f}s'
+            return (
+                f'Progress: {len(self.running)} running, {len(self.done)}/{self.total} done, '
+                f'{len(self.failed)} failed, ETA {eta_str}'
+            )
+
+    def print_summary(self) -> None:
+        print_info(self.summary(), color='blue')
+
+    def print_line(
+            self,
+            task_name: str,
+            line: str,
+    ) -> None:
+        print_info(f'[{task_name}] {line}', end='')
+
+    def consume(
+            self,
+            output_queue: multiprocessing.queues.Queue[Any] | queue.Queue[Any],
+    ) -> None:
+        """
+        Print messages from the workers until None received
+        @param output_queue: Queue of ('start', task_name, None) and ('line', task_name, line) messages
+        """
+        last_report_time = time.monotonic()
+        while True:
+            try:
+                message = output_queue.get(timeout=self.report_interval)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            if message:
+                kind, task_name, line = message
+                if kind == 'start':
+                    self.start(task_name)
+                else:
+                    self.print_line(task_name, line)
+            if time.monotonic() - last_report_time >= self.report_interval:
+                self.print_summary()
+                last_report_time = time.monotonic()
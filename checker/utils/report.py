@@ -0,0 +1,212 @@
+"""
+Machine-readable reports of tasks checking
+"""
+from __future__ import annotations
+
+import json
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from ..exceptions import RunFailedError, TimeoutExpiredError
+from .timings import StageTiming, collect_timings
+
+
+TASK_PASSED = 'passed'
+TASK_FAILED = 'failed'
+TASK_SKIPPED = 'skipped'  # not started or cancelled
+
+
+def get_failure_class(
+        error: BaseException,
+) -> str:
+    """
+    @param error: Exception the task failed with
+    @return: exception class name; `TimeoutExpiredError` if caused by timeout (testers wrap it into TestsFailedError)
+    """
+    cause: BaseException | None = error
+    while cause is not None:
+        if isinstance(cause, TimeoutExpiredError):
+            return TimeoutExpiredError.__name__
+        cause = cause.__cause__ or cause.__context__
+    return error.__class__.__name__
+
+
+@dataclass
+class TaskReport:
+    name: str
+    status: str
+    duration: float | None = None  # seconds
+    score: float | None = None  # percentage of the task max score
+    failure: str | None = None  # failure class, e.g. `BuildFailedError` or `TimeoutExpiredError`
+    message: str | None = None
+    stages: dict[str, StageTiming] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(
+            cls,
+            data: dict[str, Any],
+    ) -> TaskReport:
+        data = dict(data)
+        data['stages'] = {stage: StageTiming(**timing) for stage, timing in data.get('stages', {}).items()}
+        return cls(**data)
+
+
+@contextmanager
+def measure_task(
+        task_name: str,
+) -> Iterator[TaskReport]:
+    """
+    Measure the task testing in the current thread: status, failure class, wall time and stages timings
+    Exceptions are re-raised after recording
+    @param task_name: Task full name
+    @return: task report, filled in on exit (score is to be set by the caller)
+    """
+    report = TaskReport(task_name, TASK_FAILED)
+    start_time = time.monotonic()
+    with collect_timings() as timings:
+        try:
+            yield report
+            report.status = TASK_PASSED
+        except Exception as e:
+            report.failure = get_failure_class(e)
+            report.message = e.msg if isinstance(e, RunFailedError) else str(e)
+            raise
+        finally:
+            report.duration = round(time.monotonic() - start_time, 3)
+            report.stages = {stage: timing.rounded() for stage, timing in timings.items()}
+
+
+@dataclass
+class CheckReport:
+    """Result of tasks checking (possibly of a single shard)"""
+    selected_tasks: list[str]
+    tasks: list[TaskReport] = field(default_factory=list)
+    shard_index: int | None = None
+    shard_count: int | None = None
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return not self.errors and all(task.status != TASK_FAILED for task in self.tasks)
+
+    def save(
+            self,
+            path: Path,
+    ) -> None:
+        data = asdict(self)
+        data['success'] = self.success
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def save_junit(
+            self,
+            path: Path,
+            suite_name: str = 'checker',
+    ) -> None:
+        """
+        Save in JUnit XML format, understood by CI systems; score and stages timings are testcase properties
+        @param path: Path to save to
+        @param suite_name: Name of the test suite
+        """
+        counts = Counter(task.status for task in self.tasks)
+        suite = ET.Element(
+            'testsuite',
+            name=suite_name,
+            tests=str(len(self.tasks)),
+            failures=str(counts[TASK_FAILED]),
+            errors=str(len(self.errors)),
+            skipped=str(counts[TASK_SKIPPED]),
+            time=f'{sum(task.duration or 0. for task in self.tasks):.3f}',
+        )
+        for task in self.tasks:
+            group_name, _, task_name = task.name.rpartition('/')
+            testcase = ET.SubElement(
+                suite,
+                'testcase',
+                classname=group_name or suite_name,
+                name=task_name,
+                time=f'{task.duration or 0.:.3f}',
+            )
+            properties = ET.SubElement(testcase, 'properties')
+            if task.score is not None:
+                ET.SubElement(properties, 'property', name='score', value=str(task.score))
+            for stage, timing in task.stages.items():
+                ET.SubElement(properties, 'property', name=f'stage.{stage}.wall', value=str(timing.wall))
+                ET.SubElement(properties, 'property', name=f'stage.{stage}.cpu', value=str(timing.cpu))
+            if task.status == TASK_FAILED:
+                failure = ET.SubElement(testcase, 'failure', type=task.failure or '', message=task.message or '')
+                failure.text = task.message
+            elif task.status == TASK_SKIPPED:
+                ET.SubElement(testcase, 'skipped')
+        if self.errors:
+            ET.SubElement(suite, 'system-err').text = '\n'.join(self.errors)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        testsuites = ET.Element('testsuites')
+        testsuites.append(suite)
+        tree = ET.ElementTree(testsuites)
+        ET.indent(tree)
+        tree.write(path, encoding='utf-8', xml_declaration=True)
+
+    @classmethod
+    def load(
+            cls,
+            path: Path,
+    ) -> CheckReport:
+        with open(path) as f:
+            data = json.load(f)
+        data.pop('success', None)
+        data['tasks'] = [TaskReport.from_dict(task) for task in data.get('tasks', [])]
+        return cls(**data)
+
+    @classmethod
+    def merge(
+            cls,
+            reports: list[CheckReport],
+    ) -> CheckReport:
+        """
+        Combine shards reports into one, check all the shards are present and each task is checked exactly once
+        @param reports: Reports of shards of the same check
+        @return: Combined report, inconsistencies are listed in `errors`
+        """
+        assert reports, 'At least one report have to be provided'
+        selected_tasks = reports[0].selected_tasks
+        merged = cls(selected_tasks=selected_tasks)
+
+        for report in reports:
+            merged.errors.extend(report.errors)
+            merged.tasks.extend(report.tasks)
+            if report.selected_tasks != selected_tasks:
+                merged.errors.append(f'Shard {report.shard_index} has different selected tasks')
+
+        shard_counts = {report.shard_count for report in reports}
+        if len(shard_counts) > 1:
+            merged.errors.append(f'Reports have different shards count: {sorted(map(str, shard_counts))}')
+        shard_count = shard_counts.pop() if len(shard_counts) == 1 else None
+        if shard_count is not None:
+            shard_indexes = Counter(report.shard_index for report in reports)
+            missing_shards = [index for index in range(shard_count) if index not in shard_indexes]
+            if missing_shards:
+                merged.errors.append(f'Missing shards: {missing_shards}')
+            duplicated_shards = [index for index, count in shard_indexes.items() if count > 1]
+            if duplicated_shards:
+                merged.errors.append(f'Duplicated shards: {duplicated_shards}')
+
+        tasks_counts = Counter(task.name for task in merged.tasks)
+        not_checked = [task for task in selected_tasks if task not in tasks_counts]
+        if not_checked:
+            merged.errors.append(f'Tasks not in any shard: {not_checked}')
+        checked_many_times = [task for task, count in tasks_counts.items() if count > 1]
+        if checked_many_times:
+            merged.errors.append(f'Tasks in several shards: {checked_many_times}')
+
+        tasks_order = {task: i for i, task in enumerate(selected_tasks)}
+        merged.tasks.sort(key=lambda task: tasks_order.get(task.name, -1))
+        return merged
@@ -0,0 +1,71 @@
+"""
+Wall and CPU time of tasks testing stages
+"""
+from __future__ import annotations
+
+import resource
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+_collectors = threading.local()
+
+
+@dataclass
+class StageTiming:
+    wall: float = 0.  # seconds
+    cpu: float = 0.  # seconds, current thread and external commands finished during the stage
+    count: int = 0  # times the stage was run
+
+    def rounded(self) -> StageTiming:
+        return StageTiming(round(self.wall, 3), round(self.cpu, 3), self.count)
+
+
+def _get_cpu_time() -> float:
+    # external commands are reaped by the thread running them, however usage of children is process-wide:
+    # with several tasks in threads of one process cpu time of concurrent commands is mixed
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.thread_time() + children.ru_utime + children.ru_stime
+
+
+@contextmanager
+def collect_timings() -> Iterator[dict[str, StageTiming]]:
+    """
+    Collect timings of stages run in the current thread (other threads are not affected)
+    @return: stage name to its timing, filled in while the context is active
+    """
+    timings: dict[str, StageTiming] = {}
+    collectors: list[dict[str, StageTiming]] = getattr(_collectors, 'stack', [])
+    _collectors.stack = [*collectors, timings]
+    try:
+        yield timings
+    finally:
+        _collectors.stack = collectors
+
+
+@contextmanager
+def timed_stage(
+        stage: str,
+) -> Iterator[None]:
+    """
+    Measure the stage and add it to all active collectors of the current thread (failed stages are measured too)
+    @param stage: Stage name, e.g. `copy`, `regexp`, `build`, `lint`, `mypy`, `tests`, `cleanup`
+    """
+    collectors: list[dict[str, StageTiming]] = getattr(_collectors, 'stack', [])
+    if not collectors:
+        yield
+        return
+
+    start_wall, start_cpu = time.monotonic(), _get_cpu_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.monotonic() - start_wall, _get_cpu_time() - start_cpu
+        for timings in collectors:
+            timing = timings.setdefault(stage, StageTiming())
+            timing.wall += wall
+            timing.cpu += cpu
+            timing.count += 1
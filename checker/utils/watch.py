@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+
+
+# Files and dirs created by tools while testing, not by authors
+WATCH_IGNORE_NAMES = {'.git', '__pycache__', '.pytest_cache', '.mypy_cache', '.ruff_cache', '.DS_Store'}
+
+
+class FilesWatcher:
+    """Polling watcher of files changes in dirs
+    Compares (mtime, size) snapshots, so it works on any filesystem without extra dependencies
+    """
+
+    def __init__(
+            self,
+            dirs: list[Path],
+            poll_interval: float = 1.,
+    ) -> None:
+        """
+        @param dirs: Dirs to watch recursively (not existing ones are watched for creation)
+        @param poll_interval: Seconds between snapshots
+        """
+        self.dirs = dirs
+        self.poll_interval = poll_interval
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> dict[Path, tuple[int, int]]:
+        """
+        @return: mapping of all files in watched dirs to their (mtime, size)
+        """
+        files: dict[Path, tuple[int, int]] = {}
+        for watched_dir in self.dirs:
+            for root, dirs, filenames in os.walk(watched_dir):
+                dirs[:] = [d for d in dirs if d not in WATCH_IGNORE_NAMES]
+                for filename in filenames:
+                    if filename in WATCH_IGNORE_NAMES or filename.endswith('.pyc'):
+                        continue
+                    path = Path(root) / filename
+                    try:
+                        stat = path.stat()
+                    except FileNotFoundError:  # removed while walking
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self) -> list[Path]:
+        """
+        Take a new snapshot and compare it with the previous one
+        @return: created, modified and removed files since the previous poll
+        """
+        snapshot = self.snapshot()
+        changed = {
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return sorted(changed)
+
+    def wait_changes(self) -> list[Path]:
+        """
+        Block until files are changed; changes made in a row (e.g. editor saving several files) are collected together
+        @return: changed files
+        """
+        changed: set[Path] = set()
+        while True:
+            time.sleep(self.poll_interval)
+            new_changed = self.poll()
+            if not new_changed and changed:
+                return sorted(changed)
+            changed.update(new_changed)
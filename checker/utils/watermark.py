@@ -0,0 +1,121 @@
+"""
+State of incremental MRs grading: time of the last successful run and MRs processed by it
+Next run fetches only MRs updated after the watermark, stored in a small json file per students group
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from .print import print_info
+
+
+# MRs updated slightly before the watermark are fetched again (clocks of the runner and gitlab differ),
+# the ones processed already (same `updated_at`) are skipped
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def parse_gitlab_time(
+        value: str,
+) -> datetime:
+    """
+    @param value: Gitlab api time, e.g. `2023-01-01T12:00:00.000Z`
+    @return: timezone-aware datetime
+    """
+    time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return time if time.tzinfo else time.replace(tzinfo=timezone.utc)
+
+
+class MrsWatermark:
+    """Watermark of MRs grading of the students group"""
+
+    def __init__(
+            self,
+            path: Path,
+            group: str,
+    ) -> None:
+        """
+        @param path: State file path
+        @param group: Students group to keep the watermark of
+        """
+        self.path = path
+        self.group = group
+
+        self._state: dict[str, dict[str, str | dict[str, str]]] = {}
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            if not isinstance(state, dict):
+                raise TypeError(f'Got <{type(state).__name__}> instead of <dict>')
+            self._state = state
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, TypeError) as e:
+            print_info(f'WARNING: unable to read MRs grading state {path}, grade all MRs:', e, color='orange')
+
+    @property
+    def last_run_time(self) -> datetime | None:
+        value = self._state.get(self.group, {}).get('last_run_time')
+        return datetime.fromisoformat(value) if isinstance(value, str) else None
+
+    @property
+    def mrs(self) -> dict[str, str]:
+        """MR key (`<project id>/<iid>`) to its `updated_at` when processed"""
+        mrs = self._state.get(self.group, {}).get('mrs')
+        return mrs if isinstance(mrs, dict) else {}
+
+    def get_updated_after(self) -> datetime | None:
+        """
+        @return: time to fetch MRs updated after; None if there is no successful run yet
+        """
+        if self.last_run_time is None:
+            return None
+        return self.last_run_time - WATERMARK_OVERLAP
+
+    def is_processed(
+            self,
+            mr_key: str,
+            updated_at: str,
+    ) -> bool:
+        """
+        @param mr_key: MR key, `<project id>/<iid>`
+        @param updated_at: Current `updated_at` of the MR
+        @return: MR is not changed since it was processed
+        """
+        return self.mrs.get(mr_key) == updated_at
+
+    def update(
+            self,
+            run_time: datetime,
+            mrs: dict[str, str],
+    ) -> None:
+        """
+        Move the watermark after a successful run
+        Only MRs which can be fetched again by the next run (updated within the overlap) are kept
+        @param run_time: Time the run started (MRs updated later are fetched by the next run)
+        @param mrs: MRs processed by the run, key to `updated_at`
+        """
+        keep_after = run_time - WATERMARK_OVERLAP
+        self._state[self.group] = {
+            'last_run_time': run_time.isoformat(),
+            'mrs': {
+                mr_key: updated_at
+                for mr_key, updated_at in {**self.mrs, **mrs}.items()
+                if parse_gitlab_time(updated_at) >= keep_after
+            },
+        }
+
+    def save(self) -> None:
+        """Atomically write the state file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.path.name}.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
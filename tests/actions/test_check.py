@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import queue
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+from pytest_mock import MockFixture
+
+from checker.actions.check import _check_single_task
+from checker.executors.sandbox import Sandbox
+
+
+def test_commands_output_streamed(mocker: MockFixture, tmp_path: Path) -> None:
+    output_queue: queue.Queue[Any] = queue.Queue()
+    mocker.patch('checker.actions.check._output_queue', output_queue)
+    tester = MagicMock()
+    tester.test_task.side_effect = lambda *args, **kwargs: Sandbox()(['sh', '-c', 'echo command output']) or 1.
+    course_driver = MagicMock()
+    course_driver.root_dir = tmp_path
+
+    task = MagicMock(full_name='task')
+    report = _check_single_task(task, tester, course_driver, stream_output=True, log_dir=tmp_path)
+
+    assert report.score == 1.
+    lines = [line for kind, _, line in list(output_queue.queue) if kind == 'line']
+    assert 'command output\n' in lines
+    assert 'command output' in (tmp_path / 'task.log').read_text()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockFixture
+
+from checker.actions.grade import grade_tasks, push_scores
+from checker.exceptions import PushFailedError, RunFailedError
+from checker.utils.outbox import ReportOutbox
+from checker.utils.report import TASK_PASSED, TaskReport
+
+
+def make_task(name: str) -> MagicMock:
+    task = MagicMock(review=False)
+    task.name = name
+    return task
+
+
+class TestGradeTasks:
+
+    def test_passed_tasks_pushed_before_error(self, mocker: MockFixture) -> None:
+        tasks = [make_task('task1'), make_task('task2'), make_task('task3')]
+        report = TaskReport('task1', status=TASK_PASSED, score=1.)
+        mocker.patch('checker.actions.grade.grade_single_task', side_effect=[report, RuntimeError('boom')])
+        push_scores = mocker.patch('checker.actions.grade.push_scores')
+
+        with pytest.raises(RuntimeError, match='boom'):
+            grade_tasks(tasks, MagicMock(), MagicMock(), MagicMock(), MagicMock(), 1, datetime.now())
+
+        push_scores.assert_called_once()
+        assert push_scores.call_args.args[0] == [(tasks[0], report)]
+
+    def test_pushed_while_next_task_tested(self, mocker: MockFixture) -> None:
+        tasks = [make_task('task1'), make_task('task2'), make_task('task3')]
+        reports = [TaskReport(task.name, status=TASK_PASSED, score=1.) for task in tasks]
+        pushed = threading.Event()
+
+        def grade_single_task(task: MagicMock, *args: Any, **kwargs: Any) -> TaskReport:
+            if task is tasks[1]:
+                assert pushed.wait(timeout=5), 'score of the first task is not pushed before the next one is tested'
+            return reports[tasks.index(task)]
+
+        mocker.patch('checker.actions.grade.grade_single_task', side_effect=grade_single_task)
+        push_scores = mocker.patch('checker.actions.grade.push_scores', side_effect=lambda *_, **__: pushed.set())
+
+        assert grade_tasks(tasks, MagicMock(), MagicMock(), MagicMock(), MagicMock(), 1, datetime.now()) == reports
+
+        pushed_tasks = [task for call in push_scores.call_args_list for task, _ in call.args[0]]
+        assert pushed_tasks == tasks
+        assert push_scores.call_args_list[0].args[0] == [(tasks[0], reports[0])]
+
+    def test_push_error_does_not_hide_task_error(self, mocker: MockFixture) -> None:
+        tasks = [make_task('task1'), make_task('task2')]
+        report = TaskReport('task1', status=TASK_PASSED, score=1.)
+        mocker.patch('checker.actions.grade.grade_single_task', side_effect=[report, RunFailedError('failed')])
+        mocker.patch('checker.actions.grade.push_scores', side_effect=RuntimeError('manytask is down'))
+
+        with pytest.raises(RunFailedError):
+            grade_tasks(tasks, MagicMock(), MagicMock(), MagicMock(), MagicMock(), 1, datetime.now())
+
+
+class TestPushScores:
+
+    def test_overloaded_saved_to_outbox(self, mocker: MockFixture, tmp_path: Path) -> None:
+        manytask = mocker.patch('checker.actions.grade.get_manytask_client').return_value
+        manytask.push_reports.return_value = [PushFailedError('429: Too Many Requests', status_code=429)]
+        course_config = MagicMock(
+            manytask_url='https://test.manytask.org', solution_files_ignore=[], solution_files_max_size=None,
+        )
+        course_driver = MagicMock()
+        course_driver.get_task_solution_dir.return_value = tmp_path
+        (tmp_path / 'solution.py').write_text('print(1)')
+        task = make_task('task1')
+        task.max_score = 10
+        report = TaskReport('task1', status=TASK_PASSED, score=1.)
+
+        push_scores([(task, report)], course_config, course_driver, 1, datetime.now(), outbox_path=tmp_path / 'db')
+
+        [pending] = ReportOutbox(tmp_path / 'db').get_pending('https://test.manytask.org')
+        assert (pending.task_name, pending.score) == ('task1', 10)
+        assert report.message == 'Score is saved to the outbox'
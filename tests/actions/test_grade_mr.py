@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockFixture
+
+from checker.actions.grade_mr import _push_mrs_scores
+from checker.exceptions import PushFailedError
+from checker.utils.manytask import ScoreReport
+
+
+def make_mr_score(task_name: str, iid: int) -> tuple[ScoreReport, MagicMock, MagicMock]:
+    mr = MagicMock(project_id=1, iid=iid, updated_at='2023-01-01T12:00:00.000Z')
+    return ScoreReport(task_name, 1, 10), MagicMock(), mr
+
+
+class TestPushMrsScores:
+
+    def test_updated_at_refreshed(self, mocker: MockFixture) -> None:
+        manytask = mocker.patch('checker.actions.grade_mr.get_manytask_client').return_value
+        manytask.push_reports.return_value = [('user', 10, None, None, 1.)]
+        gitlab_connection = MagicMock()
+        refreshed_mr = gitlab_connection.gitlab.projects.get.return_value.mergerequests.get.return_value
+        refreshed_mr.updated_at = '2023-01-01T12:01:00.000Z'
+        mr_score = make_mr_score('task_1', 2)
+
+        marked_mrs = _push_mrs_scores(MagicMock(), gitlab_connection, [mr_score])
+
+        mr_score[1].notes.create.assert_called_once_with({'body': 'Score 10 set'})
+        gitlab_connection.gitlab.projects.get.assert_called_once_with(1, lazy=True)
+        assert marked_mrs == {'1/2': '2023-01-01T12:01:00.000Z'}
+
+    def test_not_pushed_not_marked(self, mocker: MockFixture) -> None:
+        manytask = mocker.patch('checker.actions.grade_mr.get_manytask_client').return_value
+        manytask.push_reports.return_value = [PushFailedError('400: Unknown task', status_code=400)]
+        mr_score = make_mr_score('unknown_task', 2)
+
+        with pytest.raises(PushFailedError):
+            _push_mrs_scores(MagicMock(), MagicMock(), [mr_score])
+        mr_score[1].notes.create.assert_not_called()
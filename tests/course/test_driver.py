@@ -178,3 +178,18 @@ class TestDriver:
     def test_get_task_dir_name(self, layout: str, raw: str, task_name: str | None) -> None:
         driver = CourseDriver(Path(''), layout=layout)
         assert driver.get_task_dir_name(raw) == task_name
+
+    @pytest.mark.parametrize('layout,locations', [
+        ('flat', ['test_task_0', 'tests/test_task_0']),
+        ('groups', ['test_group/test_task_0', 'tests/test_group/test_task_0']),
+        ('lectures', [
+            'test_group/tasks/test_task_0',
+            'test_group/tasks/test_task_0/private',
+            'test_group/tasks/test_task_0/public',
+            'test_group/tasks/test_task_0/solution',
+            'test_group/tasks/test_task_0/template',
+        ]),
+    ])
+    def test_get_task_owned_dirs(self, layout: str, locations: list[str], test_task: Task) -> None:
+        driver = CourseDriver(Path(''), repo_type='private', layout=layout)
+        assert driver.get_task_owned_dirs(test_task) == [Path('') / location for location in locations]
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from checker.course.durations import DEFAULT_SYSTEM_DURATIONS, TaskDurations, split_into_shards
+from checker.course.schedule import Group, Task
+
+
+@pytest.fixture(scope='function')
+def tasks() -> list[Task]:
+    now = datetime.now()
+    group = Group(name='group', start=now, deadline=now, second_deadline=now)
+    return [Task(group=group, name=f'task_{i}', max_score=10) for i in range(4)]
+
+
+class TestTaskDurations:
+    def test_unknown_task_estimate(self, tmp_path: Path) -> None:
+        durations = TaskDurations(tmp_path / 'durations.json', course='course', system='cpp')
+        assert durations.get('group/task') == DEFAULT_SYSTEM_DURATIONS['cpp']
+
+        durations.record('group/task_1', 1.)
+        durations.record('group/task_2', 3.)
+        durations.record('group/task_3', 5.)
+        assert durations.get('group/task') == 3.
+
+    def test_record_smoothing(self, tmp_path: Path) -> None:
+        durations = TaskDurations(tmp_path / 'durations.json', course='course', system='python', smoothing=0.5)
+        durations.record('group/task', 10.)
+        durations.record('group/task', 20.)
+        assert durations.get('group/task') == 15.
+
+    def test_save_load(self, tmp_path: Path) -> None:
+        path = tmp_path / 'cache' / 'durations.json'
+        durations = TaskDurations(path, course='course', system='python')
+        durations.record('group/task', 10.)
+        durations.save()
+
+        assert TaskDurations(path, course='course', system='python').get('group/task') == 10.
+        assert TaskDurations(path, course='other', system='python').get('group/task') == \
+            DEFAULT_SYSTEM_DURATIONS['python']
+
+    def test_broken_file(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        path = tmp_path / 'durations.json'
+        path.write_text('[1, 2')
+        durations = TaskDurations(path, course='course', system='python')
+        assert durations.get('group/task') == DEFAULT_SYSTEM_DURATIONS['python']
+        assert 'WARNING' in capsys.readouterr().err
+
+    def test_longest_first(self, tmp_path: Path, tasks: list[Task]) -> None:
+        durations = TaskDurations(tmp_path / 'durations.json', course='course', system='python')
+        for task, duration in zip(tasks, [1., 5., 3., 4.]):
+            durations.record(task.full_name, duration)
+
+        ordered = durations.sort_longest_first(tasks)
+        assert [task.name for task in ordered] == ['task_1', 'task_3', 'task_2', 'task_0']
+
+    def test_predict_makespan(self, tmp_path: Path, tasks: list[Task]) -> None:
+        durations = TaskDurations(tmp_path / 'durations.json', course='course', system='python')
+        for task, duration in zip(tasks, [1., 5., 3., 4.]):
+            durations.record(task.full_name, duration)
+
+        assert durations.predict_makespan(tasks, workers=1) == 13.
+        assert durations.predict_makespan(tasks, workers=2) == 8.
+        assert durations.predict_makespan(durations.sort_longest_first(tasks), workers=2) == 7.
+        assert durations.predict_makespan(tasks, workers=10) == 5.
+        assert durations.predict_makespan([], workers=2) == 0.
+
+
+class TestSplitIntoShards:
+    def test_round_robin(self, tasks: list[Task]) -> None:
+        shards = split_into_shards(tasks, 2)
+        assert [[task.name for task in shard] for shard in shards] == [['task_0', 'task_2'], ['task_1', 'task_3']]
+
+    def test_balanced(self, tmp_path: Path, tasks: list[Task]) -> None:
+        durations = TaskDurations(tmp_path / 'durations.json', course='course', system='python')
+        for task, duration in zip(tasks, [1., 5., 3., 4.]):
+            durations.record(task.full_name, duration)
+
+        shards = split_into_shards(tasks, 2, durations)
+        assert [[task.name for task in shard] for shard in shards] == [['task_0', 'task_1'], ['task_2', 'task_3']]
+
+    def test_all_tasks_once(self, tasks: list[Task]) -> None:
+        for shard_count in range(1, 6):
+            shards = split_into_shards(tasks, shard_count)
+            assert len(shards) == shard_count
+            assert sorted(task.name for shard in shards for task in shard) == [task.name for task in tasks]
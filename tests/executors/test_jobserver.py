@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from checker.executors import jobserver as jobserver_module
+from checker.executors.jobserver import JobServer
+from checker.executors.sandbox import Sandbox
+
+
+class TestJobServer:
+    def test_acquire_release(self) -> None:
+        with JobServer(2) as jobserver:
+            tokens = [jobserver.acquire(), jobserver.acquire()]
+            assert tokens == [JobServer.TOKEN] * 2
+            for token in tokens:
+                jobserver.release(token)
+            with jobserver.slot():
+                pass
+
+    def test_limit(self) -> None:
+        active = 0
+        max_active = 0
+        lock = threading.Lock()
+
+        def job(jobserver: JobServer) -> None:
+            nonlocal active, max_active
+            with jobserver.slot():
+                with lock:
+                    active += 1
+                    max_active = max(max_active, active)
+                time.sleep(0.02)
+                with lock:
+                    active -= 1
+
+        with JobServer(2) as jobserver:
+            threads = [threading.Thread(target=job, args=(jobserver,)) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert max_active == 2
+
+    def test_env(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(jobserver_module, 'get_make_version', lambda: (4, 4, 1))
+        with JobServer(3) as jobserver:
+            makeflags = jobserver.env()['MAKEFLAGS']
+            assert ' -j' not in makeflags
+            assert f'--jobserver-auth=fifo:{jobserver.fifo_path}' in makeflags
+
+    def test_env_old_make(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(jobserver_module, 'get_make_version', lambda: (4, 3))
+        with JobServer(3) as jobserver:
+            makeflags = jobserver.env()['MAKEFLAGS']
+            assert ' -j' not in makeflags
+            fd = jobserver._get_fd()
+            assert f'--jobserver-auth={fd},{fd}' in makeflags
+            assert os.get_inheritable(fd)
+
+        monkeypatch.setattr(jobserver_module, 'get_make_version', lambda: (4, 1))
+        with JobServer(3) as jobserver:
+            fd = jobserver._get_fd()
+            assert f'--jobserver-fds={fd},{fd}' in jobserver.env()['MAKEFLAGS']
+
+    def test_close(self) -> None:
+        jobserver = JobServer(1)
+        fifo_path = jobserver.fifo_path
+        assert fifo_path.exists()
+        jobserver.close()
+        assert not fifo_path.exists()
+
+    def test_pickle(self) -> None:
+        with JobServer(1) as jobserver:
+            unpickled_jobserver = pickle.loads(pickle.dumps(jobserver))
+            with unpickled_jobserver.slot():
+                pass
+            unpickled_jobserver.close()
+            assert jobserver.fifo_path.exists()  # removed by the original one only
+
+
+class TestSandboxJobServer:
+    def test_makeflags_passed(self) -> None:
+        with JobServer(1) as jobserver:
+            sandbox = Sandbox(jobserver=jobserver)
+            makeflags = jobserver.env()['MAKEFLAGS'].strip()
+            output = sandbox(['sh', '-c', 'echo $MAKEFLAGS'], capture_output=True)
+            assert output is not None and makeflags in output
+
+            output = sandbox(['sh', '-c', 'echo $MAKEFLAGS'], env_sandbox=True, capture_output=True)
+            assert output is not None and makeflags in output
+
+    def test_token_returned(self) -> None:
+        with JobServer(1) as jobserver:
+            sandbox = Sandbox(jobserver=jobserver)
+            sandbox('true')
+            sandbox(['sh', '-c', 'exit 1'], check=False)
+            with jobserver.slot():
+                assert 'MAKEFLAGS' not in os.environ
+
+    def test_make_runs(self, tmp_path: Path) -> None:
+        if jobserver_module.get_make_version() is None:
+            pytest.skip('make is not installed')
+        makefile = tmp_path / 'Makefile'
+        makefile.write_text('all: a b\na:\n\t@echo a\nb:\n\t@echo b\n')
+        with JobServer(2) as jobserver:
+            sandbox = Sandbox(jobserver=jobserver)
+            output = sandbox(['make', '-B', '-C', str(tmp_path)], capture_output=True)
+            assert output is not None and 'jobserver' not in output
+            tokens = [jobserver.acquire(), jobserver.acquire()]  # all tokens are returned by make
+            assert tokens == [JobServer.TOKEN] * 2
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import os
 import sys
+import threading
+import time
 from pathlib import Path
 
 import pytest
@@ -186,3 +188,35 @@ class TestSandbox:
 
         assert output in exc_info.value.output
         assert 'exceeded time limit' in exc_info.value.output
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'), reason='procfs is required')
+    def test_timeout_kills_process_tree(self, tmp_path: Path) -> None:
+        sandbox = Sandbox()
+
+        pid_file = tmp_path / 'pid'
+        with pytest.raises(ExecutionFailedError):
+            sandbox(f'sleep 10 & echo $! > {pid_file}; wait', timeout=0.2, shell=True)
+
+        time.sleep(0.1)
+        child_status = Path(f'/proc/{int(pid_file.read_text())}/status')
+        # killed orphan can be left as zombie if init does not reap it
+        assert not child_status.exists() or 'zombie' in child_status.read_text()
+
+    def test_terminate_all(self) -> None:
+        sandbox = Sandbox()
+
+        timer = threading.Timer(0.2, Sandbox.terminate_all)
+        timer.start()
+        start_time = time.monotonic()
+        try:
+            with pytest.raises(ExecutionFailedError):
+                sandbox('sleep 10 & sleep 10; wait', shell=True)
+            assert time.monotonic() - start_time < 5
+
+            # new commands fail until reset
+            with pytest.raises(ExecutionFailedError):
+                sandbox('true', shell=True)
+        finally:
+            timer.join()
+            Sandbox.reset_terminated()
+        sandbox('true', shell=True)
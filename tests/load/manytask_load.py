@@ -0,0 +1,218 @@
+"""
+Load-test harness of the manytask client: many grading jobs pushing scores at the same time, as at a deadline peak
+Runs against the local stand-in (default) or a real manytask, reports throughput and latency percentiles
+
+    python tests/load/manytask_load.py --jobs 100 --reports 5 --mode batch --latency 0.05 --error-rate 0.1
+"""
+from __future__ import annotations
+
+import datetime
+import io
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import click
+import requests
+from manytask_stub import StubConfig, StubManytask
+
+from checker.exceptions import PushFailedError
+from checker.utils import SOLUTION_ARCHIVE_NAME, ManytaskClient, ReportOutbox, ScoreReport, flush_outbox
+
+
+MODES = ('report', 'score', 'batch', 'outbox')
+
+
+@dataclass
+class LoadResult:
+    mode: str
+    jobs: int
+    calls: int = 0  # client calls (a batch is one call)
+    reports: int = 0  # reports delivered (or scores got)
+    failed: int = 0  # reports not delivered (rejected or manytask unavailable)
+    saved: int = 0  # reports saved to the outbox and delivered by the flush
+    requests: int = 0  # http requests, including retries
+    request_errors: int = 0
+    wall: float = 0.  # seconds
+    latencies: list[float] = field(default_factory=list)  # seconds, each client call including retries
+
+    @property
+    def throughput(self) -> float:
+        return self.reports / self.wall if self.wall else 0.
+
+    def get_percentile(self, percentile: float) -> float:
+        if not self.latencies:
+            return 0.
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method='inclusive')[int(percentile) - 1]
+
+    def format(self) -> str:
+        return '\n'.join([
+            f'mode={self.mode} jobs={self.jobs} wall={self.wall:.2f}s',
+            f'calls={self.calls} reports={self.reports} failed={self.failed} saved={self.saved}',
+            f'requests={self.requests} request_errors={self.request_errors}',
+            f'throughput={self.throughput:.1f} reports/s',
+            'latency p50={:.3f}s p95={:.3f}s p99={:.3f}s max={:.3f}s'.format(
+                self.get_percentile(50), self.get_percentile(95), self.get_percentile(99),
+                max(self.latencies, default=0.),
+            ),
+        ])
+
+
+def run_load(
+        base_url: str,
+        token: str,
+        mode: str = 'report',
+        jobs: int = 10,
+        reports: int = 1,
+        file_size: int = 4 * 1024,
+        retries: int = 3,
+        backoff_base: float = 1.,
+) -> LoadResult:
+    """
+    Run `jobs` concurrent grading jobs, each with its own client (as separate CI jobs have), pushing `reports` scores
+    @param base_url: Manytask url
+    @param token: Tester token
+    @param mode: `report` - push one by one, `score` - get scores, `batch` - push all scores of the job at once,
+        `outbox` - push one by one saving failed to the outbox, flushed after all jobs are done
+    @param jobs: Number of concurrent jobs
+    @param reports: Number of reports of each job
+    @param file_size: Size of the solution archive pushed with each score, bytes
+    @param retries: Client retries
+    @param backoff_base: Client backoff base, seconds
+    @return: aggregated result
+    """
+    assert mode in MODES, f'Unknown mode {mode}'
+    result = LoadResult(mode, jobs)
+    lock = threading.Lock()
+    send_time = datetime.datetime.now(datetime.timezone.utc)
+    archive = b'\0' * file_size
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outbox = ReportOutbox(Path(tmp_dir) / 'outbox.db')
+
+        def run_job(job_index: int) -> None:
+            client = ManytaskClient(base_url, token, retries=retries, backoff_base=backoff_base)
+            score_reports = [
+                ScoreReport(
+                    f'task_{index}',
+                    job_index,
+                    index,
+                    files={SOLUTION_ARCHIVE_NAME: (SOLUTION_ARCHIVE_NAME, io.BytesIO(archive))},
+                    send_time=send_time,
+                )
+                for index in range(reports)
+            ]
+            latencies, delivered, failed = [], 0, 0
+            calls = [[report] for report in score_reports] if mode != 'batch' else [score_reports]
+            for call_reports in calls:
+                start_time = time.monotonic()
+                if mode == 'batch':
+                    results = client.push_reports(call_reports)
+                    delivered += sum(not isinstance(r, Exception) for r in results)
+                    failed += sum(isinstance(r, Exception) for r in results)
+                else:
+                    [report] = call_reports
+                    try:
+                        if mode == 'score':
+                            client.get_score(report.task_name, report.user_id)
+                        else:
+                            client.push_report(
+                                report.task_name, report.user_id, report.score,
+                                files=report.files, send_time=report.send_time,
+                            )
+                        delivered += 1
+                    except PushFailedError:
+                        failed += 1
+                    except requests.RequestException:
+                        if mode == 'outbox':
+                            outbox.put(base_url, report.task_name, report.user_id, report.score,
+                                       send_time=report.send_time, files=archive)
+                        else:
+                            failed += 1
+                latencies.append(time.monotonic() - start_time)
+            client.close()
+
+            with lock:
+                result.calls += len(calls)
+                result.reports += delivered
+                result.failed += failed
+                result.latencies.extend(latencies)
+                for stats in client.stats.values():
+                    result.requests += stats.count
+                    result.request_errors += stats.errors
+
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(run_job, range(jobs)))
+        result.wall = time.monotonic() - start_time
+
+        if mode == 'outbox':
+            client = ManytaskClient(base_url, token, retries=retries, backoff_base=backoff_base)
+            for _ in range(retries):
+                pushed, left = flush_outbox(outbox, client)
+                result.saved += pushed
+                if not left:
+                    break
+            result.failed += len(outbox.get_pending(base_url))
+            client.close()
+    return result
+
+
+@click.command()
+@click.option('--url', default=None, help='Manytask url (default: local stand-in)')
+@click.option('--token', default='test_token', show_default=True, help='Tester token')
+@click.option('--mode', type=click.Choice(MODES), default='report', show_default=True)
+@click.option('--jobs', type=int, default=50, show_default=True, help='Concurrent grading jobs')
+@click.option('--reports', type=int, default=3, show_default=True, help='Reports per job')
+@click.option('--file-size', type=int, default=4 * 1024, show_default=True, help='Solution archive size, bytes')
+@click.option('--latency', type=float, default=0.05, show_default=True, help='Stand-in latency, seconds')
+@click.option('--latency-jitter', type=float, default=0.05, show_default=True, help='Stand-in latency jitter, seconds')
+@click.option('--error-rate', type=float, default=0., show_default=True, help='Stand-in share of 503 responses')
+@click.option('--throttle-rps', type=float, default=None, help='Stand-in rate limit (429 over it)')
+@click.option('--no-batch', is_flag=True, help='Stand-in does not support batch requests')
+@click.option('--retries', type=int, default=3, show_default=True, help='Client retries')
+@click.option('--backoff-base', type=float, default=1., show_default=True, help='Client backoff base, seconds')
+def main(
+        url: str | None,
+        token: str,
+        mode: str,
+        jobs: int,
+        reports: int,
+        file_size: int,
+        latency: float,
+        latency_jitter: float,
+        error_rate: float,
+        throttle_rps: float | None,
+        no_batch: bool,
+        retries: int,
+        backoff_base: float,
+) -> None:
+    """Load-test the manytask client"""
+    kwargs = dict(
+        mode=mode, jobs=jobs, reports=reports, file_size=file_size, retries=retries, backoff_base=backoff_base,
+    )
+    if url:
+        print(run_load(url, token, **kwargs).format())  # type: ignore[arg-type]
+        return
+
+    config = StubConfig(
+        latency=latency,
+        latency_jitter=latency_jitter,
+        error_rate=error_rate,
+        throttle_rps=throttle_rps,
+        batch=not no_batch,
+        tokens={token},
+    )
+    with StubManytask(config).run() as stub:
+        print(run_load(stub.url, token, **kwargs).format())  # type: ignore[arg-type]
+        print(f'stand-in: requests={stub.stats.requests} statuses={stub.stats.statuses}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Local stand-in of manytask api to test and load-test the client offline
+Implements `/api/report`, `/api/reports` (batch, optional) and `/api/score`
+with configurable latency, errors and throttling
+"""
+from __future__ import annotations
+
+import email
+import json
+import math
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.  # seconds, each request
+    latency_jitter: float = 0.  # seconds, uniformly random extra latency
+    error_rate: float = 0.  # share of requests failed with 503
+    throttle_rps: float | None = None  # requests per second over which 429 is returned
+    throttle_burst: int = 10
+    retry_after: float | None = None  # `Retry-After` of 429 and 503 responses, seconds
+    batch: bool = True  # `/api/reports` is supported
+    tokens: set[str] = field(default_factory=lambda: {'test_token'})
+
+
+@dataclass
+class StubStats:
+    requests: dict[str, int] = field(default_factory=dict)  # path to number of requests
+    statuses: dict[int, int] = field(default_factory=dict)
+    reports: int = 0  # reports accepted, including duplicates
+
+
+def _parse_form(
+        content_type: str,
+        body: bytes,
+) -> tuple[dict[str, str], dict[str, bytes]]:
+    # form fields and files of urlencoded or multipart body
+    if not content_type.startswith('multipart/'):
+        return {key: values[-1] for key, values in parse_qs(body.decode()).items()}, {}
+    message = email.message_from_bytes(f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+    fields: dict[str, str] = {}
+    files: dict[str, bytes] = {}
+    for part in message.get_payload():
+        name = str(part.get_param('name', header='content-disposition'))
+        payload = part.get_payload(decode=True)
+        if part.get_filename() is not None:
+            files[name] = payload
+        else:
+            fields[name] = payload.decode()
+    return fields, files
+
+
+class StubManytask:
+    """Manytask stand-in served by a threaded http server in a background thread"""
+
+    def __init__(
+            self,
+            config: StubConfig | None = None,
+    ) -> None:
+        self.config = config or StubConfig()
+        self.stats = StubStats()
+        self.scores: dict[tuple[str, int], float] = {}  # (task, user id) to the last score
+        self.files: dict[tuple[str, int], dict[str, bytes]] = {}
+        self._lock = threading.Lock()
+        self._tokens = float(self.config.throttle_burst)
+        self._tokens_updated_at = time.monotonic()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, 'Server is not started'
+        host, port = self._server.server_address[:2]
+        return f'http://{host!s}:{port}'
+
+    @contextmanager
+    def run(self) -> Iterator[StubManytask]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self) -> None:
+                stub._handle(self)
+
+            def do_POST(self) -> None:
+                stub._handle(self)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+            thread.join()
+
+    def _is_throttled(self) -> bool:
+        if self.config.throttle_rps is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.config.throttle_burst),
+                self._tokens + (now - self._tokens_updated_at) * self.config.throttle_rps,
+            )
+            self._tokens_updated_at = now
+            if self._tokens < 1:
+                return True
+            self._tokens -= 1
+            return False
+
+    def _handle(
+            self,
+            handler: BaseHTTPRequestHandler,
+    ) -> None:
+        body = handler.rfile.read(int(handler.headers.get('Content-Length', 0)))
+        path = handler.path.split('?')[0]
+        with self._lock:
+            self.stats.requests[path] = self.stats.requests.get(path, 0) + 1
+
+        time.sleep(self.config.latency + random.uniform(0, self.config.latency_jitter))
+
+        status, headers = 200, {}
+        data: dict[str, Any] = {}
+        if self._is_throttled():
+            status, data = 429, {'error': 'Too many requests'}
+            retry_after = self.config.retry_after or math.ceil(1 / (self.config.throttle_rps or 1))
+            headers['Retry-After'] = str(retry_after)
+        elif random.random() < self.config.error_rate:
+            status, data = 503, {'error': 'Service unavailable'}
+            if self.config.retry_after is not None:
+                headers['Retry-After'] = str(self.config.retry_after)
+        else:
+            fields, files = _parse_form(handler.headers.get('Content-Type', ''), body)
+            if fields.get('token') not in self.config.tokens:
+                status, data = 403, {'error': 'Wrong token'}
+            elif path == '/api/report' and handler.command == 'POST':
+                status, data = self._put_report(fields, files)
+            elif path == '/api/reports' and handler.command == 'POST' and self.config.batch:
+                reports = json.loads(fields['reports'])
+                results = []
+                for index, report in enumerate(reports):
+                    report_files = {
+                        name.split('/', 1)[1]: content
+                        for name, content in files.items() if name.startswith(f'{index}/')
+                    }
+                    report_status, result = self._put_report({k: str(v) for k, v in report.items()}, report_files)
+                    results.append(result if report_status == 200 else {**result, 'status': report_status})
+                data = {'results': results}
+            elif path == '/api/score' and handler.command == 'GET':
+                data = {'score': self.scores.get((fields.get('task', ''), int(fields.get('user_id', 0))))}
+            else:
+                status, data = 404, {'error': 'Not found'}
+
+        with self._lock:
+            self.stats.statuses[status] = self.stats.statuses.get(status, 0) + 1
+        content = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def _put_report(
+            self,
+            fields: dict[str, str],
+            files: dict[str, bytes],
+    ) -> tuple[int, dict[str, Any]]:
+        try:
+            task, user_id, score = fields['task'], int(fields['user_id']), float(fields['score'])
+        except (KeyError, ValueError):
+            return 400, {'error': 'Bad request'}
+        if task.startswith('unknown'):
+            return 400, {'error': f'Unknown task {task}'}
+
+        with self._lock:
+            self.scores[(task, user_id)] = score
+            self.files[(task, user_id)] = files
+            self.stats.reports += 1
+        commit_time = fields.get('commit_time')
+        return 200, {
+            'username': f'user{user_id}',
+            'score': score,
+            'commit_time': commit_time,
+            'submit_time': commit_time,
+            'demand_multiplier': 1,
+        }
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import io
+import time
+from collections.abc import Iterator
+
+import pytest
+import requests
+from manytask_load import run_load
+from manytask_stub import StubConfig, StubManytask
+
+from checker.exceptions import PushFailedError
+from checker.utils import ManytaskClient, ScoreReport
+
+
+TESTER_TOKEN = 'test_token'
+
+
+@pytest.fixture
+def stub() -> Iterator[StubManytask]:
+    with StubManytask().run() as stub:
+        yield stub
+
+
+class TestStubManytask:
+
+    def test_report_and_score(self, stub: StubManytask) -> None:
+        client = ManytaskClient(stub.url, TESTER_TOKEN)
+        files = {'solution.tar.gz': ('solution.tar.gz', io.BytesIO(b'archive'))}
+
+        username, score, _, _, _ = client.push_report('task_1', 1, 10., files=files)
+
+        assert (username, score) == ('user1', 10.)
+        assert client.get_score('task_1', 1) == 10.
+        assert client.get_score('task_2', 1) is None
+        assert stub.files[('task_1', 1)] == {'solution.tar.gz': b'archive'}
+
+    def test_wrong_token_and_task(self, stub: StubManytask) -> None:
+        with pytest.raises(PushFailedError):
+            ManytaskClient(stub.url, 'wrong_token').push_report('task_1', 1, 10.)
+        with pytest.raises(PushFailedError):
+            ManytaskClient(stub.url, TESTER_TOKEN).push_report('unknown_task', 1, 10.)
+
+    def test_batch(self, stub: StubManytask) -> None:
+        client = ManytaskClient(stub.url, TESTER_TOKEN)
+        reports = [
+            ScoreReport('task_1', 1, 10., files={'solution.tar.gz': ('solution.tar.gz', io.BytesIO(b'first'))}),
+            ScoreReport('unknown_task', 1, 10.),
+            ScoreReport('task_1', 2, 20., files={'solution.tar.gz': ('solution.tar.gz', io.BytesIO(b'second'))}),
+        ]
+
+        first, second, third = client.push_reports(reports)
+
+        assert not isinstance(first, Exception) and not isinstance(third, Exception)
+        assert isinstance(second, PushFailedError)
+        assert stub.stats.requests == {'/api/reports': 2}  # batches support probe and the batch
+        assert stub.scores == {('task_1', 1): 10., ('task_1', 2): 20.}
+        assert stub.files[('task_1', 2)] == {'solution.tar.gz': b'second'}
+
+    def test_batch_not_supported(self) -> None:
+        with StubManytask(StubConfig(batch=False)).run() as stub:
+            client = ManytaskClient(stub.url, TESTER_TOKEN)
+            results = client.push_reports([ScoreReport('task_1', 1, 10.), ScoreReport('task_2', 1, 20.)])
+
+        assert not any(isinstance(result, Exception) for result in results)
+        assert stub.stats.requests == {'/api/reports': 1, '/api/report': 2}
+
+    def test_errors_retried(self) -> None:
+        with StubManytask(StubConfig(error_rate=1., retry_after=0.01)).run() as stub:
+            client = ManytaskClient(stub.url, TESTER_TOKEN, retries=3)
+            with pytest.raises(requests.HTTPError):
+                client.push_report('task_1', 1, 10.)
+        assert stub.stats.statuses == {503: 3}
+
+    def test_throttling(self) -> None:
+        with StubManytask(StubConfig(throttle_rps=20., throttle_burst=1, retry_after=0.05)).run() as stub:
+            client = ManytaskClient(stub.url, TESTER_TOKEN, retries=10)
+            start_time = time.monotonic()
+            for i in range(5):
+                client.push_report(f'task_{i}', 1, 10.)
+            elapsed = time.monotonic() - start_time
+
+        assert stub.stats.reports == 5
+        assert stub.stats.statuses.get(429, 0) > 0
+        assert elapsed >= 4 / 20 * 0.9
+
+
+class TestLoad:
+
+    @pytest.mark.parametrize('mode', ['report', 'score', 'batch', 'outbox'])
+    def test_modes(self, stub: StubManytask, mode: str) -> None:
+        result = run_load(stub.url, TESTER_TOKEN, mode=mode, jobs=4, reports=3)
+
+        assert result.reports == 12
+        assert result.failed == 0
+        assert result.calls == (4 if mode == 'batch' else 12)
+        assert len(result.latencies) == result.calls
+        assert result.throughput > 0
+        assert 'p99=' in result.format()
+
+    def test_outbox_no_reports_lost(self) -> None:
+        config = StubConfig(error_rate=0.5, retry_after=0.)
+        with StubManytask(config).run() as stub:
+            result = run_load(stub.url, TESTER_TOKEN, mode='outbox', jobs=4, reports=5, retries=1, backoff_base=0.)
+            assert result.reports + result.saved + result.failed == 20
+
+        assert len(stub.scores) == result.reports + result.saved
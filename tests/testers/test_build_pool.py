@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import pickle
+from pathlib import Path
+
+from checker.testers.build_pool import BuildDirPool
+
+
+class TestBuildDirPool:
+    def test_acquire_empty_pool(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=0)
+        build_dir = pool.acquire()
+
+        assert build_dir.exists() and build_dir.is_dir()
+        assert build_dir.parent == tmp_path
+        assert build_dir.stat().st_mode & 0o777 == 0o777
+
+    def test_acquire_unique(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=2)
+        pool.fill()
+        build_dirs = {pool.acquire() for _ in range(4)}
+        assert len(build_dirs) == 4
+        assert not list(tmp_path.glob(f'{BuildDirPool.FREE_PREFIX}*'))
+
+    def test_fill(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=3)
+        pool.fill()
+        assert len(list(tmp_path.glob(f'{BuildDirPool.FREE_PREFIX}*'))) == 3
+
+        build_dir = pool.acquire()
+        assert build_dir.name.startswith(BuildDirPool.BUILD_PREFIX)
+        assert len(list(tmp_path.glob(f'{BuildDirPool.FREE_PREFIX}*'))) == 2
+
+    def test_release_background(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=1)
+        build_dir = pool.acquire()
+        (build_dir / 'inner').mkdir()
+        (build_dir / 'inner' / 'file.txt').write_text('123')
+
+        pool.release(build_dir)
+        pool.wait()
+
+        assert not build_dir.exists()
+        assert not list(tmp_path.glob(f'{BuildDirPool.TRASH_PREFIX}*'))
+        assert len(list(tmp_path.glob(f'{BuildDirPool.FREE_PREFIX}*'))) == 1
+
+    def test_release_foreground(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=0, background_cleanup=False)
+        build_dir = pool.acquire()
+        (build_dir / 'file.txt').write_text('123')
+
+        pool.release(build_dir)
+        assert not list(tmp_path.iterdir())
+
+    def test_remove_left_trash(self, tmp_path: Path) -> None:
+        (tmp_path / f'{BuildDirPool.TRASH_PREFIX}left').mkdir()
+        pool = BuildDirPool(tmp_path, size=0)
+
+        pool.release(pool.acquire())
+        pool.wait()
+        assert not list(tmp_path.iterdir())
+
+    def test_pickle(self, tmp_path: Path) -> None:
+        pool = BuildDirPool(tmp_path, size=0)
+        pool.release(pool.acquire())
+        pool.wait()
+
+        unpickled_pool = pickle.loads(pickle.dumps(pool))
+        unpickled_pool.release(unpickled_pool.acquire())
+        unpickled_pool.wait()
+        assert not list(tmp_path.iterdir())
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from checker.exceptions import TestsFailedError
+from checker.testers.cache import CachedResult, ResultCache
+from checker.testers.tester import Tester
+from checker.utils.print import print_info
+
+
+def fill_task(path: Path, files: dict[str, str]) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    for filename, content in files.items():
+        (path / filename).write_text(content)
+    return path
+
+
+class CountingTester(Tester):
+    @dataclass
+    class TaskTestConfig(Tester.TaskTestConfig):
+        fail: bool = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.runs = 0
+
+    def _gen_build(self, test_config, build_dir, source_dir, *args, **kwargs) -> None:
+        self.runs += 1
+        print_info('Building...')
+
+    def _run_tests(self, test_config, build_dir, *args, **kwargs) -> float:
+        self._executor(['sh', '-c', 'echo tests output'], sandbox=True)
+        if test_config.fail:
+            raise TestsFailedError('Tests error')
+        return 0.5
+
+
+class TestResultCacheKey:
+    def test_same_inputs_same_key(self, tmp_path: Path) -> None:
+        task = fill_task(tmp_path / 'task', {'solution.py': 'a = 1', 'test_public.py': 'pass'})
+        key_1 = ResultCache.compute_key('tester', task, task, task, None, tmp_path)
+        key_2 = ResultCache.compute_key('tester', task, task, task, None, tmp_path)
+        assert key_1 == key_2
+
+    def test_changed_inputs_changed_key(self, tmp_path: Path) -> None:
+        task = fill_task(tmp_path / 'task', {'solution.py': 'a = 1'})
+        tests = fill_task(tmp_path / 'tests', {'test_private.py': 'pass'})
+        key = ResultCache.compute_key('tester', task, tests, None, tests, tmp_path)
+
+        assert key != ResultCache.compute_key('other_tester', task, tests, None, tests, tmp_path)
+        assert key != ResultCache.compute_key('tester', task, tests, None, tests, tmp_path, normalize_output=True)
+        assert key != ResultCache.compute_key('tester', task, tests, None, tests, tmp_path, verbose=True)
+
+        (task / 'solution.py').write_text('a = 2')
+        changed_solution_key = ResultCache.compute_key('tester', task, tests, None, tests, tmp_path)
+        assert key != changed_solution_key
+
+        (tests / '.tester.json').write_text('{}')
+        changed_config_key = ResultCache.compute_key('tester', task, tests, None, tests, tmp_path)
+        assert changed_solution_key != changed_config_key
+
+        # shared files of the course (e.g. common library) are built with the task
+        fill_task(tmp_path / 'common', {'CMakeLists.txt': 'add_library(common common.cpp)'})
+        assert changed_config_key != ResultCache.compute_key('tester', task, tests, None, tests, tmp_path)
+
+    def test_ignore_caches_in_key(self, tmp_path: Path) -> None:
+        task = fill_task(tmp_path / 'task', {'solution.py': 'a = 1'})
+        key = ResultCache.compute_key('tester', task, task, None, None, tmp_path)
+        fill_task(task / '__pycache__', {'solution.pyc': 'binary'})
+        assert key == ResultCache.compute_key('tester', task, task, None, None, tmp_path)
+
+    def test_saved_manifests_key(self, tmp_path: Path) -> None:
+        root = tmp_path / 'course'
+        task = fill_task(root / 'task', {'solution.py': 'a = 1'})
+        manifests_dir = tmp_path / 'cache' / 'manifests'
+        key = ResultCache.compute_key('tester', task, task, None, None, root)
+        assert key == ResultCache.compute_key('tester', task, task, None, None, root, manifests_dir=manifests_dir)
+        assert len(list(manifests_dir.iterdir())) == 2  # task and course root
+        assert key == ResultCache.compute_key('tester', task, task, None, None, root, manifests_dir=manifests_dir)
+
+        (task / 'solution.py').write_text('a = 2')
+        changed_key = ResultCache.compute_key('tester', task, task, None, None, root, manifests_dir=manifests_dir)
+        assert changed_key != key
+        assert changed_key == ResultCache.compute_key('tester', task, task, None, None, root)
+
+    def test_cache_inside_root_ignored(self, tmp_path: Path) -> None:
+        task = fill_task(tmp_path / 'task', {'solution.py': 'a = 1'})
+        manifests_dir = tmp_path / '.checker_cache' / 'manifests'
+        key = ResultCache.compute_key('tester', task, task, None, None, tmp_path, manifests_dir=manifests_dir)
+        assert key == ResultCache.compute_key('tester', task, task, None, None, tmp_path, manifests_dir=manifests_dir)
+
+
+class TestResultCache:
+    def test_get_missing(self, tmp_path: Path) -> None:
+        cache = ResultCache(tmp_path)
+        assert cache.get('0' * 64) is None
+
+    def test_put_get(self, tmp_path: Path) -> None:
+        cache = ResultCache(tmp_path)
+        cache.put('a' * 64, CachedResult(score=0.5, log='some log'))
+        assert cache.get('a' * 64) == CachedResult(score=0.5, log='some log')
+
+    def test_lru_eviction(self, tmp_path: Path) -> None:
+        cache = ResultCache(tmp_path, max_size=10 ** 6)
+        for i, key in enumerate(['a' * 64, 'b' * 64, 'c' * 64]):
+            cache.put(key, CachedResult(score=1.0, log='x' * 1000))
+            os.utime(cache._entry_path(key), (i, i))
+        cache.get('a' * 64)  # recently used
+
+        cache.max_size = 2500
+        cache.evict()
+
+        assert cache.get('a' * 64) is not None
+        assert cache.get('b' * 64) is None
+        assert cache.get('c' * 64) is not None
+
+
+class TestTesterCache:
+    @pytest.fixture(scope='function')
+    def task_dir(self, tmp_path: Path) -> Path:
+        return fill_task(tmp_path / 'task', {'solution.py': 'a = 1'})
+
+    def test_no_cache_dir(self, task_dir: Path) -> None:
+        tester = CountingTester()
+        for _ in range(2):
+            assert tester.test_task(task_dir, task_dir, task_dir, None, task_dir) == 0.5
+        assert tester.runs == 2
+
+    def test_cached_result(self, tmp_path: Path, task_dir: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        tester = CountingTester(cache_dir=tmp_path / 'cache')
+        for _ in range(2):
+            assert tester.test_task(task_dir, task_dir, task_dir, None, task_dir) == 0.5
+        assert tester.runs == 1
+
+        captured = capsys.readouterr()
+        assert 'cached result' in captured.err
+        assert captured.err.count('Building...') == 2
+        assert captured.err.count('tests output') == 2  # commands output is replayed too
+
+        (task_dir / 'solution.py').write_text('a = 2')
+        tester.test_task(task_dir, task_dir, task_dir, None, task_dir)
+        assert tester.runs == 2
+
+    def test_no_cache_for_verbose(self, tmp_path: Path, task_dir: Path) -> None:
+        tester = CountingTester(cache_dir=tmp_path / 'cache')
+        for _ in range(2):
+            tester.test_task(task_dir, task_dir, task_dir, None, task_dir, verbose=True)
+        assert tester.runs == 2
+
+        tester = CountingTester(cache_dir=tmp_path / 'cache', use_cache=True)
+        for _ in range(2):
+            tester.test_task(task_dir, task_dir, task_dir, None, task_dir, verbose=True)
+        assert tester.runs == 1
+
+        # verbose log is not replayed to non-verbose runs
+        tester.test_task(task_dir, task_dir, task_dir, None, task_dir)
+        assert tester.runs == 2
+
+    def test_bypass_cache(self, tmp_path: Path, task_dir: Path) -> None:
+        tester = CountingTester(cache_dir=tmp_path / 'cache')
+        tester.test_task(task_dir, task_dir, task_dir, None, task_dir)
+        tester.test_task(task_dir, task_dir, task_dir, None, task_dir, use_cache=False)
+        assert tester.runs == 2
+
+    def test_failures_not_cached(self, tmp_path: Path, task_dir: Path) -> None:
+        (task_dir / '.tester.json').write_text('{"fail": true}')
+        tester = CountingTester(cache_dir=tmp_path / 'cache')
+        for _ in range(2):
+            with pytest.raises(TestsFailedError):
+                tester.test_task(task_dir, task_dir, task_dir, None, task_dir)
+        assert tester.runs == 2
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import pytest
+
+from checker.exceptions import TestsFailedError
+from checker.testers.pipeline import TaskPipeline, run_jobs_in_processes
+from checker.testers.tester import Tester
+from checker.utils.print import print_info
+
+
+class SleepingTester(Tester):
+    @dataclass
+    class TaskTestConfig(Tester.TaskTestConfig):
+        fail: bool = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.active = {'build': 0, 'test': 0}
+        self.max_active = {'build': 0, 'test': 0}
+        self.stage_time = {'build': 0.05, 'test': 0.05}
+
+    def _enter(self, stage: str) -> None:
+        with self._lock:
+            self.active[stage] += 1
+            self.max_active[stage] = max(self.max_active[stage], self.active[stage])
+        time.sleep(self.stage_time[stage])
+        with self._lock:
+            self.active[stage] -= 1
+
+    def _gen_build(self, test_config, build_dir, source_dir, *args, **kwargs) -> None:
+        print_info(f'Building {source_dir.name}')
+        self._enter('build')
+
+    def _run_tests(self, test_config, build_dir, *args, **kwargs) -> float:
+        self._enter('test')
+        if test_config.fail:
+            raise TestsFailedError('Tests error')
+        return 1.
+
+
+def make_tasks(root: Path, count: int) -> list[Path]:
+    tasks = []
+    for i in range(count):
+        task_dir = root / f'task_{i}'
+        task_dir.mkdir()
+        tasks.append(task_dir)
+    return tasks
+
+
+class TestTaskPipeline:
+    def test_results_order(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 4)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = list(TaskPipeline(tester, build_jobs=2, test_jobs=2).run(jobs))
+
+        assert [result.result for result in results] == [1.] * 4
+        assert all(result.error is None for result in results)
+        assert [result.output for result in results] == [f'Building {task.name}\n' for task in tasks]
+        assert 'Building' not in capsys.readouterr().err
+
+    def test_stage_concurrency(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tester.stage_time['test'] = 0.2  # so builds queue up tasks for testing
+        tasks = make_tasks(tmp_path, 6)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        list(TaskPipeline(tester, build_jobs=1, test_jobs=2).run(jobs))
+
+        assert tester.max_active['build'] == 1
+        assert tester.max_active['test'] == 2
+        assert tester._stage_slots == {}
+
+    def test_stages_overlap(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 4)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        started = time.monotonic()
+        list(TaskPipeline(tester, build_jobs=1, test_jobs=2).run(jobs))
+        elapsed = time.monotonic() - started
+
+        # serial execution takes 4 * (0.05 + 0.05) seconds
+        assert elapsed < 0.35
+
+    def test_serial(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 3)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = list(TaskPipeline(tester, build_jobs=1, test_jobs=1).run(jobs))
+
+        # no extra concurrency requested: tasks are tested one by one, output is printed right away
+        assert [result.result for result in results] == [1.] * 3
+        assert [result.output for result in results] == [''] * 3
+        assert capsys.readouterr().err == ''.join(f'Building {task.name}\n' for task in tasks)
+        assert tester.max_active == {'build': 1, 'test': 1}
+
+    def test_commands_output_captured(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 3)
+
+        def job(task: Path) -> float:
+            print_info(f'header {task.name}')
+            tester._executor(['sh', '-c', f'echo output of {task.name}'], sandbox=True)
+            return tester.test_task(task, task, None, None, task)
+
+        results = list(TaskPipeline(tester, build_jobs=2, test_jobs=2).run([
+            (lambda task=task: job(task)) for task in tasks
+        ]))
+
+        assert [result.output for result in results] == [
+            f'header {task.name}\noutput of {task.name}\nBuilding {task.name}\n' for task in tasks
+        ]
+        assert 'output of' not in capsys.readouterr().out
+
+    def test_errors(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 2)
+        (tasks[0] / '.tester.json').write_text('{"fail": true}')
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = list(TaskPipeline(tester, build_jobs=2).run(jobs))
+
+        assert isinstance(results[0].error, TestsFailedError)
+        assert 'Something went wrong' in results[0].output
+        assert results[1].error is None and results[1].result == 1.
+
+    def test_stop_iteration(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 10)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = TaskPipeline(tester).run(jobs)
+        next(results)
+        results.close()
+
+        # not started jobs are cancelled
+        assert sum(tester.max_active.values()) < 10
+        assert tester._stage_slots == {}
+
+
+class TestRunJobsInProcesses:
+    def test_results_order(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        # the tester holds locks, so jobs are not picklable
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 4)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = list(run_jobs_in_processes(jobs, processes=2))
+
+        assert [result.result for result in results] == [1.] * 4
+        assert all(result.error is None for result in results)
+        assert [result.output for result in results] == [f'Building {task.name}\n' for task in tasks]
+        assert 'Building' not in capsys.readouterr().err
+
+    def test_separate_processes(self) -> None:
+        jobs = [os.getpid for _ in range(4)]
+
+        pids = {result.result for result in run_jobs_in_processes(jobs, processes=2)}
+
+        assert os.getpid() not in pids
+        assert 1 <= len(pids) <= 2
+
+    def test_parallel(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tester.stage_time = {'build': 0.2, 'test': 0.2}
+        tasks = make_tasks(tmp_path, 4)
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        started = time.monotonic()
+        list(run_jobs_in_processes(jobs, processes=4))
+        elapsed = time.monotonic() - started
+
+        # serial execution takes 4 * (0.2 + 0.2) seconds
+        assert elapsed < 1.2
+
+    def test_errors(self, tmp_path: Path) -> None:
+        tester = SleepingTester()
+        tasks = make_tasks(tmp_path, 2)
+        (tasks[0] / '.tester.json').write_text('{"fail": true}')
+        jobs = [(lambda task=task: tester.test_task(task, task, None, None, task)) for task in tasks]
+
+        results = list(run_jobs_in_processes(jobs, processes=2))
+
+        assert isinstance(results[0].error, TestsFailedError)
+        assert 'Something went wrong' in results[0].output
+        assert results[1].error is None and results[1].result == 1.
+
+    def test_stop_iteration(self, tmp_path: Path) -> None:
+        done_dir = tmp_path / 'done'
+        done_dir.mkdir()
+
+        def job(index: int) -> int:
+            time.sleep(0.05)
+            (done_dir / str(index)).touch()
+            return index
+
+        jobs = [(lambda index=index: job(index)) for index in range(20)]
+
+        results = run_jobs_in_processes(jobs, processes=1)
+        assert next(results).result == 0
+        results.close()
+
+        # not started jobs are cancelled
+        assert len(list(done_dir.iterdir())) < 20
+        assert list(run_jobs_in_processes([os.getpid], processes=1))[0].error is None
@@ -7,6 +7,7 @@ import pytest
 
 from checker.exceptions import StylecheckFailedError, TestsFailedError
 from checker.testers.python import PythonTester
+from checker.utils.timings import collect_timings
 
 
 py_tests = pytest.mark.skipif("not config.getoption('python')")
@@ -82,6 +83,28 @@ class TestPythonTester:
         assert 'Running tests' in captures.err
         assert '2 passed' in captures.err
 
+    def test_stages_timings(
+            self,
+            tmp_path: Path,
+            python_tester: PythonTester,
+    ) -> None:
+        CODE = """
+        def foo() -> str:
+            return 'Hello world!'
+        """
+        PUBLIC_TESTS = """
+        def test_nothing() -> None:
+            assert True
+        """
+        create_single_file_task(tmp_path, CODE, PUBLIC_TESTS)
+
+        with collect_timings() as timings:
+            python_tester.test_task(tmp_path, tmp_path, tmp_path, tmp_path, tmp_path, normalize_output=True)
+
+        assert set(timings) == {'copy', 'regexp', 'lint', 'mypy', 'tests', 'cleanup'}
+        assert timings['tests'].count == 2  # collection and tests run
+        assert timings['mypy'].cpu > 0
+
     def test_mypy_error(
             self,
             tmp_path: Path,
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import os
+import subprocess
+import tarfile
 from pathlib import Path
 
 import pytest
 
+from checker.utils import files
 from checker.utils.files import (
     check_file_contains_regexp,
     check_files_contains_regexp,
@@ -13,6 +16,7 @@ from checker.utils.files import (
     filename_match_patterns,
     get_folders_diff,
     get_folders_diff_except_public,
+    pack_folder,
 )
 
 
@@ -248,19 +252,77 @@ class TestFolderDiff:
         changed_files = get_folders_diff(old_folder, new_folder)
         assert sorted(changed_files) == sorted(deleted_files + new_files)
 
-    # def test_flat_folders_spaces_in_filename(self, old_folder: Path, new_folder: Path) -> None:
-    #     # same files
-    #     for i in range(10):
-    #         self.fill_folder(old_folder, [f'{i} some {i}.py', f'{i} some {i}.cpp', f'{i} some {i}.go'], '1\n2\n3\n'*16)
-    #         self.fill_folder(new_folder, [f'{i} some {i}.py', f'{i} some {i}.cpp', f'{i} some {i}.go'], '1\n2\n3\n'*16)
-    #
-    #     # completely different files
-    #     different_files = ['a some a.py', 'b some b.cpp', 'c some c.go']
-    #     self.fill_folder(old_folder, different_files, '1\n2\n3\n'*16)
-    #     self.fill_folder(new_folder, different_files, '4\n5\n6\n'*16)
-    #
-    #     changed_files = get_folders_diff(old_folder, new_folder)
-    #     assert sorted(changed_files) == sorted(different_files)
+    def test_flat_folders_spaces_in_filename(self, old_folder: Path, new_folder: Path) -> None:
+        # same files
+        for i in range(10):
+            self.fill_folder(old_folder, [f'{i} some {i}.py', f'{i} some {i}.cpp', f'{i} some {i}.go'], '1\n2\n3\n'*16)
+            self.fill_folder(new_folder, [f'{i} some {i}.py', f'{i} some {i}.cpp', f'{i} some {i}.go'], '1\n2\n3\n'*16)
+
+        # completely different files
+        different_files = ['a some a.py', 'b some b.cpp', 'c some c.go']
+        self.fill_folder(old_folder, different_files, '1\n2\n3\n'*16)
+        self.fill_folder(new_folder, different_files, '4\n5\n6\n'*16)
+
+        changed_files = get_folders_diff(old_folder, new_folder)
+        assert sorted(changed_files) == sorted(different_files)
+
+    def test_flat_folders_trailing_cr(self, old_folder: Path, new_folder: Path) -> None:
+        self.fill_folder_binary_files(old_folder, ['crlf.py'], b'1\r\n2\n' * 1000)
+        self.fill_folder_binary_files(new_folder, ['crlf.py'], b'1\n2\r\n' * 1000)
+        self.fill_folder_binary_files(old_folder, ['last_cr.py'], b'1\n2\r')
+        self.fill_folder_binary_files(new_folder, ['last_cr.py'], b'1\n2')
+        self.fill_folder_binary_files(old_folder, ['cr.py'], b'1\r2\n')
+        self.fill_folder_binary_files(new_folder, ['cr.py'], b'12\n')
+
+        changed_files = get_folders_diff(old_folder, new_folder)
+        assert sorted(changed_files) == ['cr.py', 'last_cr.py']
+
+    def test_large_files_digests(self, old_folder: Path, new_folder: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(files, 'DIFF_IN_MEMORY_SIZE', 0)
+        monkeypatch.setattr(files, 'DIFF_CHUNK_SIZE', 4)
+        # CRLFs are split between chunks
+        self.fill_folder_binary_files(old_folder, ['crlf.py', 'changed.py'], b'123\r\n4\r\n' * 10)
+        self.fill_folder_binary_files(new_folder, ['crlf.py'], b'123\n4\n' * 10)
+        self.fill_folder_binary_files(new_folder, ['changed.py'], b'123\n4\n' * 9 + b'123\n5\n')
+
+        changed_files = get_folders_diff(old_folder, new_folder)
+        assert changed_files == ['changed.py']
+
+    def test_flat_folders_empty_files(self, old_folder: Path, new_folder: Path) -> None:
+        # missing files are treated as empty
+        self.fill_folder(old_folder, ['empty_deleted.py', 'deleted.py'], '')
+        self.fill_folder(new_folder, ['empty_new.py'], '')
+        self.fill_folder(new_folder, ['deleted.py'], '1\n')
+
+        changed_files = get_folders_diff(old_folder, new_folder)
+        assert changed_files == ['deleted.py']
+
+    def test_same_as_diff_command(self, old_folder: Path, new_folder: Path) -> None:
+        self.fill_folder(old_folder / 'a', ['same.py', 'changed.py', 'deleted.py'], '1\r\n2\n')
+        self.fill_folder(new_folder / 'a', ['same.py', 'new.py'], '1\n2\n')
+        self.fill_folder(new_folder / 'a', ['changed.py'], '1\n2\n3\n')
+        self.fill_folder(old_folder / 'b' / 'c', ['deleted.py'], '1\n')
+        self.fill_folder(old_folder / 'skip', ['changed.py'], '1\n')
+        self.fill_folder(new_folder / 'skip', ['changed.py'], '2\n')
+        self.fill_folder_binary_files(old_folder, ['binary.bin'], b'\x00\x01')
+        self.fill_folder_binary_files(new_folder, ['binary.bin'], b'\x00\x02')
+
+        result = subprocess.run(
+            [
+                'diff', '--brief', '--recursive', '--new-file', '--strip-trailing-cr', '--exclude=skip',
+                old_folder, new_folder,
+            ],
+            encoding='utf-8',
+            stdout=subprocess.PIPE,
+        )
+        diff_changed_files = [
+            str(Path(line.split()[3]).relative_to(new_folder))
+            for line in result.stdout.splitlines()
+        ]
+
+        changed_files = get_folders_diff(old_folder, new_folder, exclude_patterns=['skip'])
+        assert changed_files == sorted(diff_changed_files)
+        assert changed_files == ['a/changed.py', 'a/deleted.py', 'a/new.py', 'b/c/deleted.py', 'binary.bin']
 
     # TODO: make binary files detection to work on ubuntu
     # def test_flat_folders_skip_binary_files(self, old_folder: Path, new_folder: Path) -> None:
@@ -362,3 +424,64 @@ class TestFolderDiff:
         for i in changed_files:
             print('-', i)
         assert sorted(changed_files) == sorted(new_files_in_new + new_files_in_public_and_new_changed)
+
+
+class TestPackFolder:
+    @staticmethod
+    def fill_folder(folder: Path, files: dict[str, bytes]) -> None:
+        for filename, content in files.items():
+            path = folder / filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+
+    @staticmethod
+    def unpack(archive) -> dict[str, bytes]:
+        with tarfile.open(fileobj=archive, mode='r:gz') as tar:
+            return {
+                member.name: tar.extractfile(member).read()  # type: ignore[union-attr]
+                for member in tar.getmembers()
+            }
+
+    def test_same_names_in_subdirs(self, tmp_path: Path) -> None:
+        self.fill_folder(tmp_path, {
+            'solution.py': b'a = 1',
+            'sub/solution.py': b'a = 2',
+            'sub/deep/solution.py': b'a = 3',
+        })
+        with pack_folder(tmp_path) as archive:
+            assert self.unpack(archive) == {
+                'solution.py': b'a = 1',
+                'sub/solution.py': b'a = 2',
+                'sub/deep/solution.py': b'a = 3',
+            }
+
+    def test_exclude_patterns(self, tmp_path: Path) -> None:
+        self.fill_folder(tmp_path, {
+            'solution.py': b'a = 1',
+            '__pycache__/solution.cpython-311.pyc': b'\0',
+            '.git/HEAD': b'ref',
+            'data/train.csv': b'1,2,3',
+        })
+        with pack_folder(tmp_path, exclude_patterns=['.*', '__pycache__', '*.csv']) as archive:
+            assert self.unpack(archive) == {'solution.py': b'a = 1'}
+
+    def test_max_size(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        self.fill_folder(tmp_path, {
+            'a.py': b'a' * 100,
+            'b.bin': b'b' * 1000,
+            'c.py': b'c' * 100,
+        })
+        with pack_folder(tmp_path, max_size=500) as archive:
+            assert set(self.unpack(archive)) == {'a.py', 'c.py'}
+        assert 'b.bin' in capsys.readouterr().err
+
+    def test_compressed(self, tmp_path: Path) -> None:
+        self.fill_folder(tmp_path, {f'{i}.py': b'print("hello world")\n' * 100 for i in range(10)})
+        with pack_folder(tmp_path) as archive:
+            assert len(archive.read()) < 10 * 2100 / 10
+
+    def test_empty_or_missing_folder(self, tmp_path: Path) -> None:
+        with pack_folder(tmp_path) as archive:
+            assert self.unpack(archive) == {}
+        with pack_folder(tmp_path / 'missing') as archive:
+            assert self.unpack(archive) == {}
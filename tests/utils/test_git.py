@@ -1,8 +1,20 @@
 from __future__ import annotations
 
+import subprocess
 from pathlib import Path
 
-from checker.utils import get_tracked_files_list
+import pytest
+
+from checker.utils import (
+    fetch_commit,
+    get_changed_files_list,
+    get_commits_changed_files,
+    get_commits_diff_except_public,
+    get_folders_diff_except_public,
+    get_tracked_files_list,
+    get_tree_blobs,
+    read_blobs,
+)
 
 
 ROOT_DIR = Path(__file__).parent.parent.parent
@@ -18,3 +30,167 @@ class TestGitStats:
         assert len(git_tracked_files) > 0
         assert str(current_file) in git_tracked_files
         assert str(main_file) in git_tracked_files
+
+
+class TestGitChanges:
+
+    @staticmethod
+    def git(repo_dir: Path, *args: str) -> None:
+        subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test', *args],
+            cwd=repo_dir,
+            check=True,
+            capture_output=True,
+        )
+
+    def test_get_changed_files_list(self, tmp_path: Path) -> None:
+        self.git(tmp_path, 'init')
+        (tmp_path / 'course').mkdir()
+        for filename in ['committed.txt', 'staged.txt', 'unstaged.txt', 'renamed.txt', 'same.txt']:
+            (tmp_path / 'course' / filename).write_text(filename)
+        (tmp_path / 'outside.txt').write_text('outside')
+        self.git(tmp_path, 'add', '.')
+        self.git(tmp_path, 'commit', '-m', 'initial')
+        self.git(tmp_path, 'tag', 'base')
+
+        (tmp_path / 'course' / 'committed.txt').write_text('changed')
+        self.git(tmp_path, 'commit', '-am', 'change')
+        (tmp_path / 'course' / 'staged.txt').write_text('changed')
+        self.git(tmp_path, 'add', 'course/staged.txt')
+        (tmp_path / 'course' / 'unstaged.txt').write_text('changed')
+        self.git(tmp_path, 'mv', 'course/renamed.txt', 'course/new name.txt')
+        (tmp_path / 'course' / 'untracked.txt').write_text('new')
+        (tmp_path / 'outside.txt').write_text('changed')
+
+        assert get_changed_files_list(tmp_path / 'course', 'base') == [
+            'committed.txt', 'new name.txt', 'renamed.txt', 'staged.txt', 'unstaged.txt', 'untracked.txt',
+        ]
+
+    def test_get_commits_changed_files(self, tmp_path: Path) -> None:
+        self.git(tmp_path, 'init', '--initial-branch', 'main')
+        (tmp_path / 'base.txt').write_text('base')
+        self.git(tmp_path, 'add', '.')
+        self.git(tmp_path, 'commit', '-m', 'initial')
+        self.git(tmp_path, 'tag', 'base')
+
+        self.git(tmp_path, 'checkout', '-b', 'upstream')
+        (tmp_path / 'upstream.txt').write_text('upstream')
+        self.git(tmp_path, 'add', '.')
+        self.git(tmp_path, 'commit', '-m', 'upstream')
+        self.git(tmp_path, 'checkout', 'main')
+
+        for filename in ['task 1/solution.py', 'задача/решение.py', 'task 1/solution.py']:
+            path = tmp_path / filename
+            path.parent.mkdir(exist_ok=True)
+            path.write_text(path.read_text() + '1' if path.exists() else '')
+            self.git(tmp_path, 'add', '.')
+            self.git(tmp_path, 'commit', '-m', f'change {filename}')
+        (tmp_path / 'other.txt').write_text('other')
+        self.git(tmp_path, 'add', '.')
+        self.git(tmp_path, '-c', 'user.name=other', 'commit', '-m', 'other author')
+        self.git(tmp_path, 'merge', '--no-edit', 'upstream')
+
+        assert get_commits_changed_files(tmp_path, ['base..main']) == [
+            'other.txt', 'task 1/solution.py', 'upstream.txt', 'задача/решение.py',
+        ]
+        assert get_commits_changed_files(tmp_path, ['base..main', '--not', 'upstream']) == [
+            'other.txt', 'task 1/solution.py', 'задача/решение.py',
+        ]
+        assert get_commits_changed_files(tmp_path, ['base..main'], author='other') == ['other.txt']
+        assert get_commits_changed_files(tmp_path, ['main..main']) == []
+
+
+class TestGitObjectsDiff:
+
+    @staticmethod
+    def git(repo_dir: Path, *args: str) -> str:
+        return subprocess.run(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@test', *args],
+            cwd=repo_dir,
+            check=True,
+            capture_output=True,
+            encoding='utf-8',
+        ).stdout.strip()
+
+    @staticmethod
+    def write_files(repo_dir: Path, files: dict[str, bytes | None]) -> None:
+        for filename, content in files.items():
+            path = repo_dir / filename
+            if content is None:
+                path.unlink()
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(content)
+
+    @pytest.fixture
+    def repos(self, tmp_path: Path) -> tuple[Path, Path]:
+        public_dir, student_dir = tmp_path / 'public', tmp_path / 'student'
+        public_dir.mkdir()
+        self.git(public_dir, 'init', '--initial-branch', 'main')
+        self.git(public_dir, 'config', 'uploadpack.allowFilter', 'true')
+        self.git(public_dir, 'config', 'uploadpack.allowAnySHA1InWant', 'true')
+        self.write_files(public_dir, {
+            'task_1/solution.py': b'pass\n',
+            'task_2/solution.py': b'pass\n',
+            'task_3/solution.py': b'pass\r\n',
+            'task 4/solution.py': b'pass\n',
+            'binary.bin': b'\0\1',
+        })
+        self.git(public_dir, 'add', '.')
+        self.git(public_dir, 'commit', '-m', 'initial')
+        self.git(tmp_path, 'clone', str(public_dir), str(student_dir))
+
+        self.write_files(student_dir, {
+            'task_1/solution.py': b'solved\n',
+            'task_2/solution.py': b'solved\n',
+        })
+        self.git(student_dir, 'commit', '-am', 'solve')
+        return public_dir, student_dir
+
+    def test_changed_except_public(self, repos: tuple[Path, Path], tmp_path: Path) -> None:
+        public_dir, student_dir = repos
+        old_commit = self.git(student_dir, 'rev-parse', 'HEAD')
+        # public repo updated after the student fork
+        self.write_files(public_dir, {'task_5/solution.py': b'pass\n'})
+        self.git(public_dir, 'add', '.')
+        self.git(public_dir, 'commit', '-m', 'new task')
+        self.git(student_dir, 'pull', '--no-rebase', '--no-edit', 'origin', 'main')
+
+        self.write_files(student_dir, {
+            'task_1/solution.py': b'solved again\n',  # changed
+            'task_2/solution.py': b'pass\n',  # changed back to public one
+            'task_3/solution.py': b'pass\n',  # trailing CR only
+            'task 4/solution.py': b'solved\n',  # changed, with space in name
+            'task_5/solution.py': b'solved\n',  # new task changed
+            'task_6/solution.py': b'',  # new empty file
+            'binary.bin': b'\0\2',
+        })
+        self.git(student_dir, 'add', '.')
+        self.git(student_dir, 'commit', '-m', 'solve more')
+
+        public_commit = fetch_commit(student_dir, {'public': f'file://{public_dir}'}, 'public', 'main')
+        changes = get_commits_diff_except_public(student_dir, public_commit, old_commit, 'HEAD')
+
+        assert sorted(changes) == ['binary.bin', 'task 4/solution.py', 'task_1/solution.py', 'task_5/solution.py']
+
+        # same as diff of the checkouts
+        old_dir = tmp_path / 'old'
+        self.git(tmp_path, 'clone', str(student_dir), str(old_dir))
+        self.git(old_dir, 'checkout', old_commit)
+        folders_changes = get_folders_diff_except_public(public_dir, old_dir, student_dir, exclude_patterns=['.git'])
+        assert changes == sorted(folders_changes)
+
+    def test_fetch_blobs_on_demand(self, repos: tuple[Path, Path], tmp_path: Path) -> None:
+        public_dir, student_dir = repos
+        self.write_files(public_dir, {'task_5/solution.py': b'new task\n'})
+        self.git(public_dir, 'add', '.')
+        self.git(public_dir, 'commit', '-m', 'new task')
+
+        remotes = {'public': f'file://{public_dir}'}
+        public_commit = fetch_commit(student_dir, remotes, 'public', 'main')
+        assert public_commit == self.git(public_dir, 'rev-parse', 'HEAD')
+        assert 'remote.public' not in self.git(student_dir, 'config', '--list')
+
+        blob = get_tree_blobs(student_dir, public_commit)['task_5/solution.py']
+        assert self.git(student_dir, 'cat-file', '--batch-check', '--batch-all-objects').count(blob) == 0
+        assert read_blobs(student_dir, {blob}, remotes=remotes) == {blob: b'new task\n'}
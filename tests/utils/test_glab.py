@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from pytest_mock import MockFixture
+
+from checker.utils.glab import GitlabConnection, RateLimiter
+
+
+def make_response(status_code: int, headers: dict[str, str] | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update({'Content-Type': 'application/json', **(headers or {})})
+    response._content = b'{}'
+    return response
+
+
+def make_group(name: str, projects: list[str]) -> MagicMock:
+    group = MagicMock()
+    group.name = name
+    group.projects.list.return_value = [make_named(project) for project in projects]
+    return group
+
+
+def make_named(name: str, **kwargs: str) -> MagicMock:
+    item = MagicMock(**kwargs)
+    item.name = name
+    return item
+
+
+@pytest.fixture
+def connection(mocker: MockFixture) -> GitlabConnection:
+    connection = GitlabConnection('https://gitlab.test.org', private_token='test_token')
+    mocker.patch.object(connection.gitlab, 'groups')
+    mocker.patch.object(connection.gitlab, 'users')
+    return connection
+
+
+class TestGitlabConnection:
+
+    def test_group_memoized(self, connection: GitlabConnection) -> None:
+        students = make_group('students', [])
+        connection.gitlab.groups.list.return_value = [make_group('students-2022', []), students]
+
+        assert connection.get_group('students') is students
+        assert connection.get_group('students') is students
+        assert connection.get_group_members('students') is not None
+        connection.gitlab.groups.list.assert_called_once()
+
+    def test_group_not_found(self, connection: GitlabConnection) -> None:
+        connection.gitlab.groups.list.return_value = []
+
+        with pytest.raises(AssertionError):
+            connection.get_group('students')
+
+    def test_projects_indexed(self, connection: GitlabConnection) -> None:
+        students = make_group('students', [f'user{i}' for i in range(10)])
+        connection.gitlab.groups.list.return_value = [students]
+
+        assert len(connection.get_students_projects('students')) == 10
+        for i in range(10):
+            assert connection.get_project_from_group('students', f'user{i}').name == f'user{i}'
+        with pytest.raises(KeyError):
+            connection.get_project_from_group('students', 'user10')
+
+        connection.gitlab.groups.list.assert_called_once()
+        students.projects.list.assert_called_once()
+
+    def test_users_memoized(self, connection: GitlabConnection) -> None:
+        connection.gitlab.users.list.return_value = [
+            make_named('User 1', username='user1'), make_named('User 10', username='user10'),
+        ]
+
+        assert connection.get_user_by_username('user1').name == 'User 1'
+        assert connection.get_user_by_username('user1').name == 'User 1'
+        connection.gitlab.users.list.assert_called_once()
+
+    def test_users_indexed(self, connection: GitlabConnection) -> None:
+        students = make_group('students', [])
+        students.members_all.list.return_value = [
+            make_named(f'User {i}', username=f'user{i}') for i in range(20)
+        ]
+        connection.gitlab.groups.list.return_value = [students]
+        connection.gitlab.users.list.side_effect = lambda search, **kwargs: [make_named(search, username=search)]
+
+        connection.index_users('students')
+        for i in range(20):
+            assert connection.get_user_by_username(f'user{i}').name == f'User {i}'
+        students.members_all.list.assert_called_once()
+        connection.gitlab.users.list.assert_not_called()
+
+        # not a member (e.g. added to the project only) is searched
+        assert connection.get_user_by_username('user20').name == 'user20'
+        connection.gitlab.users.list.assert_called_once_with(get_all=True, search='user20')
+
+    def test_users_shared_by_threads(self, connection: GitlabConnection) -> None:
+        connection.gitlab.users.list.side_effect = lambda search, **kwargs: [make_named(search, username=search)]
+
+        threads = [
+            threading.Thread(target=connection.get_user_by_username, args=(f'user{i % 5}',))
+            for i in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert {connection.get_user_by_username(f'user{i}').name for i in range(5)} == {f'user{i}' for i in range(5)}
+        assert connection.gitlab.users.list.call_count == 5
+
+    def test_users_searched_concurrently(self, connection: GitlabConnection) -> None:
+        searching = threading.Barrier(2, timeout=5)
+
+        def search(search: str, **kwargs: Any) -> list[MagicMock]:
+            searching.wait()  # both searches are in flight at the same time
+            return [make_named(search, username=search)]
+
+        connection.gitlab.users.list.side_effect = search
+
+        threads = [threading.Thread(target=connection.get_user_by_username, args=(f'user{i}',)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not searching.broken
+
+    def test_invalidate(self, connection: GitlabConnection) -> None:
+        connection.gitlab.groups.list.side_effect = [
+            [make_group('students', ['user1'])],
+            [make_group('students', ['user1', 'user2'])],
+        ]
+        connection.gitlab.users.list.return_value = [make_named('User 1', username='user1')]
+
+        assert len(connection.get_students_projects('students')) == 1
+        connection.get_user_by_username('user1')
+        connection.invalidate()
+
+        assert connection.get_project_from_group('students', 'user2').name == 'user2'
+        connection.get_user_by_username('user1')
+        assert connection.gitlab.groups.list.call_count == 2
+        assert connection.gitlab.users.list.call_count == 2
+
+
+class TestRateLimiter:
+
+    def test_burst_then_rate(self) -> None:
+        limiter = RateLimiter(rate=50., burst=5)
+
+        start_time = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - start_time < 0.05
+
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - start_time >= 5 / 50 * 0.9
+        assert limiter.waited > 0
+
+    def test_shared_by_threads(self) -> None:
+        limiter = RateLimiter(rate=100., burst=1)
+
+        def acquire_many() -> None:
+            for _ in range(5):
+                limiter.acquire()
+
+        start_time = time.monotonic()
+        threads = [threading.Thread(target=acquire_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - start_time >= 19 / 100 * 0.9
+
+    def test_pause(self) -> None:
+        limiter = RateLimiter(rate=1000., burst=10)
+
+        start_time = time.monotonic()
+        limiter.pause(0.1)
+        limiter.acquire()
+        assert time.monotonic() - start_time >= 0.09
+
+
+class TestRateLimitedRequests:
+
+    def test_requests_counted(self, mocker: MockFixture) -> None:
+        connection = GitlabConnection('https://gitlab.test.org', private_token='test_token', rate_limit=1000.)
+        mocker.patch('requests.adapters.HTTPAdapter.send', return_value=make_response(200))
+
+        connection.gitlab.http_get('/groups')
+        connection.gitlab.http_get('/users')
+        connection.gitlab.http_post('/projects')
+
+        assert {method: stats.count for method, stats in connection.stats.items()} == {'GET': 2, 'POST': 1}
+
+    def test_throttled_retried(self, mocker: MockFixture) -> None:
+        connection = GitlabConnection('https://gitlab.test.org', private_token='test_token', rate_limit=1000.)
+        mock = mocker.patch('requests.adapters.HTTPAdapter.send', side_effect=[
+            make_response(429, {'Retry-After': '0'}),
+            make_response(503),
+            make_response(200),
+        ])
+        mocker.patch('gitlab.client.time.sleep')
+
+        connection.gitlab.http_get('/groups')
+
+        assert mock.call_count == 3
+        assert connection.stats['GET'].count == 3
+        assert connection.stats['GET'].errors == 1
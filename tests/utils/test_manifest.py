@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from checker.utils import manifest as manifest_module
+from checker.utils.manifest import Manifest, get_file_digest, get_folder_manifest
+
+
+def fill_folder(folder: Path, files: dict[str, str]) -> None:
+    for filename, content in files.items():
+        path = folder / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def set_old_mtime(folder: Path) -> None:
+    # pretend files were written long before the scan, so their mtimes can be trusted
+    for root, _, files in os.walk(folder):
+        for filename in files:
+            os.utime(Path(root) / filename, ns=(10**18, 10**18))
+
+
+@pytest.fixture
+def folder(tmp_path: Path) -> Path:
+    folder = tmp_path / 'folder'
+    fill_folder(folder, {
+        'README.md': 'readme',
+        'task_1/solution.py': 'a = 1',
+        'task_1/tests/test_public.py': 'pass',
+        'task_2/solution.py': 'b = 2',
+        '.git/HEAD': 'ref',
+    })
+    return folder
+
+
+class TestManifest:
+
+    def test_build(self, folder: Path) -> None:
+        manifest = Manifest.build(folder, ignore_names={'.git'})
+        assert list(manifest.files) == [
+            'README.md', 'task_1/solution.py', 'task_1/tests/test_public.py', 'task_2/solution.py',
+        ]
+        entry = manifest.files['task_1/solution.py']
+        assert entry.size == 5
+        assert entry.digest == get_file_digest(folder / 'task_1' / 'solution.py')
+
+    def test_not_existing_folder(self, tmp_path: Path) -> None:
+        manifest = Manifest.build(tmp_path / 'missing')
+        assert manifest.files == {}
+        assert manifest.get_tree_hash() == Manifest().get_tree_hash()
+
+    def test_tree_hashes(self, folder: Path, tmp_path: Path) -> None:
+        manifest = Manifest.build(folder, ignore_names={'.git'})
+
+        other_folder = tmp_path / 'other'
+        fill_folder(other_folder, {
+            'README.md': 'other readme',
+            'task_1/solution.py': 'a = 1',
+            'task_1/tests/test_public.py': 'pass',
+            'task_2/solution.py': 'b = 3',
+        })
+        other_manifest = Manifest.build(other_folder)
+
+        assert manifest.get_tree_hash() != other_manifest.get_tree_hash()
+        assert manifest.get_tree_hash('task_1') == other_manifest.get_tree_hash('task_1/')
+        assert manifest.get_tree_hash('task_2') != other_manifest.get_tree_hash('task_2')
+        assert manifest.get_tree_hash('task_1') != manifest.get_tree_hash('task_1/tests')
+        assert manifest.get_tree_hash('missing') == Manifest().get_tree_hash()
+
+    def test_tree_hash_depends_on_names(self, tmp_path: Path) -> None:
+        fill_folder(tmp_path / 'a', {'task/solution.py': 'a = 1'})
+        fill_folder(tmp_path / 'b', {'task/other.py': 'a = 1'})
+        fill_folder(tmp_path / 'c', {'other/solution.py': 'a = 1'})
+        hashes = {Manifest.build(tmp_path / name).get_tree_hash() for name in 'abc'}
+        assert len(hashes) == 3
+
+    def test_diff(self, folder: Path) -> None:
+        manifest = Manifest.build(folder, ignore_names={'.git'})
+
+        fill_folder(folder, {
+            'task_1/solution.py': 'a = 2',
+            'task_3/solution.py': 'c = 3',
+        })
+        (folder / 'task_2' / 'solution.py').unlink()
+        (folder / 'task_2').rmdir()
+        fill_folder(folder, {'task_2': 'replaced dir with file'})
+
+        new_manifest = Manifest.build(folder, ignore_names={'.git'})
+        assert manifest.diff(new_manifest) == [
+            'task_1/solution.py', 'task_2', 'task_2/solution.py', 'task_3/solution.py',
+        ]
+        assert new_manifest.diff(manifest) == manifest.diff(new_manifest)
+        assert manifest.diff(manifest) == []
+
+    def test_refresh_reuses_digests(self, folder: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        set_old_mtime(folder)
+        manifest = Manifest.build(folder, ignore_names={'.git'})
+
+        fill_folder(folder, {'task_2/solution.py': 'b = 3'})
+        hashed_files = []
+
+        def get_file_digest_spy(path: Path | str) -> str:
+            hashed_files.append(Path(path).relative_to(folder).as_posix())
+            return get_file_digest(path)
+
+        monkeypatch.setattr(manifest_module, 'get_file_digest', get_file_digest_spy)
+        new_manifest = manifest.refresh(folder, ignore_names={'.git'})
+
+        assert hashed_files == ['task_2/solution.py']
+        assert manifest.diff(new_manifest) == ['task_2/solution.py']
+
+    def test_refresh_racy_files_rehashed(self, folder: Path) -> None:
+        # file is changed right after the scan without size and mtime change
+        manifest = Manifest.build(folder, ignore_names={'.git'})
+        stat = (folder / 'task_1' / 'solution.py').stat()
+        fill_folder(folder, {'task_1/solution.py': 'a = 2'})
+        os.utime(folder / 'task_1' / 'solution.py', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        new_manifest = manifest.refresh(folder, ignore_names={'.git'})
+        assert manifest.diff(new_manifest) == ['task_1/solution.py']
+
+    def test_save_load(self, folder: Path, tmp_path: Path) -> None:
+        manifest = Manifest.build(folder)
+        manifest.save(tmp_path / 'manifests' / 'folder.json')
+
+        loaded = Manifest.load(tmp_path / 'manifests' / 'folder.json')
+        assert loaded == manifest
+        assert loaded is not None and loaded.get_tree_hash() == manifest.get_tree_hash()
+
+    def test_load_missing_or_corrupted(self, tmp_path: Path) -> None:
+        assert Manifest.load(tmp_path / 'missing.json') is None
+        (tmp_path / 'corrupted.json').write_text('{"version": 1, "files": ')
+        assert Manifest.load(tmp_path / 'corrupted.json') is None
+        (tmp_path / 'other_version.json').write_text('{"version": 0, "files": {}, "scanned_at_ns": 0}')
+        assert Manifest.load(tmp_path / 'other_version.json') is None
+
+    def test_get_folder_manifest(self, folder: Path, tmp_path: Path) -> None:
+        set_old_mtime(folder)
+        manifest_path = tmp_path / 'folder.json'
+        manifest = get_folder_manifest(folder, manifest_path)
+        assert Manifest.load(manifest_path) == manifest
+
+        fill_folder(folder, {'task_1/solution.py': 'a = 2'})
+        new_manifest = get_folder_manifest(folder, manifest_path)
+        assert manifest.diff(new_manifest) == ['task_1/solution.py']
+        assert Manifest.load(manifest_path) == new_manifest
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import datetime
+import email.utils
+import io
+import json
+from pathlib import Path
 
 import pytest
+import requests
 from pytest_mock import MockFixture
 
 from checker.exceptions import GetFailedError, PushFailedError
-from checker.utils import get_score, push_report
+from checker.utils import ManytaskClient, ScoreReport, get_manytask_client, get_retry_after, get_score, push_report
 
 
 BASE_URL = 'https://test.manytask.org'
@@ -52,7 +57,7 @@ def mock_report_request(mocker: MockFixture) -> MockFixture:
         return mock_response
 
 
-    mock = mocker.patch('requests.post')
+    mock = mocker.patch('requests.Session.post')
     mock.side_effect = mock_side_effect
     return mock
 
@@ -155,7 +160,7 @@ def mock_score_request(mocker: MockFixture) -> MockFixture:
         return mock_response
 
 
-    mock = mocker.patch('requests.get')
+    mock = mocker.patch('requests.Session.get')
     mock.side_effect = mock_side_effect
     return mock
 
@@ -200,3 +205,275 @@ class TestGetScore:
                 task_name=TEST_TASK_NAME,
                 user_id=TEST_USER_ID,
             )
+
+
+def make_response(status_code: int, json_data: dict | None = None, headers: dict | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = json.dumps(json_data or {}).encode()
+    return response
+
+
+SCORE_RESPONSE = {'score': TEST_SCORE}
+
+
+@pytest.fixture
+def sleeps(mocker: MockFixture) -> list[float]:
+    sleeps: list[float] = []
+    mocker.patch('checker.utils.manytask.time.sleep', side_effect=sleeps.append)
+    return sleeps
+
+
+class TestManytaskClient:
+
+    def test_session_reused(self, mocker: MockFixture) -> None:
+        assert get_manytask_client(BASE_URL, TESTER_TOKEN) is get_manytask_client(BASE_URL, TESTER_TOKEN)
+        assert get_manytask_client(BASE_URL, TESTER_TOKEN) is not get_manytask_client(BASE_URL, 'other_token')
+
+        mock = mocker.patch('requests.Session.get', return_value=make_response(200, SCORE_RESPONSE))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, connect_timeout=1., read_timeout=2.)
+        assert client.get_score(TEST_TASK_NAME, TEST_USER_ID) == TEST_SCORE
+        assert client.get_score(TEST_TASK_NAME, TEST_USER_ID) == TEST_SCORE
+
+        assert mock.call_count == 2
+        assert mock.call_args.kwargs['timeout'] == (1., 2.)
+        assert client.stats['score'].count == 2
+        assert client.stats['score'].errors == 0
+
+    def test_print_stats(self, mocker: MockFixture, capsys: pytest.CaptureFixture[str]) -> None:
+        mocker.patch('requests.Session.get', return_value=make_response(200, SCORE_RESPONSE))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+        client.get_score(TEST_TASK_NAME, TEST_USER_ID)
+
+        client.print_stats()
+
+        assert 'Manytask /api/score: 1 requests (0 failed)' in capsys.readouterr().err
+
+    def test_retry_server_errors(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mock = mocker.patch('requests.Session.get', side_effect=[
+            make_response(502), requests.ConnectionError('refused'), make_response(200, SCORE_RESPONSE),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=3, backoff_base=1., backoff_max=30.)
+
+        assert client.get_score(TEST_TASK_NAME, TEST_USER_ID) == TEST_SCORE
+        assert mock.call_count == 3
+        assert client.stats['score'].count == 3
+        assert client.stats['score'].errors == 2
+        # full jitter: up to base * 2^attempt
+        assert len(sleeps) == 2
+        assert 0 <= sleeps[0] <= 1. and 0 <= sleeps[1] <= 2.
+
+    def test_backoff_max(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mocker.patch('requests.Session.get', return_value=make_response(503))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=6, backoff_base=1., backoff_max=3.)
+
+        with pytest.raises(requests.HTTPError):
+            client.get_score(TEST_TASK_NAME, TEST_USER_ID)
+        assert len(sleeps) == 5
+        assert all(0 <= delay <= 3. for delay in sleeps)
+
+    def test_retry_after(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mocker.patch('requests.Session.get', side_effect=[
+            make_response(429, headers={'Retry-After': '7'}),
+            make_response(503, headers={'Retry-After': '100'}),
+            make_response(200, SCORE_RESPONSE),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=3, backoff_max=30.)
+
+        assert client.get_score(TEST_TASK_NAME, TEST_USER_ID) == TEST_SCORE
+        assert sleeps == [7., 30.]
+
+    def test_too_many_requests(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mocker.patch('requests.Session.post', return_value=make_response(429))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=2)
+
+        with pytest.raises(PushFailedError):
+            client.push_report(TEST_TASK_NAME, TEST_USER_ID, TEST_SCORE)
+        assert len(sleeps) == 1
+
+    def test_timeout_raised(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=requests.ReadTimeout('timeout'))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=3)
+
+        with pytest.raises(requests.Timeout):
+            client.push_report(TEST_TASK_NAME, TEST_USER_ID, TEST_SCORE)
+        assert mock.call_count == 3
+        assert client.stats['report'].errors == 3
+
+    def test_client_error_not_retried(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mock = mocker.patch('requests.Session.post', return_value=make_response(400))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        with pytest.raises(PushFailedError):
+            client.push_report(TEST_TASK_NAME, TEST_USER_ID, TEST_SCORE)
+        assert mock.call_count == 1
+        assert sleeps == []
+
+    def test_files_resent(self, mocker: MockFixture, sleeps: list[float], tmp_path: Path) -> None:
+        sent = []
+
+        def post(*args, **kwargs):
+            sent.append({name: file.read() for name, (_, file) in kwargs['files'].items()})
+            return make_response(500) if len(sent) == 1 else make_response(200, {'username': TEST_USERNAME, 'score': 1})
+
+        mocker.patch('requests.Session.post', side_effect=post)
+        (tmp_path / 'solution.py').write_text('a = 1')
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        with open(tmp_path / 'solution.py', 'rb') as f:
+            client.push_report(TEST_TASK_NAME, TEST_USER_ID, TEST_SCORE, files={'solution.py': ('solution.py', f)})
+        assert sent == [{'solution.py': b'a = 1'}] * 2
+
+
+PUSH_RESPONSE = {'username': TEST_USERNAME, 'score': TEST_SCORE}
+
+
+class TestPushReports:
+
+    @staticmethod
+    def make_reports(count: int) -> list[ScoreReport]:
+        return [ScoreReport(f'task_{i}', TEST_USER_ID, TEST_SCORE, send_time=TEST_NOW_DATETIME) for i in range(count)]
+
+    def test_batch(self, mocker: MockFixture, tmp_path: Path) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            make_response(200, {'results': []}),
+            make_response(200, {'results': [
+                PUSH_RESPONSE, {'error': 'Unknown task', 'status': 400}, {'username': TEST_USERNAME},
+            ]}),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+        reports = self.make_reports(3)
+        (tmp_path / 'solution.tar.gz').write_bytes(b'archive')
+
+        with open(tmp_path / 'solution.tar.gz', 'rb') as f:
+            reports[1].files = {'solution.tar.gz': ('solution.tar.gz', f)}
+            first, second, third = client.push_reports(reports)
+
+        assert first == (TEST_USERNAME, TEST_SCORE, None, None, 1.)
+        assert isinstance(second, PushFailedError) and 'Unknown task' in str(second)
+        assert second.status_code == 400
+        assert isinstance(third, PushFailedError) and third.status_code is None
+        assert client.batch_supported
+
+        probe_call, batch_call = mock.call_args_list
+        assert probe_call.kwargs['url'] == f'{BASE_URL}/api/reports'
+        assert probe_call.kwargs['data']['reports'] == '[]' and probe_call.kwargs['files'] is None
+        assert batch_call.kwargs['url'] == f'{BASE_URL}/api/reports'
+        assert list(batch_call.kwargs['files']) == ['1/solution.tar.gz']
+        [first_data, *_] = json.loads(mock.call_args.kwargs['data']['reports'])
+        assert first_data == {
+            'task': 'task_0', 'user_id': TEST_USER_ID, 'score': TEST_SCORE, 'check_deadline': True,
+            'use_demand_multiplier': True, 'commit_time': str(TEST_NOW_DATETIME),
+        }
+
+    def test_batches_size(self, mocker: MockFixture) -> None:
+        def post(*args, **kwargs):
+            if 'reports' not in kwargs['data']:
+                return make_response(200, PUSH_RESPONSE)
+            return make_response(200, {'results': [PUSH_RESPONSE] * len(json.loads(kwargs['data']['reports']))})
+
+        mock = mocker.patch('requests.Session.post', side_effect=post)
+        mocker.patch('checker.utils.manytask.MANYTASK_BATCH_SIZE', 4)
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        assert len(client.push_reports(self.make_reports(9))) == 9
+        # batches support is probed once, the last single report is pushed with a plain request
+        assert [call.kwargs['url'].rsplit('/', 1)[-1] for call in mock.call_args_list] == [
+            'reports', 'reports', 'reports', 'report',
+        ]
+
+    @pytest.mark.parametrize('batch_response', [
+        make_response(404),
+        make_response(413),
+        make_response(200, {'results': [PUSH_RESPONSE]}),
+        make_response(200, {'status': 'ok'}),
+    ])
+    def test_fallback(self, mocker: MockFixture, batch_response: requests.Response) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            batch_response, make_response(200, PUSH_RESPONSE), make_response(400),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        first, second = client.push_reports(self.make_reports(2))
+
+        assert first == (TEST_USERNAME, TEST_SCORE, None, None, 1.)
+        assert isinstance(second, PushFailedError)
+        assert [call.kwargs['url'].rsplit('/', 1)[-1] for call in mock.call_args_list] == [
+            'reports', 'report', 'report',
+        ]
+
+    def test_not_supported_remembered(self, mocker: MockFixture) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            make_response(404), make_response(200, PUSH_RESPONSE), make_response(200, PUSH_RESPONSE),
+            make_response(200, PUSH_RESPONSE), make_response(200, PUSH_RESPONSE),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        client.push_reports(self.make_reports(2))
+        assert client.batch_supported is False
+        client.push_reports(self.make_reports(2))
+        assert mock.call_count == 5
+
+    def test_files_not_sent_to_unsupported(self, mocker: MockFixture) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            make_response(404), make_response(200, PUSH_RESPONSE), make_response(200, PUSH_RESPONSE),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+        reports = self.make_reports(2)
+        for report in reports:
+            report.files = {'solution.tar.gz': ('solution.tar.gz', io.BytesIO(b'archive'))}
+
+        client.push_reports(reports)
+
+        assert [call.kwargs['files'] is not None for call in mock.call_args_list] == [False, True, True]
+
+    def test_unavailable(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mocker.patch('requests.Session.post', side_effect=requests.ConnectionError('refused'))
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=2)
+
+        results = client.push_reports(self.make_reports(3))
+
+        assert len(results) == 3
+        assert all(isinstance(result, requests.ConnectionError) for result in results)
+
+    def test_unavailable_during_fallback(self, mocker: MockFixture, sleeps: list[float]) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            make_response(404), make_response(200, PUSH_RESPONSE), make_response(503), make_response(503),
+        ])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN, retries=2)
+
+        first, second, third = client.push_reports(self.make_reports(3))
+
+        assert first == (TEST_USERNAME, TEST_SCORE, None, None, 1.)
+        assert isinstance(second, requests.HTTPError) and third is second
+        assert mock.call_count == 4
+
+    def test_token_rejected(self, mocker: MockFixture) -> None:
+        mock = mocker.patch('requests.Session.post', side_effect=[make_response(404), make_response(403)])
+        client = ManytaskClient(BASE_URL, TESTER_TOKEN)
+
+        first, second, third = client.push_reports(self.make_reports(3))
+
+        assert isinstance(first, PushFailedError) and first.status_code == 403
+        assert second is first and third is first
+        assert mock.call_count == 2
+
+
+class TestGetRetryAfter:
+
+    @pytest.mark.parametrize('headers,expected', [
+        ({}, None),
+        ({'Retry-After': '5'}, 5.),
+        ({'Retry-After': '-1'}, 0.),
+        ({'Retry-After': 'soon'}, None),
+        ({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, 0.),
+    ])
+    def test_retry_after(self, headers: dict[str, str], expected: float | None) -> None:
+        assert get_retry_after(make_response(503, headers=headers)) == expected
+
+    def test_http_date(self) -> None:
+        retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=60)
+        headers = {'Retry-After': email.utils.format_datetime(retry_at, usegmt=True)}
+        retry_after = get_retry_after(make_response(503, headers=headers))
+        assert retry_after is not None and 55 < retry_after <= 60
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+import requests
+from pytest_mock import MockFixture
+
+from checker.utils import ManytaskClient, ReportOutbox, flush_outbox
+
+
+BASE_URL = 'https://test.manytask.org'
+TESTER_TOKEN = 'test_token'
+TEST_SEND_TIME = datetime.datetime(2021, 1, 1, 12, 30, 0, tzinfo=datetime.timezone.utc)
+
+
+def make_response(status_code: int, json_data: dict | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(json_data or {}).encode()
+    return response
+
+
+@pytest.fixture
+def outbox(tmp_path: Path) -> ReportOutbox:
+    return ReportOutbox(tmp_path / 'outbox' / 'reports.db')
+
+
+@pytest.fixture
+def client(mocker: MockFixture) -> ManytaskClient:
+    mocker.patch('checker.utils.manytask.time.sleep')
+    return ManytaskClient(BASE_URL, TESTER_TOKEN, retries=2)
+
+
+class TestReportOutbox:
+
+    def test_put_and_get(self, outbox: ReportOutbox) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10., send_time=TEST_SEND_TIME, files=b'archive')
+        outbox.put(BASE_URL + '/', 'task_2', 2, 20., use_demand_multiplier=False)
+        outbox.put('https://other.manytask.org', 'task_1', 1, 10.)
+
+        reports = ReportOutbox(outbox.path).get_pending(BASE_URL)
+        assert [(report.task_name, report.user_id, report.score) for report in reports] == [
+            ('task_1', 1, 10.), ('task_2', 2, 20.),
+        ]
+        assert reports[0].send_time == TEST_SEND_TIME
+        assert reports[0].files == b'archive'
+        assert reports[0].use_demand_multiplier
+        assert reports[1].send_time is None
+        assert reports[1].files is None
+        assert not reports[1].use_demand_multiplier
+
+    def test_same_commit_replaced(self, outbox: ReportOutbox) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10., send_time=TEST_SEND_TIME)
+        outbox.put(BASE_URL, 'task_1', 1, 15., send_time=TEST_SEND_TIME)
+        outbox.put(BASE_URL, 'task_1', 1, 20., send_time=TEST_SEND_TIME + datetime.timedelta(hours=1))
+
+        assert [report.score for report in outbox.get_pending(BASE_URL)] == [15., 20.]
+
+    def test_remove_and_mark_failed(self, outbox: ReportOutbox) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        outbox.put(BASE_URL, 'task_2', 1, 10.)
+        first, second = outbox.get_pending(BASE_URL)
+
+        outbox.mark_failed(second.id, 'ConnectionError')
+        outbox.remove(first.id)
+
+        [report] = outbox.get_pending(BASE_URL)
+        assert report.task_name == 'task_2'
+        assert report.attempts == 1
+
+
+def no_batches(*responses: requests.Response) -> list[requests.Response]:
+    # batch endpoint is not supported by the server, reports are pushed one by one
+    return [make_response(404), *responses]
+
+
+class TestFlushOutbox:
+
+    def test_all_pushed(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10., send_time=TEST_SEND_TIME, files=b'archive')
+        outbox.put(BASE_URL, 'task_2', 1, 20., check_deadline=False)
+        mock = mocker.patch('requests.Session.post', side_effect=no_batches(
+            make_response(200, {'username': 'user', 'score': 10}),
+            make_response(200, {'username': 'user', 'score': 20}),
+        ))
+
+        assert flush_outbox(outbox, client) == (2, 0)
+        assert outbox.get_pending(BASE_URL) == []
+
+        _, first_call, second_call = mock.call_args_list
+        assert first_call.kwargs['data']['task'] == 'task_1'
+        assert first_call.kwargs['data']['commit_time'] == TEST_SEND_TIME
+        assert first_call.kwargs['data']['token'] == TESTER_TOKEN
+        [(_, file)] = first_call.kwargs['files'].values()
+        assert file.read() == b'archive'
+        assert second_call.kwargs['data']['check_deadline'] is False
+
+    def test_batch(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10., send_time=TEST_SEND_TIME, files=b'archive')
+        outbox.put(BASE_URL, 'task_2', 1, 20.)
+        mock = mocker.patch('requests.Session.post', side_effect=[
+            make_response(200, {'results': []}),
+            make_response(200, {'results': [
+                {'username': 'user', 'score': 10},
+                {'error': 'Unknown task', 'status': 400},
+            ]}),
+        ])
+
+        assert flush_outbox(outbox, client) == (1, 0)
+        assert mock.call_count == 2  # batches support probe and the batch
+        assert mock.call_args.kwargs['url'] == f'{BASE_URL}/api/reports'
+        assert [report['task'] for report in json.loads(mock.call_args.kwargs['data']['reports'])] == [
+            'task_1', 'task_2',
+        ]
+
+    def test_stop_on_server_errors(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        outbox.put(BASE_URL, 'task_2', 1, 20.)
+        outbox.put(BASE_URL, 'task_3', 1, 30.)
+        mock = mocker.patch('requests.Session.post', side_effect=no_batches(
+            make_response(200, {'username': 'user', 'score': 10}),
+            make_response(503),
+            make_response(503),
+        ))
+
+        assert flush_outbox(outbox, client) == (1, 2)
+        assert mock.call_count == 4  # task_2 with retry, task_3 is not tried
+        assert [report.attempts for report in outbox.get_pending(BASE_URL)] == [1, 0]
+
+    def test_stop_on_too_many_requests(
+            self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture,
+    ) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        outbox.put(BASE_URL, 'task_2', 1, 20.)
+        mocker.patch('requests.Session.post', side_effect=no_batches(
+            make_response(429), make_response(429), make_response(429), make_response(429),
+        ))
+
+        assert flush_outbox(outbox, client) == (0, 2)
+        assert [report.attempts for report in outbox.get_pending(BASE_URL)] == [1, 0]
+
+    def test_rejected_dropped(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'unknown_task', 1, 10.)
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        mocker.patch('requests.Session.post', side_effect=no_batches(
+            make_response(400),
+            make_response(200, {'username': 'user', 'score': 10}),
+        ))
+
+        assert flush_outbox(outbox, client) == (1, 0)
+
+    def test_stop_on_auth_errors(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        outbox.put(BASE_URL, 'task_2', 1, 20.)
+        mock = mocker.patch('requests.Session.post', side_effect=no_batches(make_response(403)))
+
+        assert flush_outbox(outbox, client) == (0, 2)
+        assert mock.call_count == 2  # task_2 is not tried
+        assert [report.attempts for report in outbox.get_pending(BASE_URL)] == [1, 0]
+
+    def test_undecodable_kept(self, outbox: ReportOutbox, client: ManytaskClient, mocker: MockFixture) -> None:
+        outbox.put(BASE_URL, 'task_1', 1, 10.)
+        outbox.put(BASE_URL, 'task_2', 1, 20.)
+        mocker.patch('requests.Session.post', side_effect=no_batches(
+            make_response(200, {'unexpected': 'response'}),
+            make_response(200, {'username': 'user', 'score': 20}),
+        ))
+
+        assert flush_outbox(outbox, client) == (1, 1)
+        [report] = outbox.get_pending(BASE_URL)
+        assert report.task_name == 'task_1'
+        assert report.attempts == 1
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import threading
+
 import pytest
 
 from checker.utils import print_info, print_task_info
+from checker.utils.print import capture_output
 
 
 class TestPrint:
@@ -17,3 +20,31 @@ class TestPrint:
 
         captured = capsys.readouterr()
         assert '123' in captured.err
+
+    def test_capture_output(self, capsys: pytest.CaptureFixture):
+        with capture_output() as output:
+            print_info('123')
+        print_info('456')
+
+        captured = capsys.readouterr()
+        assert output.getvalue() == '123\n'
+        assert captured.err == '456\n'
+
+    def test_capture_output_tee(self, capsys: pytest.CaptureFixture):
+        with capture_output() as outer:
+            with capture_output(tee=True) as inner:
+                print_info('123')
+
+        captured = capsys.readouterr()
+        assert inner.getvalue() == outer.getvalue() == '123\n'
+        assert captured.err == ''
+
+    def test_capture_output_other_thread(self, capsys: pytest.CaptureFixture):
+        with capture_output() as output:
+            thread = threading.Thread(target=print_info, args=('123',))
+            thread.start()
+            thread.join()
+
+        captured = capsys.readouterr()
+        assert output.getvalue() == ''
+        assert captured.err == '123\n'
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import queue
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from checker.utils.progress import CheckProgress, TaskOutputStream
+
+
+def get_all(output_queue: queue.Queue[Any]) -> list[Any]:
+    messages = []
+    while not output_queue.empty():
+        messages.append(output_queue.get_nowait())
+    return messages
+
+
+class TestTaskOutputStream:
+    def test_lines(self) -> None:
+        output_queue: queue.Queue[Any] = queue.Queue()
+        with TaskOutputStream(output_queue, 'group/task') as stream:
+            stream.write('line 1\nline')
+            assert get_all(output_queue) == [('line', 'group/task', 'line 1\n')]
+            stream.write(' 2\nno newline')
+            assert get_all(output_queue) == [('line', 'group/task', 'line 2\n')]
+        assert get_all(output_queue) == [('line', 'group/task', 'no newline\n')]
+
+    def test_long_line(self) -> None:
+        output_queue: queue.Queue[Any] = queue.Queue()
+        with TaskOutputStream(output_queue, 'task') as stream:
+            stream.write('a' * (TaskOutputStream.MAX_LINE_LENGTH * 2 + 1))
+            assert len(get_all(output_queue)) == 2
+            assert len(stream._buffer) == 1
+
+    def test_log_file(self, tmp_path: Path) -> None:
+        output_queue: queue.Queue[Any] = queue.Queue()
+        log_file = tmp_path / 'group' / 'task.log'
+        with TaskOutputStream(output_queue, 'group/task', log_file=log_file) as stream:
+            print('line 1', file=stream)
+            print('line 2', file=stream, end='')
+        assert log_file.read_text() == 'line 1\nline 2'
+
+
+class TestCheckProgress:
+    def test_summary(self) -> None:
+        progress = CheckProgress(3, workers=2)
+        assert progress.summary() == 'Progress: 0 running, 0/3 done, 0 failed, ETA ?'
+
+        progress.start('a')
+        progress.start('b')
+        progress.finish('a')
+        progress.finish('b', failed=True)
+        progress.start('c')
+        assert progress.summary().startswith('Progress: 1 running, 2/3 done, 1 failed, ETA ')
+
+        progress.finish('c')
+        progress.start('c')  # late message
+        assert progress.summary() == 'Progress: 0 running, 3/3 done, 1 failed, ETA 0s'
+
+    def test_eta_estimates(self) -> None:
+        progress = CheckProgress(3, workers=2, estimates={'a': 10., 'b': 20., 'c': 30.})
+        assert progress.eta() == 30.
+        progress.finish('c')
+        assert progress.eta() == 15.
+
+    def test_consume(self, capsys: pytest.CaptureFixture[str]) -> None:
+        output_queue: queue.Queue[Any] = queue.Queue()
+        progress = CheckProgress(1, workers=1)
+        consumer = threading.Thread(target=progress.consume, args=(output_queue,))
+        consumer.start()
+
+        output_queue.put(('start', 'group/task', None))
+        output_queue.put(('line', 'group/task', 'some output\n'))
+        output_queue.put(None)
+        consumer.join()
+
+        assert '[group/task] some output\n' in capsys.readouterr().err
+        assert progress.running.keys() == {'group/task'}
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytest
+
+from checker.exceptions import BuildFailedError, TestsFailedError, TimeoutExpiredError
+from checker.utils.report import (
+    TASK_FAILED,
+    TASK_PASSED,
+    TASK_SKIPPED,
+    CheckReport,
+    TaskReport,
+    get_failure_class,
+    measure_task,
+)
+from checker.utils.timings import StageTiming, timed_stage
+
+
+SELECTED_TASKS = ['group/task_0', 'group/task_1', 'group/task_2']
+
+
+def make_shards(*statuses: str) -> list[CheckReport]:
+    return [
+        CheckReport(
+            selected_tasks=SELECTED_TASKS,
+            tasks=[TaskReport(SELECTED_TASKS[i], status, duration=1.)],
+            shard_index=i,
+            shard_count=len(statuses),
+        )
+        for i, status in enumerate(statuses)
+    ]
+
+
+class TestCheckReport:
+    def test_success(self) -> None:
+        report = CheckReport(selected_tasks=SELECTED_TASKS[:2])
+        report.tasks = [TaskReport(SELECTED_TASKS[0], TASK_PASSED), TaskReport(SELECTED_TASKS[1], TASK_SKIPPED)]
+        assert report.success
+
+        report.tasks.append(TaskReport(SELECTED_TASKS[2], TASK_FAILED))
+        assert not report.success
+
+    def test_save_load(self, tmp_path: Path) -> None:
+        report = make_shards(TASK_PASSED, TASK_FAILED)[1]
+        report.save(tmp_path / 'report.json')
+        assert CheckReport.load(tmp_path / 'report.json') == report
+
+    def test_merge(self) -> None:
+        merged = CheckReport.merge(make_shards(TASK_PASSED, TASK_PASSED, TASK_PASSED)[::-1])
+        assert merged.success
+        assert [task.name for task in merged.tasks] == SELECTED_TASKS
+
+        merged = CheckReport.merge(make_shards(TASK_PASSED, TASK_FAILED, TASK_PASSED))
+        assert not merged.success
+        assert not merged.errors
+
+    def test_merge_missing_shard(self) -> None:
+        merged = CheckReport.merge(make_shards(TASK_PASSED, TASK_PASSED, TASK_PASSED)[:2])
+        assert not merged.success
+        assert 'Missing shards: [2]' in merged.errors
+        assert "Tasks not in any shard: ['group/task_2']" in merged.errors
+
+    def test_merge_duplicated_task(self) -> None:
+        shards = make_shards(TASK_PASSED, TASK_PASSED, TASK_PASSED)
+        shards[1].tasks.append(TaskReport(SELECTED_TASKS[0], TASK_PASSED))
+        merged = CheckReport.merge(shards)
+        assert not merged.success
+        assert "Tasks in several shards: ['group/task_0']" in merged.errors
+
+    def test_save_load_stages(self, tmp_path: Path) -> None:
+        report = CheckReport(selected_tasks=SELECTED_TASKS[:1])
+        report.tasks = [
+            TaskReport(
+                SELECTED_TASKS[0],
+                TASK_FAILED,
+                duration=2.,
+                failure='BuildFailedError',
+                message='cmake execution failed',
+                stages={'copy': StageTiming(0.5, 0.1, 1), 'build': StageTiming(1.5, 1.2, 1)},
+            ),
+        ]
+        report.save(tmp_path / 'report.json')
+        assert CheckReport.load(tmp_path / 'report.json') == report
+
+    def test_save_junit(self, tmp_path: Path) -> None:
+        report = CheckReport(selected_tasks=SELECTED_TASKS)
+        report.tasks = [
+            TaskReport(SELECTED_TASKS[0], TASK_PASSED, duration=1., score=1., stages={'tests': StageTiming(1., 2., 1)}),
+            TaskReport(SELECTED_TASKS[1], TASK_FAILED, duration=2., failure='TestsFailedError', message='Tests error'),
+            TaskReport(SELECTED_TASKS[2], TASK_SKIPPED),
+        ]
+        report.save_junit(tmp_path / 'report.xml')
+
+        suite = ET.parse(tmp_path / 'report.xml').getroot().find('testsuite')
+        assert suite is not None
+        assert (suite.get('tests'), suite.get('failures'), suite.get('skipped')) == ('3', '1', '1')
+        passed, failed, skipped = suite.findall('testcase')
+        assert (passed.get('classname'), passed.get('name'), passed.get('time')) == ('group', 'task_0', '1.000')
+        properties = {prop.get('name'): prop.get('value') for prop in passed.iter('property')}
+        assert properties == {'score': '1.0', 'stage.tests.wall': '1.0', 'stage.tests.cpu': '2.0'}
+        failure = failed.find('failure')
+        assert failure is not None and failure.get('type') == 'TestsFailedError'
+        assert skipped.find('skipped') is not None
+
+
+class TestMeasureTask:
+    def test_passed(self) -> None:
+        with measure_task('group/task') as report:
+            with timed_stage('build'):
+                time.sleep(0.05)
+            with timed_stage('tests'):
+                pass
+            with timed_stage('tests'):
+                pass
+            report.score = 0.5
+
+        assert report.status == TASK_PASSED
+        assert report.score == 0.5
+        assert report.failure is None
+        assert report.duration is not None and report.duration >= 0.05
+        assert report.stages['build'].wall >= 0.05
+        assert report.stages['tests'].count == 2
+
+    def test_failed(self) -> None:
+        with pytest.raises(BuildFailedError):
+            with measure_task('group/task') as report:
+                with timed_stage('build'):
+                    raise BuildFailedError('cmake execution failed')
+
+        assert report.status == TASK_FAILED
+        assert report.failure == 'BuildFailedError'
+        assert report.message == 'cmake execution failed'
+        assert report.stages['build'].count == 1
+
+    def test_timeout_failure_class(self) -> None:
+        try:
+            raise TimeoutExpiredError()
+        except TimeoutExpiredError as e:
+            error = TestsFailedError('Public or private tests error')
+            error.__cause__ = e
+        assert get_failure_class(error) == 'TimeoutExpiredError'
+        assert get_failure_class(TestsFailedError()) == 'TestsFailedError'
+
+    def test_stages_of_other_threads_not_collected(self) -> None:
+        def run_stage() -> None:
+            with timed_stage('build'):
+                pass
+
+        with measure_task('group/task') as report:
+            thread = threading.Thread(target=run_stage)
+            thread.start()
+            thread.join()
+        assert report.stages == {}
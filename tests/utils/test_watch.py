@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from checker.utils.watch import FilesWatcher
+
+
+class TestFilesWatcher:
+    def test_poll(self, tmp_path: Path) -> None:
+        (tmp_path / 'modified.py').write_text('a = 1')
+        (tmp_path / 'removed.py').write_text('a = 1')
+        (tmp_path / 'same.py').write_text('a = 1')
+        watcher = FilesWatcher([tmp_path, tmp_path / 'not_exists'])
+        assert watcher.poll() == []
+
+        (tmp_path / 'modified.py').write_text('a = 22')
+        (tmp_path / 'removed.py').unlink()
+        (tmp_path / 'not_exists').mkdir()
+        (tmp_path / 'not_exists' / 'created.py').write_text('a = 1')
+
+        assert watcher.poll() == [
+            tmp_path / 'modified.py', tmp_path / 'not_exists' / 'created.py', tmp_path / 'removed.py',
+        ]
+        assert watcher.poll() == []
+
+    def test_mtime_change(self, tmp_path: Path) -> None:
+        (tmp_path / 'file.py').write_text('a = 1')
+        watcher = FilesWatcher([tmp_path])
+        os.utime(tmp_path / 'file.py', ns=(1, 1))
+        assert watcher.poll() == [tmp_path / 'file.py']
+
+    def test_ignore_tools_files(self, tmp_path: Path) -> None:
+        watcher = FilesWatcher([tmp_path])
+        (tmp_path / '__pycache__').mkdir()
+        (tmp_path / '__pycache__' / 'file.cpython-311.pyc').write_text('binary')
+        (tmp_path / 'file.pyc').write_text('binary')
+        assert watcher.poll() == []
+
+    def test_wait_changes(self, tmp_path: Path) -> None:
+        watcher = FilesWatcher([tmp_path], poll_interval=0.05)
+
+        def edit() -> None:
+            (tmp_path / 'file_1.py').write_text('a = 1')
+            time.sleep(0.02)
+            (tmp_path / 'file_2.py').write_text('a = 1')
+
+        timer = threading.Timer(0.1, edit)
+        timer.start()
+        changed = watcher.wait_changes()
+        timer.join()
+        assert changed == [tmp_path / 'file_1.py', tmp_path / 'file_2.py']
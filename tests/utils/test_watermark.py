@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from checker.utils.watermark import WATERMARK_OVERLAP, MrsWatermark, parse_gitlab_time
+
+
+RUN_TIME = datetime(2023, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def test_parse_gitlab_time() -> None:
+    assert parse_gitlab_time('2023-01-01T12:00:00.000Z') == RUN_TIME
+    assert parse_gitlab_time('2023-01-01T15:00:00.000+03:00') == RUN_TIME
+    assert parse_gitlab_time('2023-01-01T12:00:00') == RUN_TIME
+
+
+class TestMrsWatermark:
+
+    def test_no_state(self, tmp_path: Path) -> None:
+        watermark = MrsWatermark(tmp_path / 'mrs.json', group='students')
+
+        assert watermark.get_updated_after() is None
+        assert not watermark.is_processed('1/1', '2023-01-01T12:00:00.000Z')
+
+    def test_save_load(self, tmp_path: Path) -> None:
+        path = tmp_path / 'state' / 'mrs.json'
+        watermark = MrsWatermark(path, group='students')
+        watermark.update(RUN_TIME, {'1/1': '2023-01-01T11:59:00.000Z'})
+        watermark.save()
+
+        watermark = MrsWatermark(path, group='students')
+        assert watermark.last_run_time == RUN_TIME
+        assert watermark.get_updated_after() == RUN_TIME - WATERMARK_OVERLAP
+        assert watermark.is_processed('1/1', '2023-01-01T11:59:00.000Z')
+        assert not watermark.is_processed('1/1', '2023-01-01T12:01:00.000Z')
+        assert MrsWatermark(path, group='other_students').get_updated_after() is None
+
+    def test_old_mrs_dropped(self, tmp_path: Path) -> None:
+        watermark = MrsWatermark(tmp_path / 'mrs.json', group='students')
+        watermark.update(RUN_TIME, {
+            '1/1': '2022-09-01T10:00:00.000Z',
+            '1/2': '2023-01-01T11:58:00.000Z',
+        })
+        watermark.update(RUN_TIME + timedelta(hours=1), {'2/1': '2023-01-01T12:58:00.000Z'})
+
+        assert watermark.mrs == {'2/1': '2023-01-01T12:58:00.000Z'}
+
+    def test_broken_state(self, tmp_path: Path) -> None:
+        path = tmp_path / 'mrs.json'
+        path.write_text('[not a dict')
+
+        assert MrsWatermark(path, group='students').get_updated_after() is None